@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.pg_copy import TRAFFIC_LOGS, BatchWriter, INSERT_MODES
+from config.settings import DB_CONFIG
+
+# Compara execute_values contra COPY texto/binario con el mismo camino que usa PostgresLogger.
+# Requiere las variables DB_* del .env y haber ejecutado sql/init_db.sql.
+
+BENCH_TABLE = "bench_traffic_logs"
+BATCH_SIZES = [15, 50, 200, 1000, 5000]
+
+def make_rows(n):
+    start = datetime.now()
+    classes = ["Auto", "Moto", "Camion"]
+    rows = []
+    for i in range(n):
+        ts = start + timedelta(milliseconds=33 * i)
+        rows.append((ts, ts.date(), ts.time(), i % 500, classes[i % 3], 20 + i % 80,
+                     "Incoming" if i % 2 else "Outgoing", f"cam_{i % 12}"))
+    return rows
+
+def run(cursor, mode, batch_size, rows):
+    writer = BatchWriter(TRAFFIC_LOGS, mode)
+    cursor.execute(f"TRUNCATE {BENCH_TABLE}")
+
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    for i in range(0, len(rows), batch_size):
+        writer.write(cursor, rows[i:i + batch_size], table=BENCH_TABLE)
+    cpu = time.thread_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    return len(rows) / wall, cpu, cpu / len(rows) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de inserción: execute_values vs COPY")
+    parser.add_argument("--rows", type=int, default=30000, help="Filas por escenario")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--modes", nargs="+", default=list(INSERT_MODES), choices=INSERT_MODES)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"CREATE TABLE {BENCH_TABLE} (LIKE traffic_logs)")
+
+    rows = make_rows(args.rows)
+
+    print(f"{'modo':<12} {'lote':>6} {'filas/s':>12} {'CPU hilo (s)':>13} {'µs CPU/fila':>12}")
+    try:
+        for batch_size in args.batch_sizes:
+            for mode in args.modes:
+                rate, cpu, cpu_per_row = run(cursor, mode, batch_size, rows)
+                print(f"{mode:<12} {batch_size:>6} {rate:>12,.0f} {cpu:>13.3f} {cpu_per_row:>12.1f}")
+    finally:
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
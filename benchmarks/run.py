@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import multiprocessing as mp
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic import make_scene, load_truth, expected_crossings
+from stubs import StubDetector, RecordingSink, SINKS, open_logger
+
+# Benchmarks reproducibles del pipeline sin YOLO, sin ventana y sin Postgres:
+#   python benchmarks/run.py                               # todos los escenarios
+#   python benchmarks/run.py --save benchmarks/baseline.json
+#   python benchmarks/run.py --baseline benchmarks/baseline.json   # sale con código 1 si algo empeoró
+# Cada escenario corre en su propio proceso, así el pico de memoria es el suyo.
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+SCENARIOS = ("speed", "loader", "logger", "pipeline")
+# +1: más es mejor | -1: menos es mejor
+COMPARED = {"fps": 1, "rows_per_s": 1, "p50_ms": -1, "p99_ms": -1, "peak_rss_mb": -1}
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+def latency(samples):
+    samples = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(samples, 50)), 4), "p99_ms": round(float(np.percentile(samples, 99)), 4)}
+
+def stage_breakdown():
+    from core.metrics import METRICS
+    stages = {}
+    for field, value in METRICS.snapshot().items():
+        if field.startswith("trafficvision_stage_seconds") and isinstance(value, dict):
+            stage = field.split("stage=")[1].rstrip("}").split(",")[0]
+            stages[stage] = {"mean_ms": value["mean_ms"], "count": value["count"]}
+    return stages
+
+def scenario_speed(args, scene, paths):
+    # SpeedEstimator.estimate_batch con `tracks` vehículos por frame y recambio de IDs
+    from core.track_store import TrackStore
+    from core.speed_estimator import SpeedEstimator
+
+    rng = np.random.default_rng(0)
+    store = TrackStore(max_tracks=256)
+    estimator = SpeedEstimator(paths["homography"], store=store)
+    n = args["tracks"]
+    positions = rng.uniform(0, [scene["width"], scene["height"]], (n, 2))
+    velocity = rng.normal(0, 6, (n, 2))
+
+    samples = []
+    for frame in range(args["speed_frames"]):
+        # Cada 300 frames un tercio de los vehículos se reemplaza por otros nuevos
+        ids = np.arange(n) + (frame // 300) * (n // 3) * (np.arange(n) < n // 3)
+        positions += velocity
+        xyxy = np.hstack([positions - [24, 80], positions + [24, 0]])
+        started = time.perf_counter()
+        estimator.estimate_batch(ids, xyxy, frame / scene["fps"])
+        samples.append(time.perf_counter() - started)
+        store.sync(None, frame / scene["fps"])
+
+    total = sum(samples)
+    return {"frames": len(samples), "fps": round(len(samples) / total, 1), **latency(samples)}
+
+def scenario_loader(args, scene, paths):
+    # VideoLoader decodificando el video sintético con el skip pedido
+    from core.video_loader import VideoLoader
+
+    loader = VideoLoader(paths["video"], skip_frames=args["skip"]).start()
+    samples = []
+    started = time.perf_counter()
+    while True:
+        waiting = time.perf_counter()
+        item = loader.read()
+        if item is None:
+            break
+        samples.append(time.perf_counter() - waiting)
+    elapsed = time.perf_counter() - started
+    loader.stop()
+    return {"frames": len(samples), "fps": round(len(samples) / elapsed, 1), **latency(samples)}
+
+def scenario_logger(args, scene, paths):
+    # PostgresLogger / LocalSink: filas por segundo de punta a punta (hasta vaciar la cola en stop()) y latencia de log()
+    from datetime import datetime, timedelta
+    sink = args["sink"] if args["sink"] != "null" else "spill"
+    spill_dir = tempfile.mkdtemp(prefix="bench_spill_")
+    try:
+        logger = open_logger(sink, spill_dir)
+        logger.blocking = True
+        start = datetime(2026, 1, 1)
+        samples = []
+        started = time.perf_counter()
+        for i in range(args["rows"]):
+            timestamp = start + timedelta(milliseconds=33 * i)
+            t = time.perf_counter()
+            logger.log(i % 500, "Auto", 20 + i % 80, "Incoming", camera_id="bench", timestamp=timestamp)
+            samples.append(time.perf_counter() - t)
+        logger.stop()
+        elapsed = time.perf_counter() - started
+        stats = logger.stats()
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    return {"rows": args["rows"], "sink": sink, "rows_per_s": round(args["rows"] / elapsed, 1),
+            "dropped": stats["dropped"], **latency(samples)}
+
+def scenario_pipeline(args, scene, paths):
+    # Bucle de main.py completo: VideoLoader + StubDetector + CameraStream (tracker, velocidad, zonas) + logger
+    from core.camera_stream import CameraStream
+    from core.metrics import METRICS
+
+    # Desglose por etapa solo de esta corrida
+    METRICS.families.clear()
+    truth = load_truth(paths["truth"])
+    detector = StubDetector(truth, scene["fps"], jitter=args["jitter"], latency=args["detect_ms"] / 1000)
+    spill_dir = tempfile.mkdtemp(prefix="bench_spill_")
+    sink = RecordingSink(forward=open_logger(args["sink"], spill_dir))
+    stream = CameraStream(paths["video"], paths["homography"], camera_id="bench", skip_frames=args["skip"],
+                          use_roi=False, trajectory_dir=None, use_zones=True).start()
+
+    lane_width = scene["width"] / len(scene["lanes"])
+    lane_of = {}
+    samples = []
+    try:
+        started = time.perf_counter()
+        while True:
+            item = stream.loader.read()
+            if item is None:
+                break
+            frame, current_time = item
+            t = time.perf_counter()
+            detector.current_time = current_time
+            detections = stream.process(detector.detect(frame), current_time, sink)
+            samples.append(time.perf_counter() - t)
+
+            # Carril (y por lo tanto velocidad real) de cada track, fuera de la medición
+            for tracker_id, box in zip(detections.tracker_id, detections.xyxy):
+                lane_of.setdefault(int(tracker_id), int((box[0] + box[2]) / 2 // lane_width))
+        stream.flush(sink)
+        sink.stop()
+        elapsed = time.perf_counter() - started
+    finally:
+        stream.stop()
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    true_speed = [lane[0] for lane in scene["lanes"]]
+    errors = [abs(speed - true_speed[lane_of[tid]]) for tid, speed in sink.speeds if tid in lane_of]
+    expected = expected_crossings(scene, truth)
+    counted = stream.zones.counts["mitad"] if stream.zones is not None else {}
+    return {
+        "frames": len(samples),
+        "fps": round(len(samples) / elapsed, 1),
+        "rows_per_s": round(sink.total / elapsed, 1),
+        **latency(samples),
+        "speed_mae_kmh": round(float(np.mean(errors)), 2) if errors else None,
+        "crossings": {"expected": [expected[1], expected[-1]], "counted": [counted.get(1, 0), counted.get(-1, 0)]},
+        "stages": stage_breakdown(),
+    }
+
+def run_scenario(name, args, scene, paths):
+    # Se queda con la mejor de `repeat` corridas: el ruido de la máquina solo puede empeorar los tiempos
+    scenario = globals()[f"scenario_{name}"]
+    runs = [scenario(args, scene, paths) for _ in range(args["repeat"])]
+    result = max(runs, key=lambda r: r.get("fps", r.get("rows_per_s", 0)))
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return result
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'escenario':<10} {'métrica':<12} {'base':>12} {'actual':>12} {'cambio':>8}")
+    for name, current in results["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        for metric, sign in COMPARED.items():
+            if metric not in current or not previous.get(metric):
+                continue
+            change = (current[metric] - previous[metric]) / previous[metric]
+            worse = sign * change < -tolerance
+            if worse:
+                regressions.append((name, metric, change))
+            print(f"{name:<10} {metric:<12} {previous[metric]:>12,.2f} {current[metric]:>12,.2f} "
+                  f"{change:>+7.1%}{'  << REGRESIÓN' if worse else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline con video sintético y componentes simulados")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--seconds", type=float, default=30.0, help="Duración del video sintético")
+    parser.add_argument("--skip", type=int, default=1, help="skip_frames del loader")
+    parser.add_argument("--sink", default="spill", choices=SINKS,
+                        help="null: sin DB | spill: PostgresLogger a disco | postgres: DB de las variables DB_* | "
+                             "sqlite / parquet: LocalSink")
+    parser.add_argument("--jitter", type=float, default=1.5, help="Ruido (px) de las cajas del detector simulado")
+    parser.add_argument("--detect-ms", type=float, default=0.0, help="Latencia simulada de inferencia por frame")
+    parser.add_argument("--tracks", type=int, default=40, help="Vehículos por frame en el escenario speed")
+    parser.add_argument("--speed-frames", type=int, default=20000)
+    parser.add_argument("--rows", type=int, default=100000, help="Filas del escenario logger")
+    parser.add_argument("--repeat", type=int, default=3, help="Corridas por escenario (se informa la mejor)")
+    parser.add_argument("--save", help="Guardar los resultados en este JSON (para usar como baseline)")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior contra el cual comparar")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Empeoramiento relativo tolerado")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args()
+
+    scene, paths = make_scene(args.data_dir, seconds=args.seconds)
+    options = {k: v for k, v in vars(args).items() if k not in ("save", "baseline", "tolerance", "data_dir", "scenarios")}
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "scene": os.path.basename(paths["video"]),
+            "options": options,
+        },
+        "results": {},
+    }
+
+    ctx = mp.get_context("spawn")
+    for name in args.scenarios:
+        with ctx.Pool(1) as pool:
+            result = pool.apply(run_scenario, (name, options, scene, paths))
+        results["results"][name] = result
+        summary = ", ".join(f"{k}={v}" for k, v in result.items() if k != "stages")
+        print(f"[BENCH] {name}: {summary}")
+        for stage, values in result.get("stages", {}).items():
+            print(f"          {stage:<8} {values['mean_ms']:>8.3f} ms  ({values['count']} frames)")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[BENCH] Resultados guardados en {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("options") != options or baseline["meta"].get("scene") != results["meta"]["scene"]:
+            print("[WARN] El baseline se tomó con otras opciones o escena; la comparación es orientativa.")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n[BENCH] {len(regressions)} métricas empeoraron más de {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\n[BENCH] Sin regresiones")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import time
+import numpy as np
+import supervision as sv
+from core.pg_copy import TRAFFIC_LOGS
+from core.postgres_logger import PostgresLogger
+from core.local_sink import LocalSink, LOCAL_FORMATS
+
+# Base inexistente: PostgresLogger no conecta y todo lo que escribe termina en el spill a disco,
+# con el mismo camino de cola, lotes y codificación COPY binaria que en producción.
+UNREACHABLE_DB = {"host": "/nonexistent", "database": "bench", "user": "bench", "password": "", "port": 5432}
+
+class StubDetector:
+    # Sustituto de Detector: devuelve las cajas de la verdad de campo del frame, con ruido opcional
+    # y una latencia fija que simula la inferencia. Como en SampleCollector (offline.py), el bucle
+    # fija current_time antes de cada llamada.
+    def __init__(self, truth, fps, jitter=1.5, latency=0.0, seed=0):
+        self.truth = truth
+        self.fps = fps
+        self.jitter = jitter
+        self.latency = latency
+        self.rng = np.random.default_rng(seed)
+        self.current_time = 0.0
+
+    def detect(self, frame=None, roi=None):
+        if self.latency:
+            time.sleep(self.latency)
+        offsets = self.truth["offsets"]
+        idx = min(int(round(self.current_time * self.fps)), len(offsets) - 2)
+        start, end = offsets[idx], offsets[idx + 1]
+        if start == end:
+            return sv.Detections.empty()
+
+        xyxy = self.truth["xyxy"][start:end].copy()
+        if self.jitter:
+            xyxy += self.rng.normal(0, self.jitter, xyxy.shape).astype(np.float32)
+        return sv.Detections(
+            xyxy=xyxy,
+            confidence=np.full(end - start, 0.9, dtype=np.float32),
+            class_id=self.truth["class_id"][start:end].astype(int),
+        )
+
+class RecordingSink:
+    # Sustituto del logger: cuenta las filas por tabla y guarda (tracker_id, velocidad) para medir
+    # la precisión. Con `forward` además las pasa al logger real (spill o Postgres).
+    def __init__(self, forward=None):
+        self.forward = forward
+        self.rows = {}
+        self.speeds = []
+
+    def log(self, tracker_id, class_name, speed, direction, camera_id=None, timestamp=None):
+        self.rows[TRAFFIC_LOGS.name] = self.rows.get(TRAFFIC_LOGS.name, 0) + 1
+        self.speeds.append((int(tracker_id), int(speed)))
+        if self.forward is not None:
+            self.forward.log(tracker_id, class_name, speed, direction, camera_id, timestamp)
+
+    def log_row(self, spec, row):
+        self.rows[spec.name] = self.rows.get(spec.name, 0) + 1
+        if self.forward is not None:
+            self.forward.log_row(spec, row)
+
+    @property
+    def total(self):
+        return sum(self.rows.values())
+
+    def stop(self):
+        if self.forward is not None:
+            self.forward.stop()
+
+SINKS = ("null", "spill", "postgres") + LOCAL_FORMATS
+
+def open_logger(kind, spill_dir):
+    # null: sin logger | spill: PostgresLogger escribiendo a disco | postgres: DB de las variables DB_*
+    # sqlite / parquet: LocalSink en spill_dir
+    if kind == "null":
+        return None
+    if kind in LOCAL_FORMATS:
+        return LocalSink(spill_dir, kind, batch_size=50)
+    if kind == "spill":
+        return PostgresLogger(UNREACHABLE_DB, batch_size=50, insert_mode="copy_binary", spill_dir=spill_dir,
+                              maintenance_interval=1e9)
+    from config.settings import DB_CONFIG
+    return PostgresLogger(DB_CONFIG, batch_size=50, insert_mode="copy_binary",
+                          spill_dir=os.path.join(spill_dir, "fallback"))
@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+import cv2
+import numpy as np
+
+# Video sintético de tráfico con verdad de campo conocida: carriles verticales, cada uno con
+# velocidad y sentido fijos, y una homografía de escala pura (m_per_px) de modo que la velocidad
+# real de cada vehículo se sabe de antemano. Todo se genera con semilla: mismos parámetros, mismo video.
+
+DEFAULT_SCENE = {
+    "width": 1280,
+    "height": 720,
+    "fps": 30.0,
+    "seconds": 30.0,
+    "m_per_px": 0.05,
+    # Velocidad (km/h) y sentido de cada carril: +1 baja por la imagen (Incoming), -1 sube (Outgoing)
+    "lanes": [[30.0, 1], [45.0, 1], [60.0, -1], [80.0, -1]],
+    "headway": 1.2,
+    "seed": 0,
+}
+
+BOX_W, BOX_H = 48, 80
+CLASSES = (2, 2, 2, 7)
+
+def scene_key(scene):
+    return hashlib.sha256(json.dumps(scene, sort_keys=True).encode()).hexdigest()[:12]
+
+def plan_vehicles(scene):
+    # (id, carril, frame de entrada, px por frame, sentido, clase) de cada vehículo
+    rng = np.random.default_rng(scene["seed"])
+    n_frames = int(scene["seconds"] * scene["fps"])
+    vehicles = []
+    for lane, (kmh, sign) in enumerate(scene["lanes"]):
+        px_per_frame = kmh / 3.6 / scene["m_per_px"] / scene["fps"]
+        t = rng.uniform(0, scene["headway"])
+        while t * scene["fps"] < n_frames:
+            vehicles.append((len(vehicles), lane, int(t * scene["fps"]), px_per_frame, sign,
+                             CLASSES[rng.integers(len(CLASSES))]))
+            t += scene["headway"] * rng.uniform(0.7, 1.6)
+    return vehicles
+
+def ground_truth(scene):
+    # Cajas por frame en columnas, como el cache de detecciones: las del frame i son offsets[i]:offsets[i+1]
+    n_frames = int(scene["seconds"] * scene["fps"])
+    width, height = scene["width"], scene["height"]
+    lane_width = width / len(scene["lanes"])
+
+    per_frame = [[] for _ in range(n_frames)]
+    for vehicle_id, lane, first, px_per_frame, sign, class_id in plan_vehicles(scene):
+        x1 = lane_width * (lane + 0.5) - BOX_W / 2
+        for frame in range(first, n_frames):
+            travelled = (frame - first) * px_per_frame
+            y2 = travelled if sign > 0 else height + BOX_H - travelled
+            if (sign > 0 and y2 - BOX_H > height) or (sign < 0 and y2 < 0):
+                break
+            per_frame[frame].append((vehicle_id, lane, class_id, x1, y2 - BOX_H, x1 + BOX_W, y2))
+
+    counts = [len(rows) for rows in per_frame]
+    rows = [row for frame_rows in per_frame for row in frame_rows]
+    table = np.array(rows, dtype=np.float64).reshape(-1, 7)
+    return {
+        "offsets": np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        "vehicle_id": table[:, 0].astype(np.int64),
+        "lane": table[:, 1].astype(np.int64),
+        "class_id": table[:, 2].astype(np.int64),
+        "xyxy": table[:, 3:].astype(np.float32),
+    }
+
+def render(scene, truth, path):
+    width, height, fps = scene["width"], scene["height"], scene["fps"]
+    lane_width = width / len(scene["lanes"])
+    background = np.full((height, width, 3), 70, dtype=np.uint8)
+    for lane in range(1, len(scene["lanes"])):
+        x = int(lane * lane_width)
+        for y in range(0, height, 40):
+            cv2.line(background, (x, y), (x, y + 20), (220, 220, 220), 2)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    offsets = truth["offsets"]
+    for frame_idx in range(len(offsets) - 1):
+        frame = background.copy()
+        for i in range(offsets[frame_idx], offsets[frame_idx + 1]):
+            x1, y1, x2, y2 = truth["xyxy"][i].astype(int)
+            color = (40, 40, 200) if truth["class_id"][i] == 7 else (200, 160, 40)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, -1)
+        writer.write(frame)
+    writer.release()
+
+def make_scene(data_dir, **overrides):
+    # Genera (o reutiliza) video, verdad de campo, homografía y zonas; devuelve las rutas
+    scene = {**DEFAULT_SCENE, **overrides}
+    base = os.path.join(data_dir, f"scene_{scene_key(scene)}")
+    paths = {
+        "video": base + ".mp4",
+        "truth": base + "_truth.npz",
+        "homography": base + ".npy",
+        "zones": base + "_zones.json",
+        "scene": base + ".json",
+    }
+    if all(os.path.exists(p) for p in paths.values()):
+        return scene, paths
+
+    os.makedirs(data_dir, exist_ok=True)
+    truth = ground_truth(scene)
+    np.savez(paths["truth"], **truth)
+    np.save(paths["homography"], np.diag([scene["m_per_px"], scene["m_per_px"], 1.0]))
+
+    # Línea de conteo a media altura y una zona en la mitad inferior, en metros
+    w_m = scene["width"] * scene["m_per_px"]
+    h_m = scene["height"] * scene["m_per_px"]
+    with open(paths["zones"], "w") as f:
+        json.dump({
+            "lines": [{"name": "mitad", "points": [[0, h_m / 2], [w_m, h_m / 2]]}],
+            "zones": [{"name": "mitad_inferior", "polygon": [[0, h_m / 2], [w_m, h_m / 2], [w_m, h_m], [0, h_m]]}],
+        }, f)
+
+    render(scene, truth, paths["video"] + ".tmp.mp4")
+    os.replace(paths["video"] + ".tmp.mp4", paths["video"])
+    with open(paths["scene"], "w") as f:
+        json.dump(scene, f, indent=2)
+    return scene, paths
+
+def load_truth(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+def expected_crossings(scene, truth):
+    # Vehículos cuyo centro inferior pasa la línea de media altura, por sentido (1 / -1)
+    mid = scene["height"] / 2
+    first, last = {}, {}
+    for i, vehicle_id in enumerate(truth["vehicle_id"].tolist()):
+        y = float(truth["xyxy"][i, 3])
+        first.setdefault(vehicle_id, y)
+        last[vehicle_id] = y
+    counts = {1: 0, -1: 0}
+    for vehicle_id, y0 in first.items():
+        y1 = last[vehicle_id]
+        if y0 <= mid < y1:
+            counts[1] += 1
+        elif y1 < mid <= y0:
+            counts[-1] += 1
+    return counts
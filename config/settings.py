@@ -0,0 +1,129 @@
+import os
+from dotenv import load_dotenv
+
+# Configuración compartida por main.py, multi_camera.py, offline.py y las herramientas de utils/.
+# Solo constantes y las fábricas de la salida de registros (los módulos pesados se importan dentro
+# de cada una), así importarla no abre ventanas, cámaras ni conexiones.
+load_dotenv()
+
+# --------------------------------Configuración-------------------------------- #
+# - Ubicación del video de entrada -
+VIDEO_SOURCE = r"C:\Users\augus\OneDrive\Escritorio\Vehicle tracker\VehicleTracker\video\video_test.mp4"
+# - Identificador de la cámara (columna camera_id en la base de datos) -
+CAMERA_ID = "cam_0"
+
+# - Cuántos frames saltarse entre procesamientos -
+SKIP_FRAMES = 3
+# - Skip adaptativo: entre SKIP_FRAMES y MAX_SKIP_FRAMES según la carga de CPU y la cantidad de vehículos -
+# - (con DENSE_TRACKS o más vehículos en escena se procesa cada SKIP_FRAMES frames) -
+ADAPTIVE_SKIP = True
+MAX_SKIP_FRAMES = 10
+DENSE_TRACKS = 6
+# - Factor de corrección de velocidad -      
+CORRECTION_FACTOR = 1  
+# - Límite de vehículos en memoria y segundos sin ver un track antes de descartarlo -
+MAX_TRACKS = 256
+TRACK_MAX_IDLE = 10.0
+# - Segundos que ByteTrack conserva un vehículo perdido (oclusiones) antes de darle un ID nuevo; -
+# - 3 s equivale a su lost_track_buffer de 30 frames con un video de 30 FPS y SKIP_FRAMES = 3 -
+LOST_TRACK_SECONDS = 3.0
+# - Qué se guarda: "frames" (fila por frame en traffic_logs), "tracks" (resumen por vehículo en traffic_tracks) o "both" -
+LOG_MODE = "frames"
+# - Segundos tras los cuales un vehículo que sigue en escena emite un resumen parcial -
+TRACK_CHECKPOINT_INTERVAL = 300.0
+# - Agregados por minuto/hora (traffic_rollup_1m / traffic_rollup_1h) para el tablero -
+ROLLUP = True
+# - Inferencia solo dentro del polígono de calibración (config/homography_matrix_roi.npy) más un margen en px -
+USE_ROI = True
+ROI_PADDING = 32
+# - Meses que se conservan en la DB, en la salida local y en TRAJECTORY_DIR -
+RETENTION_MONTHS = 3
+# - Pesos de YOLO y tamaño de imagen (lado mayor en px) -
+MODEL_NAME = "yolov8n.pt"
+INFERENCE_SIZE = 640
+# - Motor de inferencia: "ultralytics" (PyTorch), "onnx" u "onnx-int8" (ONNX Runtime en CPU) -
+# - Los modelos ONNX se generan una vez con: python utils/export_model.py [--int8] -
+DETECTOR_BACKEND = "ultralytics"
+# - Decodificación en un proceso aparte con frames en memoria compartida (pool fijo de FRAME_SLOTS) -
+SHARED_MEMORY_LOADER = False
+FRAME_SLOTS = 8
+# - Cache de detecciones por video (solo archivos y con skip fijo, ADAPTIVE_SKIP = False): -
+# - la primera pasada guarda lo que detecta YOLO y las siguientes lo reproducen sin inferencia -
+DETECTION_CACHE = False
+CACHE_DIR = "cache"
+# - Carpeta con los puntos en píxeles de cada vehículo (None para desactivar); permite recalcular -
+# - velocidades tras recalibrar con: python utils/recompute_speeds.py. Ocupa ~1 GB por día y cámara -
+# - con 40 vehículos a 10 frames/s; los días se borran con la misma retención (RETENTION_MONTHS) que la DB -
+TRAJECTORY_DIR = "trajectories"
+# - Proyectar con la grilla píxel -> metros de calibration_tool.py (mmap compartido entre procesos) -
+# - en vez de la homografía. Medido: ~45 µs vs ~3 µs por frame de 20 vehículos; útil solo si la grilla -
+# - se corrige a mano (p. ej. calzadas con pendiente), por eso queda desactivado -
+GROUND_GRID = False
+# - Líneas de conteo y zonas de ocupación (en metros) leídas de <homografía>_zones.json si existe: -
+# - cruces en traffic_crossings y ocupación media/máxima cada OCCUPANCY_INTERVAL s en traffic_occupancy -
+USE_ZONES = True
+OCCUPANCY_INTERVAL = 60.0
+# - Sin ventana ni dibujo (servidores sin display) -
+HEADLESS = False
+# - Video anotado opcional (None para desactivar) y FPS de render del mismo -
+OUTPUT_VIDEO = None
+OUTPUT_FPS = 5
+
+# - Métricas por etapa en formato Prometheus en http://127.0.0.1:METRICS_PORT/metrics (None para desactivar) -
+METRICS_PORT = 9108
+# - Cada cuántos segundos imprimir una línea JSON con las métricas (None para desactivar) -
+METRICS_LOG_INTERVAL = None
+# - Perfil con cProfile de PROFILE_FRAMES frames a partir del frame PROFILE_START_FRAME (None para desactivar) -
+PROFILE_START_FRAME = None
+PROFILE_FRAMES = 300
+PROFILE_PATH = "profiles/trafficvision.prof"
+
+# - Forma de insertar lotes: "values" (execute_values), "copy_text" o "copy_binary" -
+DB_INSERT_MODE = "copy_binary"
+# - Carpeta local donde se guardan los registros si la DB está caída o saturada (None para desactivar) -
+SPILL_DIR = "spill"
+# - Salida de los registros: "postgres", o archivos locales "sqlite" (WAL) / "parquet" (polars) en LOCAL_DIR, -
+# - rotados por hora en carpetas por mes, con la misma retención que las particiones de Postgres -
+SINK = "postgres"
+# - Con SINK = "postgres" y la DB caída al arrancar, formato local a usar en su lugar (None: arrancar igual con el spill) -
+LOCAL_FALLBACK = "sqlite"
+LOCAL_DIR = "local"
+# - Cada cuántos segundos subir a Postgres (COPY) los archivos locales ya cerrados (None para no subirlos desde aquí; -
+# - también se puede con: python utils/upload_local.py) -
+UPLOAD_INTERVAL = 60.0
+
+# - Configuración de Base de Datos (Variables de entorno) -
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST"),
+    "database": os.getenv("DB_NAME"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASSWORD"),
+    "port": int(os.getenv("DB_PORT", "5432"))
+}
+# ----------------------------------------------------------------------------- #
+
+# Salida de registros según SINK / LOCAL_FALLBACK (main.py y multi_camera.py)
+def open_logger(batch_size=15):
+    from core.local_sink import LocalSink
+    if SINK != "postgres":
+        return LocalSink(LOCAL_DIR, SINK, retention_months=RETENTION_MONTHS, store_frames=LOG_MODE in ("frames", "both"), rollup=ROLLUP)
+
+    from core.postgres_logger import PostgresLogger
+    try:
+        return PostgresLogger(DB_CONFIG, batch_size=batch_size, flush_interval=1.0, retention_months=RETENTION_MONTHS,
+                              insert_mode=DB_INSERT_MODE, spill_dir=SPILL_DIR,
+                              store_frames=LOG_MODE in ("frames", "both"), rollup=ROLLUP,
+                              require_connection=LOCAL_FALLBACK is not None)
+    except Exception as e:
+        if LOCAL_FALLBACK is None:
+            raise
+        print(f"[WARN] DB no disponible ({e}). Los registros se guardarán en '{LOCAL_DIR}' ({LOCAL_FALLBACK}).")
+        return LocalSink(LOCAL_DIR, LOCAL_FALLBACK, retention_months=RETENTION_MONTHS,
+                         store_frames=LOG_MODE in ("frames", "both"), rollup=ROLLUP)
+
+def start_uploader():
+    # Archivos locales de esta ejecución o de una anterior: se suben en cuanto la DB responda
+    if UPLOAD_INTERVAL is None or (SINK == "postgres" and LOCAL_FALLBACK is None):
+        return None
+    from core.local_sink import LocalUploader
+    return LocalUploader(LOCAL_DIR, DB_CONFIG, interval=UPLOAD_INTERVAL, insert_mode=DB_INSERT_MODE).start()
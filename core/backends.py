@@ -0,0 +1,114 @@
+import os
+import cv2
+import numpy as np
+import supervision as sv
+
+BACKENDS = ("ultralytics", "onnx", "onnx-int8")
+
+def onnx_path_for(model_name, int8=False):
+    # Los artefactos exportados quedan junto al .pt: yolov8n.pt -> yolov8n.onnx / yolov8n.int8.onnx
+    stem = os.path.splitext(model_name)[0]
+    return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+
+def letterbox(image, imgsz):
+    # Redimensiona manteniendo la proporción y rellena a imgsz x imgsz (igual que ultralytics)
+    h, w = image.shape[:2]
+    ratio = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_x, pad_y = (imgsz - new_w) / 2, (imgsz - new_h) / 2
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    left, top = int(round(pad_x - 0.1)), int(round(pad_y - 0.1))
+    canvas[top:top + new_h, left:left + new_w] = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return canvas, ratio, (left, top)
+
+def to_blob(canvases):
+    # BGR HWC uint8 -> RGB NCHW float32 [0, 1]
+    batch = np.stack(canvases)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+class UltralyticsBackend:
+    def __init__(self, model_name, conf=0.5, imgsz=640):
+        from ultralytics import YOLO
+        self.model = YOLO(model_name)
+        self.conf = conf
+        self.imgsz = imgsz
+
+    def predict(self, images):
+        results = self.model(list(images), verbose=False, conf=self.conf, imgsz=self.imgsz)
+        return [sv.Detections.from_ultralytics(r) for r in results]
+
+class OnnxBackend:
+    # YOLOv8 exportado a ONNX ejecutado con ONNX Runtime en CPU.
+    # Reproduce el pre/post-proceso de ultralytics: letterbox, umbral de confianza y NMS por clase.
+    def __init__(self, onnx_path, conf=0.5, imgsz=640, iou=0.7, threads=None):
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(
+                f"No encontré '{onnx_path}'. Ejecuta primero: python utils/export_model.py"
+                f"{' --int8' if '.int8.' in onnx_path else ''}"
+            )
+
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        print(f"[INFO] Detector ONNX Runtime: {onnx_path}")
+
+    def predict(self, images):
+        prepared = [letterbox(image, self.imgsz) for image in images]
+        batch = to_blob([canvas for canvas, _, _ in prepared])
+
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+
+        return [
+            self.postprocess(output, ratio, pad, image.shape)
+            for output, (_, ratio, pad), image in zip(outputs, prepared, images)
+        ]
+
+    def postprocess(self, output, ratio, pad, shape):
+        # output: (4 + clases, N) con cajas (cx, cy, w, h) en píxeles del letterbox
+        preds = output.T
+        scores = preds[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+
+        keep = confidences >= self.conf
+        if not keep.any():
+            return sv.Detections.empty()
+
+        boxes = preds[keep, :4]
+        class_ids = class_ids[keep]
+        confidences = confidences[keep]
+
+        xywh = np.column_stack([boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2, boxes[:, 2], boxes[:, 3]])
+        indices = cv2.dnn.NMSBoxesBatched(xywh.tolist(), confidences.tolist(), class_ids.tolist(), self.conf, self.iou)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+        xyxy = xywh[indices].copy()
+        xyxy[:, 2:] += xyxy[:, :2]
+        xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad[0]) / ratio
+        xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad[1]) / ratio
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, shape[1])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, shape[0])
+
+        return sv.Detections(
+            xyxy=xyxy.astype(np.float32),
+            confidence=confidences[indices].astype(np.float32),
+            class_id=class_ids[indices].astype(int),
+        )
+
+def create_backend(backend, model_name, conf=0.5, imgsz=640, threads=None):
+    if backend == "ultralytics":
+        return UltralyticsBackend(model_name, conf, imgsz)
+    if backend == "onnx":
+        return OnnxBackend(onnx_path_for(model_name), conf, imgsz, threads=threads)
+    if backend == "onnx-int8":
+        return OnnxBackend(onnx_path_for(model_name, int8=True), conf, imgsz, threads=threads)
+    raise ValueError(f"Backend desconocido: {backend}. Opciones: {BACKENDS}")
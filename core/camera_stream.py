@@ -0,0 +1,184 @@
+import os
+import time
+import numpy as np
+from datetime import datetime
+from core.video_loader import VideoLoader
+from core.shm_loader import SharedMemoryLoader
+from core.tracker import Tracker
+from core.track_store import TrackStore
+from core.speed_estimator import SpeedEstimator, DIRECTION_NAMES
+from core.track_summary import TrackSummarizer
+from core.roi import RegionOfInterest, roi_path_for
+from core.frame_scheduler import AdaptiveScheduler
+from core.trajectories import TrajectoryRecorder
+from core.zones import ZoneEngine, zones_path_for
+from core.metrics import METRICS
+
+STAGES = ("decode", "track", "speed", "zones", "log")
+
+class CameraStream:
+    def __init__(self, source, matrix_path="config/homography_matrix.npy", camera_id="cam_0",
+                 skip_frames=1, correction_factor=1, max_tracks=256, max_idle=10.0, lost_track_seconds=3.0,
+                 summaries=False, checkpoint_interval=300.0, use_roi=True, roi_padding=32,
+                 shared_memory=False, frame_slots=8, notify=None, adaptive_skip=False, max_skip=10, dense_tracks=6,
+                 start_frame=0, end_frame=None, frame_index=False, trajectory_dir=None, ground_grid=False,
+                 use_zones=True, occupancy_interval=60.0, retention_months=3):
+        self.camera_id = camera_id
+        self.correction_factor = correction_factor
+        self.timers = {stage: METRICS.histogram("trafficvision_stage_seconds", "Tiempo por frame de cada etapa",
+                                                stage=stage, camera=camera_id) for stage in STAGES}
+        self.frames_processed = METRICS.counter("trafficvision_frames_total", "Frames procesados", camera=camera_id)
+
+        # La homografía se carga primero: si falta no tiene sentido abrir el video
+        self.track_store = TrackStore(max_tracks=max_tracks, max_idle=max_idle)
+        self.speed_estimator = SpeedEstimator(matrix_path, store=self.track_store, use_grid=ground_grid)
+
+        # Polígono de calibración guardado junto a la homografía: el detector solo mira esa zona
+        self.roi = None
+        roi_path = roi_path_for(matrix_path)
+        if use_roi and os.path.exists(roi_path):
+            self.roi = RegionOfInterest.load(roi_path, roi_padding)
+            print(f"[INFO] {camera_id}: inferencia limitada a la ROI {self.roi.rect}")
+
+        # Líneas de conteo y zonas de ocupación en metros, guardadas junto a la homografía
+        self.zones = None
+        zones_path = zones_path_for(matrix_path)
+        if use_zones and os.path.exists(zones_path):
+            self.zones = ZoneEngine.load(zones_path, self.track_store, camera_id, occupancy_interval,
+                                         class_names=Tracker.CLASS_NAMES_DICT)
+            print(f"[INFO] {camera_id}: {len(self.zones.line_names)} líneas de conteo y "
+                  f"{len(self.zones.zone_names)} zonas desde {zones_path}")
+
+        # Puntos en píxeles de cada track para poder recalcular velocidades tras recalibrar
+        self.trajectories = TrajectoryRecorder(trajectory_dir, camera_id, retention_months=retention_months) if trajectory_dir else None
+
+        self.summarizer = None
+        if summaries:
+            self.summarizer = TrackSummarizer(camera_id, checkpoint_interval)
+            self.track_store.on_evict.append(lambda tracker_id, reason: self.summarizer.end(tracker_id))
+
+        if shared_memory:
+            # Decodificación en un proceso aparte; los frames son vistas de un pool fijo de slots
+            self.loader = SharedMemoryLoader(source, slots=frame_slots, skip_frames=skip_frames)
+        else:
+            # notify: evento compartido que se activa cuando llega un frame (varias cámaras en un hilo)
+            self.loader = VideoLoader(source, skip_frames=skip_frames, notify=notify,
+                                      start_frame=start_frame, end_frame=end_frame, timer=self.timers["decode"],
+                                      with_index=frame_index)
+
+        # ByteTrack recibe fps / skip frames por segundo, no los del video
+        self.tracker = Tracker(frame_rate=self.loader.fps / self.loader.skip_frames, lost_track_seconds=lost_track_seconds)
+        self.active_tracks = 0
+
+        # Con adaptive_skip, skip_frames pasa a ser el mínimo y el scheduler lo ajusta entre ese valor y max_skip
+        self.scheduler = None
+        if adaptive_skip:
+            self.scheduler = AdaptiveScheduler(self.loader.fps, min_skip=skip_frames,
+                                               max_skip=max_skip, dense_tracks=dense_tracks)
+
+        # Se leen al exportar: self.loader puede reemplazarse (p. ej. por un DetectionReplay)
+        METRICS.gauge("trafficvision_loader_queue", lambda: self.loader.queued(),
+                      "Frames decodificados en espera", camera=camera_id)
+        METRICS.gauge("trafficvision_loader_dropped", lambda: self.loader.dropped,
+                      "Frames descartados por drop_oldest", camera=camera_id)
+        METRICS.gauge("trafficvision_live_tracks", lambda: self.track_store.live,
+                      "Vehículos en el TrackStore", camera=camera_id)
+        METRICS.gauge("trafficvision_skip_frames", lambda: self.loader.skip_frames,
+                      "Skip actual del loader", camera=camera_id)
+
+    def start(self):
+        self.loader.start()
+        return self
+
+    def finished(self):
+        return self.loader.stopped and not self.loader.more()
+
+    def process(self, raw_detections, current_time, logger, timestamp=None):
+        # Un solo timestamp por frame para todas sus filas (y sus puntos de trayectoria)
+        timestamp = timestamp or datetime.now()
+        timers = self.timers
+        t0 = time.perf_counter()
+        detections = self.tracker.update(raw_detections)
+        if len(detections) > self.track_store.max_tracks:
+            # Más vehículos en un frame que slots en el store: los sobrantes se ignoran en este frame
+            if self.track_store.overflow == 0:
+                print(f"[WARN] {self.camera_id}: {len(detections)} vehículos en un frame con MAX_TRACKS = "
+                      f"{self.track_store.max_tracks}; se ignoran los que no entran")
+            self.track_store.overflow += len(detections) - self.track_store.max_tracks
+            detections = detections[:self.track_store.max_tracks]
+        live_ids = self.tracker.live_ids()
+        self.active_tracks = len(live_ids)
+        self.track_store.sync(live_ids, current_time)
+        t1 = time.perf_counter()
+        timers["track"].observe(t1 - t0)
+
+        speeds, directions = self.speed_estimator.estimate_batch(
+            detections.tracker_id, detections.xyxy, current_time
+        )
+        t2 = time.perf_counter()
+        timers["speed"].observe(t2 - t1)
+
+        if self.trajectories is not None and len(detections) > 0:
+            self.trajectories.record(timestamp, current_time, detections.tracker_id, detections.class_id,
+                                     self.speed_estimator.anchors(detections.xyxy))
+
+        for tracker_id, class_id, speed, direction_code in zip(detections.tracker_id, detections.class_id, speeds, directions):
+
+            if np.isnan(speed):
+                continue
+
+            final_speed = int(speed * self.correction_factor)
+            direction = DIRECTION_NAMES[int(direction_code)]
+
+            slot = self.track_store.get(tracker_id)
+            self.track_store.speed[slot] = final_speed
+            self.track_store.direction[slot] = direction_code
+
+            cls_name = self.tracker.CLASS_NAMES_DICT.get(class_id, "Vehiculo")
+            # Cada muestra va al logger, que decide si guardarla (traffic_logs) o solo agregarla (rollup)
+            logger.log(tracker_id, cls_name, final_speed, direction, camera_id=self.camera_id, timestamp=timestamp)
+            if self.summarizer is not None:
+                self.summarizer.add(tracker_id, cls_name, final_speed, direction_code, timestamp)
+
+        if self.summarizer is not None:
+            self.summarizer.checkpoint(timestamp)
+            self.summarizer.flush(logger)
+
+        # Trayectorias, logger y resúmenes
+        t3 = time.perf_counter()
+        timers["log"].observe(t3 - t2)
+
+        if self.zones is not None:
+            slots = self.speed_estimator.batch_slots
+            prev, curr, has_prev = self.speed_estimator.last_segments(slots)
+            tracker_ids = detections.tracker_id if len(detections) > 0 else np.empty(0, dtype=np.int64)
+            self.zones.update(slots, tracker_ids, detections.class_id, prev, curr, has_prev, timestamp)
+            self.zones.flush(logger)
+            timers["zones"].observe(time.perf_counter() - t3)
+
+        self.frames_processed.inc()
+        return detections
+
+    def schedule(self, processing_time):
+        # Después de cada frame: ajusta cuántos frames saltea el loader y el frame rate del tracker
+        if self.scheduler is None:
+            return self.loader.skip_frames
+
+        skip = self.scheduler.update(processing_time, self.active_tracks)
+        if skip != self.loader.skip_frames:
+            self.loader.skip_frames = skip
+            self.tracker.set_frame_rate(self.scheduler.effective_fps())
+        return skip
+
+    def flush(self, logger):
+        # Cierra los tracks que siguen abiertos al terminar el video o el proceso
+        if self.trajectories is not None:
+            self.trajectories.flush()
+        if self.zones is not None:
+            self.zones.end(logger)
+        if self.summarizer is not None:
+            self.summarizer.end_all()
+            self.summarizer.flush(logger)
+
+    def stop(self):
+        self.loader.stop()
@@ -0,0 +1,141 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import supervision as sv
+
+COLUMNS = {"xyxy": np.float32, "confidence": np.float32, "class_id": np.int16}
+
+def content_hash(path, samples=16, block=1024 * 1024):
+    # Huella del contenido sin leer el archivo entero: tamaño + `samples` bloques repartidos.
+    # Basta para distinguir grabaciones y detectar que un archivo cambió, en milisegundos.
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        for offset in np.linspace(0, max(0, size - block), samples).astype(np.int64):
+            f.seek(int(offset))
+            digest.update(f.read(block))
+    return digest.hexdigest()
+
+class DetectionCache:
+    # Detecciones por frame de un video guardadas en columnas .npy:
+    #   times (F,) | offsets (F+1,) | xyxy (N, 4) | confidence (N,) | class_id (N,)
+    # Las del frame i son las filas offsets[i]:offsets[i+1]. Se leen con mmap, sin cargar todo a memoria.
+    # La clave incluye todo lo que cambia la salida del detector; cambiar CORRECTION_FACTOR,
+    # la homografía o el tracker reutiliza el mismo cache.
+    def __init__(self, root, video_path, model_name, conf, imgsz, backend, skip_frames, roi=None):
+        self.params = {
+            "video": content_hash(video_path),
+            "model": os.path.basename(model_name),
+            "conf": conf,
+            "imgsz": imgsz,
+            "backend": backend,
+            "skip_frames": skip_frames,
+            "roi": list(map(int, roi.rect)) if roi is not None else None,
+        }
+        key = hashlib.sha256(json.dumps(self.params, sort_keys=True).encode()).hexdigest()[:16]
+        stem = os.path.splitext(os.path.basename(video_path))[0]
+        self.path = os.path.join(root, f"{stem}_{key}")
+
+    @property
+    def complete(self):
+        return os.path.exists(os.path.join(self.path, "meta.json"))
+
+    def recorder(self):
+        return CacheRecorder(self)
+
+    def replay(self):
+        return DetectionReplay(self.path)
+
+class CacheRecorder:
+    def __init__(self, cache):
+        self.cache = cache
+        self.times = []
+        self.counts = []
+        self.columns = {name: [] for name in COLUMNS}
+
+    def add(self, current_time, detections):
+        self.times.append(current_time)
+        self.counts.append(len(detections))
+        self.columns["xyxy"].append(detections.xyxy.reshape(-1, 4))
+        self.columns["confidence"].append(detections.confidence if detections.confidence is not None
+                                          else np.ones(len(detections)))
+        self.columns["class_id"].append(detections.class_id if detections.class_id is not None
+                                        else np.zeros(len(detections)))
+
+    def save(self):
+        # Se escribe en un directorio temporal y se renombra: un cache a medias nunca queda visible
+        tmp = self.cache.path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        np.save(os.path.join(tmp, "times.npy"), np.asarray(self.times, dtype=np.float64))
+        np.save(os.path.join(tmp, "offsets.npy"), np.concatenate([[0], np.cumsum(self.counts)]).astype(np.int64))
+        for name, dtype in COLUMNS.items():
+            parts = self.columns[name]
+            empty = np.empty((0, 4) if name == "xyxy" else 0, dtype=dtype)
+            np.save(os.path.join(tmp, f"{name}.npy"), np.concatenate(parts).astype(dtype) if parts else empty)
+
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({**self.cache.params, "frames": len(self.times), "detections": int(sum(self.counts))}, f, indent=2)
+
+        shutil.rmtree(self.cache.path, ignore_errors=True)
+        os.replace(tmp, self.cache.path)
+        print(f"[CACHE] {len(self.times)} frames guardados en {self.cache.path}")
+
+class DetectionReplay:
+    # Reproduce un cache completo. Sirve de detector (detect) y, si no hace falta la imagen
+    # (sin ventana ni video anotado), también de loader (read) sin decodificar el video.
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.times = np.load(os.path.join(path, "times.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+
+        self.detect_idx = 0
+        self.read_idx = 0
+        self.stopped = False
+        # Misma interfaz que VideoLoader para las métricas de CameraStream: sin cola ni frames descartados
+        self.dropped = 0
+        self.skip_frames = self.meta["skip_frames"]
+        print(f"[CACHE] Reproduciendo {self.meta['frames']} frames desde {path}")
+
+    def __len__(self):
+        return len(self.times)
+
+    def detections(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return sv.Detections(
+            xyxy=np.array(self.columns["xyxy"][start:end], dtype=np.float32),
+            confidence=np.array(self.columns["confidence"][start:end], dtype=np.float32),
+            class_id=np.array(self.columns["class_id"][start:end], dtype=int),
+        )
+
+    def detect(self, frame=None, roi=None):
+        if self.detect_idx >= len(self.times):
+            return sv.Detections.empty()
+        detections = self.detections(self.detect_idx)
+        self.detect_idx += 1
+        return detections
+
+    def start(self):
+        return self
+
+    def read(self, block=True, timeout=None):
+        if self.read_idx >= len(self.times):
+            self.stopped = True
+            return None
+        current_time = float(self.times[self.read_idx])
+        self.read_idx += 1
+        return None, current_time
+
+    def more(self):
+        return self.read_idx < len(self.times)
+
+    def queued(self):
+        return 0
+
+    def stop(self):
+        self.stopped = True
@@ -0,0 +1,56 @@
+import math
+
+class AdaptiveScheduler:
+    # Decide cada cuántos frames del video se corre la detección (skip), según:
+    #  - carga: el tiempo medio de procesar un frame tiene que entrar en el presupuesto de tiempo real
+    #    (skip / fps segundos de video entre frames procesados), con un margen `utilization`;
+    #  - densidad: con muchos vehículos activos se procesa denso (min_skip) y con la calle vacía
+    #    se espacia hasta max_skip.
+    # Baja rápido (un vehículo nuevo necesita muestras) y sube de a un paso cada `patience` frames.
+    def __init__(self, fps, min_skip=1, max_skip=10, dense_tracks=6, utilization=0.8, patience=15, smoothing=0.2):
+        self.fps = fps
+        self.min_skip = max(1, int(min_skip))
+        self.max_skip = max(self.min_skip, int(max_skip))
+        self.dense_tracks = max(1, dense_tracks)
+        self.utilization = utilization
+        self.patience = patience
+        self.smoothing = smoothing
+
+        self.skip = self.min_skip
+        self.avg_time = None
+        self.calm_frames = 0
+
+    def load_skip(self):
+        # Skip mínimo para no atrasarse respecto de la fuente
+        if self.avg_time is None:
+            return self.min_skip
+        return math.ceil(self.avg_time * self.fps / self.utilization)
+
+    def density_skip(self, active_tracks):
+        # Interpolación lineal: 0 tracks -> max_skip, dense_tracks o más -> min_skip
+        density = min(active_tracks, self.dense_tracks) / self.dense_tracks
+        return round(self.max_skip - density * (self.max_skip - self.min_skip))
+
+    def update(self, processing_time, active_tracks):
+        if self.avg_time is None:
+            self.avg_time = processing_time
+        else:
+            self.avg_time += self.smoothing * (processing_time - self.avg_time)
+
+        target = max(self.load_skip(), self.density_skip(active_tracks))
+        target = min(max(target, self.min_skip), self.max_skip)
+
+        if target < self.skip:
+            self.skip = target
+            self.calm_frames = 0
+        elif target > self.skip:
+            self.calm_frames += 1
+            if self.calm_frames >= self.patience:
+                self.skip += 1
+                self.calm_frames = 0
+        else:
+            self.calm_frames = 0
+        return self.skip
+
+    def effective_fps(self):
+        return self.fps / self.skip
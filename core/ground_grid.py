@@ -0,0 +1,70 @@
+import os
+import json
+import cv2
+import numpy as np
+
+def grid_path_for(matrix_path):
+    # config/homography_matrix.npy -> config/homography_matrix_grid.npy (+ _grid.json con el paso)
+    base, _ = os.path.splitext(matrix_path)
+    return f"{base}_grid.npy"
+
+def build_grid(H, frame_size, stride=4):
+    # Coordenadas en metros de cada stride-ésimo píxel, cubriendo todo el frame (incluido el borde)
+    width, height = frame_size
+    nx = int(np.ceil(width / stride)) + 1
+    ny = int(np.ceil(height / stride)) + 1
+    xs, ys = np.meshgrid(np.arange(nx, dtype=np.float32) * stride, np.arange(ny, dtype=np.float32) * stride)
+    pixels = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2)
+    return cv2.perspectiveTransform(pixels, H).reshape(ny, nx, 2).astype(np.float32)
+
+def save_grid(path, grid, stride, frame_size):
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, grid)
+    os.replace(path + ".tmp", path)
+    with open(os.path.splitext(path)[0] + ".json", "w") as f:
+        json.dump({"stride": stride, "frame_size": list(frame_size)}, f)
+
+class GroundGrid:
+    # Tabla píxel -> metros precalculada. Se abre con mmap: varios procesos de la misma cámara
+    # comparten las mismas páginas en memoria. La consulta es una interpolación bilineal en NumPy
+    # (con muestras por frame es más lenta que cv2.perspectiveTransform: ver GROUND_GRID en main.py).
+    def __init__(self, path):
+        with open(os.path.splitext(path)[0] + ".json") as f:
+            meta = json.load(f)
+        self.stride = float(meta["stride"])
+        self.frame_size = tuple(meta["frame_size"])
+        self.grid = np.load(path, mmap_mode="r")
+        self.nx = self.grid.shape[1]
+        self.flat = self.grid.reshape(-1, 2)
+        self.max_x = self.grid.shape[1] - 1 - 1e-4
+        self.max_y = self.grid.shape[0] - 1 - 1e-4
+
+    def transform_points(self, points):
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        gx = np.clip(points[:, 0] / self.stride, 0, self.max_x)
+        gy = np.clip(points[:, 1] / self.stride, 0, self.max_y)
+        ix = gx.astype(np.intp)
+        iy = gy.astype(np.intp)
+        fx = (gx - ix)[:, None]
+        fy = (gy - iy)[:, None]
+
+        # Las 4 esquinas de cada celda en una sola lectura de la tabla aplanada
+        i = iy * self.nx + ix
+        corners = self.flat.take(np.concatenate([i, i + 1, i + self.nx, i + self.nx + 1]), axis=0)
+        c00, c01, c10, c11 = corners.reshape(4, -1, 2)
+        top = c00 + (c01 - c00) * fx
+        bottom = c10 + (c11 - c10) * fx
+        return (top + (bottom - top) * fy).astype(np.float32)
+
+    def max_error(self, H, polygon, samples=2000):
+        # Error de la interpolación contra la homografía exacta, en puntos al azar dentro del polígono
+        x0, y0 = polygon.min(axis=0)
+        x1, y1 = polygon.max(axis=0)
+        rng = np.random.default_rng(0)
+        candidates = rng.uniform([x0, y0], [x1, y1], size=(samples * 4, 2)).astype(np.float32)
+        inside = np.array([cv2.pointPolygonTest(polygon, (float(x), float(y)), False) >= 0 for x, y in candidates])
+        points = candidates[inside][:samples]
+        if len(points) == 0:
+            return 0.0
+        exact = cv2.perspectiveTransform(points.reshape(-1, 1, 2), H).reshape(-1, 2)
+        return float(np.abs(self.transform_points(points) - exact).max())
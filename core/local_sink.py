@@ -0,0 +1,498 @@
+import os
+import re
+import time
+import shutil
+import sqlite3
+import importlib
+import psycopg2
+from datetime import datetime, date, time as dtime, timedelta
+from threading import Thread, Event
+from core.pg_copy import TRAFFIC_LOGS, TABLES, BatchWriter
+from core.pipeline import Channel, END
+from core.partition_manager import PartitionManager, add_months
+from core.rollup import MinuteRollup, ROLLUP_1M
+from core.sink import Sink
+from core.metrics import METRICS
+
+# Salida local para equipos sin base de datos (o con la DB caída). Estructura en disco:
+#   <directorio>/y2026m10/20261018_14_<pid>_<run>.sqlite          SQLite: todas las tablas de esa hora
+#   <directorio>/y2026m10/20261018_14_<pid>_<run>_0000.traffic_logs.parquet   Parquet: una tabla por archivo
+# <run> es el arranque del LocalSink en ms: un reinicio con el mismo PID en la misma hora no pisa archivos.
+# La carpeta del mes es la partición (misma fecha de partición que en Postgres) y la retención borra
+# carpetas enteras, como PartitionManager borra particiones. Los archivos se rotan por hora de escritura:
+# mientras se escriben terminan en .part / .tmp y solo los cerrados los toma LocalUploader, que los
+# renombra a .uploading mientras los sube.
+
+LOCAL_FORMATS = ("sqlite", "parquet")
+LOCAL_TABLES = {**TABLES, ROLLUP_1M.name: ROLLUP_1M}
+MONTH_PATTERN = re.compile(r"^y(?P<year>\d{4})m(?P<month>\d{2})$")
+HOUR_FORMAT = "%Y%m%d_%H"
+CLAIM_SUFFIX = ".uploading"
+# Un .uploading sin tocar hace más de esto es de un uploader que se cayó a mitad de la subida
+STALE_CLAIM = timedelta(hours=1)
+
+SQLITE_TYPES = {"timestamp": "TEXT", "date": "TEXT", "time": "TEXT", "int4": "INTEGER", "int8": "INTEGER",
+                "float8": "REAL", "bool": "INTEGER", "text": "TEXT"}
+# Fechas y horas como texto ISO (sqlite3 ya no trae adaptadores por defecto para datetime)
+TO_SQLITE = {"timestamp": lambda v: v.isoformat(" "), "date": date.isoformat, "time": dtime.isoformat, "bool": int}
+FROM_SQLITE = {"timestamp": datetime.fromisoformat, "date": date.fromisoformat, "time": dtime.fromisoformat,
+               "bool": bool}
+
+def month_dir(year, month):
+    return f"y{year}m{month:02d}"
+
+def month_of(spec, row):
+    # Mes de la partición a la que iría la fila en Postgres; sin partición, el de la columna de tiempo
+    if spec.partition_index is not None:
+        value = row[spec.partition_index]
+    else:
+        value = row[spec.columns.index(spec.time_column)]
+    return value.year, value.month
+
+def convert_rows(spec, rows, converters):
+    fns = [converters.get(t) for t in spec.types]
+    if not any(fns):
+        return rows
+    return [tuple(v if f is None or v is None else f(v) for v, f in zip(row, fns)) for row in rows]
+
+def polars_schema(spec):
+    import polars as pl
+    types = {"timestamp": pl.Datetime("us"), "date": pl.Date, "time": pl.Time, "int4": pl.Int32,
+             "int8": pl.Int64, "float8": pl.Float64, "bool": pl.Boolean, "text": pl.Utf8}
+    return [(column, types[t]) for column, t in zip(spec.columns, spec.types)]
+
+class SqliteFile:
+    # Un archivo por hora con una tabla por TableSpec. WAL: cada lote es una transacción corta sin
+    # reescribir el archivo principal, y se puede leer (p. ej. un tablero local) mientras se escribe.
+    def __init__(self, directory, hour, run):
+        self.path = os.path.join(directory, f"{hour}_{os.getpid()}_{run}.sqlite")
+        self.conn = sqlite3.connect(self.path + ".part")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.created = set()
+
+    def write(self, spec, rows):
+        if spec.name not in self.created:
+            columns = ", ".join(f"{c} {SQLITE_TYPES[t]}" for c, t in zip(spec.columns, spec.types))
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {spec.name} ({columns})")
+            self.created.add(spec.name)
+        placeholders = ", ".join("?" * len(spec.columns))
+        with self.conn:
+            self.conn.executemany(f"INSERT INTO {spec.name} ({spec.column_list()}) VALUES ({placeholders})",
+                                  convert_rows(spec, rows, TO_SQLITE))
+
+    def close(self):
+        close_sqlite(self.conn, self.path + ".part", self.path)
+
+def close_sqlite(conn, part_path, path):
+    # El WAL vuelve al archivo principal antes de renombrarlo: el archivo cerrado queda autocontenido
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+    os.replace(part_path, path)
+
+class ParquetFile:
+    # Parquet no admite agregar filas: se acumulan en memoria y se escribe una parte cada
+    # `rows_per_file` filas, al cambiar la hora y al cerrar (cada parte a .tmp y luego renombrada).
+    # Una caída pierde como máximo lo acumulado; con SQLite, como máximo el lote en curso.
+    def __init__(self, directory, hour, run, rows_per_file=100000):
+        self.directory = directory
+        self.prefix = f"{hour}_{os.getpid()}_{run}"
+        self.rows_per_file = rows_per_file
+        self.buffers = {}
+        self.seq = 0
+
+    def write(self, spec, rows):
+        buffer = self.buffers.setdefault(spec.name, [])
+        buffer.extend(rows)
+        if len(buffer) >= self.rows_per_file:
+            self.dump(spec.name)
+
+    def dump(self, name):
+        import polars as pl
+        rows = self.buffers.pop(name, None)
+        if not rows:
+            return
+        path = os.path.join(self.directory, f"{self.prefix}_{self.seq:04d}.{name}.parquet")
+        self.seq += 1
+        frame = pl.DataFrame(rows, schema=polars_schema(LOCAL_TABLES[name]), orient="row", strict=False)
+        frame.write_parquet(path + ".tmp", compression="zstd")
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        for name in list(self.buffers):
+            self.dump(name)
+
+def read_local_file(path):
+    # {tabla: filas} de un archivo cerrado (o reclamado), con los tipos de Python que esperan los codificadores COPY
+    name = path[:-len(CLAIM_SUFFIX)] if path.endswith(CLAIM_SUFFIX) else path
+    if name.endswith(".sqlite"):
+        conn = sqlite3.connect(path)
+        try:
+            names = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            tables = {}
+            for name in names:
+                spec = LOCAL_TABLES[name]
+                rows = conn.execute(f"SELECT {spec.column_list()} FROM {name}").fetchall()
+                tables[name] = convert_rows(spec, rows, FROM_SQLITE)
+            return tables
+        finally:
+            conn.close()
+
+    import polars as pl
+    name = os.path.basename(name).split(".")[-2]
+    if name not in LOCAL_TABLES:
+        raise KeyError(f"tabla desconocida {name}")
+    return {name: pl.read_parquet(path).rows()}
+
+def closed_files(directory):
+    # Archivos cerrados pendientes de subir, del más viejo al más nuevo
+    if not os.path.isdir(directory):
+        return []
+    paths = []
+    for month in sorted(os.listdir(directory)):
+        if not MONTH_PATTERN.match(month):
+            continue
+        month_path = os.path.join(directory, month)
+        paths.extend(os.path.join(month_path, n) for n in sorted(os.listdir(month_path))
+                     if n.endswith((".sqlite", ".parquet")))
+    return paths
+
+def claim(path):
+    # Rename atómico antes de leer: si dos uploaders (el de main.py y utils/upload_local.py) ven el mismo
+    # archivo, solo uno lo renombra y el otro recibe FileNotFoundError. None: ya lo tomó otro
+    claimed = path + CLAIM_SUFFIX
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        return None
+    # El mtime marca el momento del reclamo, para reconocer los abandonados
+    os.utime(claimed)
+    return claimed
+
+def release_stale_claims(directory, now=None):
+    # Devuelve a la cola los .uploading de uploaders que se cayeron (la transacción no llegó a confirmarse)
+    now = now or time.time()
+    if not os.path.isdir(directory):
+        return
+    for month in os.listdir(directory):
+        if not MONTH_PATTERN.match(month):
+            continue
+        month_path = os.path.join(directory, month)
+        for name in os.listdir(month_path):
+            if not name.endswith(CLAIM_SUFFIX):
+                continue
+            claimed = os.path.join(month_path, name)
+            try:
+                if now - os.path.getmtime(claimed) < STALE_CLAIM.total_seconds():
+                    continue
+                os.replace(claimed, claimed[:-len(CLAIM_SUFFIX)])
+                print(f"[LOCAL] Liberado {claimed}")
+            except FileNotFoundError:
+                # Lo terminó (o liberó) otro proceso mientras tanto
+                pass
+
+class LocalSink(Sink):
+    def __init__(self, directory, fmt="sqlite", batch_size=500, flush_interval=1.0, retention_months=3, camera_id=None,
+                 store_frames=True, rollup=False, rows_per_file=100000, blocking=False):
+        if fmt not in LOCAL_FORMATS:
+            raise ValueError(f"Formato local desconocido: {fmt}. Opciones: {LOCAL_FORMATS}")
+        if fmt == "parquet":
+            # Dependencia opcional: se importa solo para fallar al arrancar y no en el primer lote
+            importlib.import_module("polars")
+
+        self.directory = directory
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_months = retention_months
+        self.camera_id = camera_id
+        self.store_frames = store_frames
+        # Los minutos cerrados se guardan como filas de traffic_rollup_1m y se suben con upsert
+        self.rollup = MinuteRollup() if rollup else None
+        self.rows_per_file = rows_per_file
+        self.channel = Channel(2000)
+        self.blocking = blocking
+        self.stopped = False
+        self.dropped = 0
+
+        # Archivos abiertos de la hora en curso, por carpeta de mes
+        self.run = int(time.time() * 1000)
+        self.hour = None
+        self.files = {}
+
+        self.rows_written = METRICS.counter("trafficvision_local_rows_total", "Filas escritas en archivos locales")
+        self.write_timer = METRICS.histogram("trafficvision_local_write_seconds", "Tiempo de escritura de cada lote local")
+        METRICS.gauge("trafficvision_logger_queue", lambda: len(self.channel), "Filas en la cola del logger")
+        METRICS.gauge("trafficvision_logger_dropped", lambda: self.dropped, "Filas descartadas")
+
+        os.makedirs(directory, exist_ok=True)
+        self.maintain()
+        print(f"[INFO] Salida local ({fmt}) en '{directory}'.")
+
+        self.thread = Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def wants_frames(self):
+        return self.store_frames or self.rollup is not None
+
+    def log_row(self, spec, row):
+        if self.stopped:
+            return
+        if not self.channel.put((spec, row), block=self.blocking):
+            self.dropped += 1
+
+    def stats(self):
+        return {"queue_size": len(self.channel), "dropped": self.dropped, "closed_files": len(closed_files(self.directory))}
+
+    def ensure(self, year, month):
+        # Equivalente local de PartitionManager.ensure: la carpeta del mes
+        path = os.path.join(self.directory, month_dir(year, month))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def maintain(self, today=None):
+        # Cada hora (y al arrancar): retención por mes, cierre de archivos que quedaron a medio escribir
+        # y liberación de subidas abandonadas
+        release_stale_claims(self.directory)
+        today = today or date.today()
+        cutoff = add_months(today.year, today.month, -self.retention_months)
+        now = datetime.now()
+        for month in sorted(os.listdir(self.directory)):
+            match = MONTH_PATTERN.match(month)
+            if not match:
+                continue
+            path = os.path.join(self.directory, month)
+            if (int(match.group("year")), int(match.group("month"))) < cutoff:
+                print(f"[LIMPIEZA] Eliminando carpeta: {path}")
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            for name in os.listdir(path):
+                if not name.endswith((".sqlite.part", ".parquet.tmp")):
+                    continue
+                # Un .part de hace dos horas o más no lo escribe nadie (todos rotan al cambiar la hora):
+                # viene de un proceso que se cayó. El de la hora anterior puede estar cerrándose ahora mismo
+                if now - datetime.strptime(name[:11], HOUR_FORMAT) < timedelta(hours=2):
+                    continue
+                stale = os.path.join(path, name)
+                try:
+                    if name.endswith(".sqlite.part"):
+                        close_sqlite(sqlite3.connect(stale), stale, stale[:-len(".part")])
+                        print(f"[LOCAL] Recuperado {stale}")
+                    elif name.endswith(".parquet.tmp"):
+                        os.remove(stale)
+                except Exception as e:
+                    print(f"[ERROR LOCAL] {stale}: {e}")
+
+    def rotate(self, hour):
+        self.close_files()
+        self.hour = hour
+        self.maintain()
+
+    def close_files(self):
+        for f in self.files.values():
+            try:
+                f.close()
+            except Exception as e:
+                print(f"[ERROR LOCAL] {e}")
+        self.files = {}
+
+    def file_for(self, year, month):
+        f = self.files.get((year, month))
+        if f is None:
+            directory = self.ensure(year, month)
+            if self.fmt == "sqlite":
+                f = SqliteFile(directory, self.hour, self.run)
+            else:
+                f = ParquetFile(directory, self.hour, self.run, self.rows_per_file)
+            self.files[(year, month)] = f
+        return f
+
+    def write(self, items):
+        hour = datetime.now().strftime(HOUR_FORMAT)
+        if hour != self.hour:
+            self.rotate(hour)
+
+        groups = {}
+        for spec, row in items:
+            groups.setdefault((month_of(spec, row), spec), []).append(row)
+        started = time.perf_counter()
+        for ((year, month), spec), rows in groups.items():
+            self.file_for(year, month).write(spec, rows)
+            self.rows_written.inc(len(rows))
+        self.write_timer.observe(time.perf_counter() - started)
+
+    def next_timeout(self, now, buffer, last_flush):
+        # Duerme hasta el próximo flush, o hasta el cambio de hora para cerrar los archivos aunque no haya tráfico
+        deadlines = [(now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1) - now).total_seconds()]
+        if buffer or (self.rollup is not None and self.rollup.buckets):
+            deadlines.append(last_flush + self.flush_interval - time.time())
+        return max(0.0, min(deadlines))
+
+    def loop(self):
+        buffer = []
+        last_flush = time.time()
+        ending = False
+
+        while True:
+            if ending and not buffer:
+                break
+
+            item = self.channel.get(timeout=self.next_timeout(datetime.now(), buffer, last_flush))
+            if item is END:
+                ending = True
+            elif item is not None:
+                spec, row = item
+                if spec is TRAFFIC_LOGS and self.rollup is not None:
+                    self.rollup.add(row[0], row[7], row[4], row[6], row[5])
+                if spec is not TRAFFIC_LOGS or self.store_frames:
+                    buffer.append(item)
+
+            current_time = time.time()
+            if ending or len(buffer) >= self.batch_size or current_time - last_flush >= self.flush_interval:
+                if self.rollup is not None:
+                    buffer.extend((ROLLUP_1M, row) for row in self.rollup.pop_closed(close_all=ending))
+                try:
+                    if buffer:
+                        self.write(buffer)
+                    elif self.hour is not None and datetime.now().strftime(HOUR_FORMAT) != self.hour:
+                        self.rotate(datetime.now().strftime(HOUR_FORMAT))
+                except Exception as e:
+                    print(f"[ERROR LOCAL] {e}")
+                    self.dropped += len(buffer)
+                buffer = []
+                last_flush = current_time
+
+        self.close_files()
+        print("[INFO] Salida local finalizada.")
+
+    def stop(self):
+        self.stopped = True
+        self.channel.close()
+        self.thread.join()
+
+class LocalUploader:
+    # Sube a Postgres con COPY los archivos locales cerrados, en un hilo propio cada `interval` segundos
+    # mientras haya conexión. Cada archivo va en una sola transacción y se borra solo si entró completo;
+    # uno que la DB rechaza se aparta como .bad (igual que los segmentos del spill).
+    def __init__(self, directory, db_config, interval=60.0, insert_mode="copy_binary"):
+        self.directory = directory
+        self.db_config = db_config
+        self.interval = interval
+        self.insert_mode = insert_mode
+        self.partitions = PartitionManager(db_config)
+        self.has_rollup = True
+        self.stop_event = Event()
+        self.thread = None
+
+        self.rows_uploaded = METRICS.counter("trafficvision_upload_rows_total", "Filas locales subidas a Postgres")
+        METRICS.gauge("trafficvision_upload_pending_files", lambda: len(closed_files(self.directory)),
+                      "Archivos locales cerrados pendientes de subir")
+
+    def start(self):
+        self.thread = Thread(target=self.loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.upload_pending()
+            except psycopg2.OperationalError:
+                # Sin conexión: se reintenta en el próximo ciclo
+                pass
+            except Exception as e:
+                print(f"[ERROR SUBIDA] {e}")
+
+    def upload_pending(self):
+        release_stale_claims(self.directory)
+        paths = closed_files(self.directory)
+        if not paths:
+            return 0
+        conn = psycopg2.connect(**self.db_config)
+        uploaded = 0
+        try:
+            # Conexión nueva: las particiones vistas antes pueden haberse borrado por retención
+            self.partitions.forget()
+            self.check_rollup(conn)
+            for path in paths:
+                if self.stop_event.is_set():
+                    break
+                uploaded += self.upload_file(conn, path)
+        finally:
+            conn.close()
+        return uploaded
+
+    def check_rollup(self, conn):
+        # Sin las tablas de agregados (init_db.sql anterior) el upsert haría rechazar y apartar el archivo
+        # entero: como en PostgresLogger, se suben el resto de las tablas y los minutos se descartan
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('traffic_rollup_1m') IS NOT NULL AND to_regclass('traffic_rollup_1h') IS NOT NULL")
+            has_rollup = cursor.fetchone()[0]
+        conn.rollback()
+        if self.has_rollup and not has_rollup:
+            print("[WARN] No existen traffic_rollup_1m / traffic_rollup_1h: los agregados locales no se suben.")
+        self.has_rollup = has_rollup
+
+    def upload_file(self, conn, path):
+        claimed = claim(path)
+        if claimed is None:
+            return 0
+        try:
+            return self.upload_claimed(conn, path, claimed)
+        except Exception:
+            # Error de conexión u otro transitorio: el archivo vuelve a la cola para el próximo ciclo
+            os.replace(claimed, path)
+            raise
+
+    def upload_claimed(self, conn, path, claimed):
+        try:
+            tables = read_local_file(claimed)
+        except Exception as e:
+            print(f"[ERROR SUBIDA] {path} ilegible ({e}); se aparta como .bad")
+            os.replace(claimed, path + ".bad")
+            return 0
+        n_rows = sum(len(rows) for rows in tables.values())
+
+        try:
+            # Particiones fuera de la transacción, para que un rollback no las deshaga
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                pieces = [(LOCAL_TABLES[name], self.partitions.split(cursor, LOCAL_TABLES[name], rows))
+                          for name, rows in tables.items() if name != ROLLUP_1M.name]
+
+            conn.autocommit = False
+            with conn.cursor() as cursor:
+                for spec, partitions in pieces:
+                    writer = BatchWriter(spec, self.insert_mode)
+                    for table, rows in partitions:
+                        for i in range(0, len(rows), 5000):
+                            writer.write(cursor, rows[i:i + 5000], table=table)
+                if tables.get(ROLLUP_1M.name) and self.has_rollup:
+                    # Un mismo minuto puede venir en varios lotes del archivo: se combinan antes del upsert,
+                    # que luego los suma a lo que ya haya en la DB, como los escribe PostgresLogger
+                    rollup = MinuteRollup()
+                    rollup.restore(tables[ROLLUP_1M.name])
+                    rollup.write_minutes(cursor, rollup.pop_closed(close_all=True))
+                    rollup.refresh_hours(cursor)
+            conn.commit()
+        except (psycopg2.DataError, psycopg2.IntegrityError, psycopg2.ProgrammingError) as e:
+            conn.rollback()
+            print(f"[ERROR SUBIDA] {path} rechazado por la DB ({e}); se aparta como .bad")
+            os.replace(claimed, path + ".bad")
+            return 0
+        except Exception:
+            conn.rollback()
+            raise
+
+        os.remove(claimed)
+        self.rows_uploaded.inc(n_rows)
+        print(f"[SUBIDA] {n_rows} filas desde {path}")
+        return n_rows
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,247 @@
+import os
+import json
+import math
+import time
+import cProfile
+import pstats
+from bisect import bisect_left
+from threading import Thread, Event, Lock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Límites (segundos) de los histogramas de etapas: de 0.5 ms a 2.5 s
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+class Histogram:
+    # Cuenta por bucket + suma: observe() es un bisect y tres sumas bajo un lock
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        # Estimación por bucket (límite superior del bucket que contiene el cuantil)
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += n
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = Lock()
+
+    def inc(self, n=1):
+        with self.lock:
+            self.value += n
+
+class Gauge:
+    # El valor se lee al exportar (len de una cola, tracks vivos...): no cuesta nada en el bucle principal
+    def __init__(self, fn):
+        self.fn = fn
+
+    @property
+    def value(self):
+        try:
+            return float(self.fn())
+        except Exception:
+            return float("nan")
+
+class Registry:
+    # Métricas por nombre y etiquetas, exportables en formato de texto de Prometheus o como JSON
+    def __init__(self):
+        self.families = {}
+        self.lock = Lock()
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.families.setdefault(name, {"kind": kind, "help": help_text, "series": {}})
+            if family["kind"] != kind:
+                raise ValueError(f"{name} ya está registrada como {family['kind']}")
+            metric = family["series"].get(key)
+            if metric is None:
+                metric = family["series"][key] = factory()
+            return metric
+
+    def histogram(self, name, help_text="", buckets=STAGE_BUCKETS, **labels):
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    def counter(self, name, help_text="", **labels):
+        return self._get("counter", name, help_text, labels, Counter)
+
+    def gauge(self, name, fn, help_text="", **labels):
+        # Registrar de nuevo la misma serie reemplaza la función (p. ej. un loader nuevo)
+        gauge = self._get("gauge", name, help_text, labels, lambda: Gauge(fn))
+        gauge.fn = fn
+        return gauge
+
+    def render(self):
+        lines = []
+        with self.lock:
+            families = [(name, dict(f, series=dict(f["series"]))) for name, f in self.families.items()]
+        for name, family in families:
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            for key, metric in family["series"].items():
+                labels = dict(key)
+                if family["kind"] == "histogram":
+                    cumulative = 0
+                    for bound, n in zip(metric.buckets + (float("inf"),), metric.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_label_text({**labels, 'le': le})} {cumulative}")
+                    lines.append(f"{name}_sum{_label_text(labels)} {metric.sum}")
+                    lines.append(f"{name}_count{_label_text(labels)} {metric.count}")
+                else:
+                    lines.append(f"{name}{_label_text(labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        # Resumen compacto para el log JSON: histogramas como conteo, media y p50/p95 en ms
+        out = {}
+        with self.lock:
+            families = [(name, f["kind"], dict(f["series"])) for name, f in self.families.items()]
+        for name, kind, series in families:
+            for key, metric in series.items():
+                label = ",".join(f"{k}={v}" for k, v in key)
+                field = f"{name}{{{label}}}" if label else name
+                if kind == "histogram":
+                    if metric.count == 0:
+                        continue
+                    out[field] = {
+                        "count": metric.count,
+                        "mean_ms": round(metric.sum / metric.count * 1000, 3),
+                        "p50_ms": round(metric.quantile(0.5) * 1000, 3),
+                        "p95_ms": round(metric.quantile(0.95) * 1000, 3),
+                    }
+                else:
+                    # NaN / inf (gauge que falló, qsize sin soporte) no son JSON válido
+                    value = metric.value
+                    out[field] = value if math.isfinite(value) else None
+        return out
+
+# Registro del proceso, como el REGISTRY por defecto de prometheus_client
+METRICS = Registry()
+
+class MetricsServer:
+    # GET /metrics en formato Prometheus, en un hilo propio. Por defecto solo escucha en localhost.
+    def __init__(self, port, host="127.0.0.1", registry=METRICS):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"[INFO] Métricas en http://{host}:{port}/metrics")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class JsonReporter:
+    # Una línea JSON cada `interval` segundos con el resumen del registro y las tasas de los contadores
+    def __init__(self, interval, registry=METRICS):
+        self.interval = interval
+        self.registry = registry
+        self.stop_event = Event()
+        self.thread = Thread(target=self.loop, daemon=True)
+        self.previous = {}
+        self.last = time.monotonic()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def report(self):
+        now = time.monotonic()
+        elapsed = max(now - self.last, 1e-9)
+        snapshot = self.registry.snapshot()
+        for name, family in list(self.registry.families.items()):
+            if family["kind"] != "counter":
+                continue
+            for key, metric in list(family["series"].items()):
+                label = ",".join(f"{k}={v}" for k, v in key)
+                field = f"{name}{{{label}}}" if label else name
+                snapshot[f"{field}/s"] = round((metric.value - self.previous.get(field, 0)) / elapsed, 2)
+                self.previous[field] = metric.value
+        self.last = now
+        print(json.dumps({"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), **snapshot}), flush=True)
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.report()
+
+class ProfileWindow:
+    # cProfile durante `frames` frames a partir de `start_frame`. El .prof se abre con
+    # `python -m pstats`, snakeviz, o se convierte con flameprof. Solo mide el hilo que lo activa (el bucle
+    # principal: detector, tracker, velocidad, dibujo); para muestrear todos los hilos con py-spy
+    # sin instrumentar: py-spy record --pid <PID> (el PID se imprime al iniciar).
+    def __init__(self, start_frame, frames, path):
+        self.start_frame = start_frame
+        self.end_frame = start_frame + frames
+        self.path = path
+        self.profile = None
+        self.done = False
+        print(f"[INFO] Perfilado de los frames {start_frame}-{self.end_frame} (PID {os.getpid()}) -> {path}")
+
+    def tick(self, frame_number):
+        # Llamar una vez por frame procesado, antes de procesarlo
+        if self.done:
+            return
+        if self.profile is None and frame_number >= self.start_frame:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif self.profile is not None and frame_number >= self.end_frame:
+            self.finish()
+
+    def finish(self):
+        if self.profile is None or self.done:
+            return
+        self.profile.disable()
+        self.done = True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.profile.dump_stats(self.path)
+        print(f"[PERFIL] Guardado en {self.path}. Funciones con más tiempo acumulado:")
+        pstats.Stats(self.path).sort_stats("cumulative").print_stats(15)
@@ -0,0 +1,146 @@
+import re
+import psycopg2
+from threading import Thread, Event, Lock
+from datetime import date
+from core.pg_copy import TABLES
+
+PARTITION_PATTERN = re.compile(r"^(?P<parent>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$")
+
+def add_months(year, month, delta):
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+def partition_name(parent, year, month):
+    return f"{parent}_y{year}m{month:02d}"
+
+class PartitionManager:
+    # Ciclo de vida de las particiones mensuales (traffic_x_yAAAAmMM):
+    #  - crea por adelantado el mes actual y los months_ahead siguientes,
+    #  - cada partición lleva su propio índice BRIN sobre la columna de tiempo,
+    #  - separa y borra las particiones más viejas que retention_months,
+    # todo en un hilo propio cada `interval` segundos, fuera del camino de inserción.
+    def __init__(self, db_config, retention_months=3, months_ahead=2, interval=3600.0, tables=None):
+        self.db_config = db_config
+        self.retention_months = retention_months
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self.specs = [s for s in (tables or TABLES.values()) if s.partition_index is not None]
+
+        self.known = set()
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self.loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def loop(self):
+        while True:
+            self.run_once()
+            if self.stop_event.wait(self.interval):
+                break
+
+    def run_once(self, today=None):
+        today = today or date.today()
+        try:
+            conn = psycopg2.connect(**self.db_config)
+        except Exception as e:
+            print(f"[ERROR MANTENIMIENTO] {e}")
+            return
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                self.precreate(cursor, today)
+                self.expire(cursor, today)
+        except Exception as e:
+            print(f"[ERROR MANTENIMIENTO] {e}")
+        finally:
+            conn.close()
+
+    def create(self, cursor, spec, year, month):
+        name = partition_name(spec.name, year, month)
+        start = date(year, month, 1)
+        end = date(*add_months(year, month, 1), 1)
+
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name}
+            PARTITION OF {spec.name}
+            FOR VALUES FROM ('{start}') TO ('{end}');
+        """)
+        if spec.time_column:
+            # BRIN: ocupa unos KB y sirve igual para rangos de tiempo porque las filas llegan en orden
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name}_brin ON {name} USING BRIN ({spec.time_column})")
+
+        with self.lock:
+            self.known.add((spec.name, year, month))
+        return name
+
+    def ensure(self, cursor, spec, date_obj):
+        # Camino rápido para el logger: solo toca la DB si el mes no fue visto todavía
+        key = (spec.name, date_obj.year, date_obj.month)
+        if key in self.known:
+            return partition_name(*key)
+        return self.create(cursor, spec, date_obj.year, date_obj.month)
+
+    def split(self, cursor, spec, rows):
+        # Un lote puede cruzar el cambio de mes: cada fila va directo a la partición de su fecha
+        if spec.partition_index is None:
+            return [(spec.name, rows)]
+
+        groups = {}
+        for row in rows:
+            record_date = row[spec.partition_index]
+            groups.setdefault((record_date.year, record_date.month), []).append(row)
+
+        return [
+            (self.ensure(cursor, spec, date(year, month, 1)), part_rows)
+            for (year, month), part_rows in groups.items()
+        ]
+
+    def forget(self):
+        with self.lock:
+            self.known.clear()
+
+    def precreate(self, cursor, today):
+        for spec in self.specs:
+            # Bases creadas con una versión anterior de init_db.sql pueden no tener todas las tablas
+            cursor.execute("SELECT to_regclass(%s)", (spec.name,))
+            if cursor.fetchone()[0] is None:
+                continue
+            for delta in range(self.months_ahead + 1):
+                year, month = add_months(today.year, today.month, delta)
+                self.create(cursor, spec, year, month)
+
+    def expire(self, cursor, today):
+        cutoff_year, cutoff_month = add_months(today.year, today.month, -self.retention_months)
+        print(f"[MANTENIMIENTO] Borrando datos anteriores a: {cutoff_year}-{cutoff_month:02d}")
+
+        for spec in self.specs:
+            cursor.execute("""
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE p.relname = %s
+            """, (spec.name,))
+
+            for (table_name,) in cursor.fetchall():
+                match = PARTITION_PATTERN.match(table_name)
+                if not match or match.group("parent") != spec.name:
+                    continue
+
+                year, month = int(match.group("year")), int(match.group("month"))
+                if (year, month) >= (cutoff_year, cutoff_month):
+                    continue
+
+                print(f"[LIMPIEZA] Eliminando tabla: {table_name}")
+                cursor.execute(f"ALTER TABLE {spec.name} DETACH PARTITION {table_name}")
+                cursor.execute(f"DROP TABLE {table_name}")
+                with self.lock:
+                    self.known.discard((spec.name, year, month))
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
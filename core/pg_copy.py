@@ -0,0 +1,192 @@
+import io
+import struct
+from datetime import datetime, date, time, timedelta
+from psycopg2 import extras
+
+# Época de PostgreSQL para los tipos de fecha en formato binario
+PG_EPOCH_DATETIME = datetime(2000, 1, 1)
+PG_EPOCH_DATE = date(2000, 1, 1)
+
+BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+BINARY_TRAILER = struct.pack(">h", -1)
+
+INSERT_MODES = ("values", "copy_text", "copy_binary")
+
+_int16 = struct.Struct(">h")
+_int32 = struct.Struct(">i")
+_field_int32 = struct.Struct(">ii")
+_field_int64 = struct.Struct(">iq")
+_field_float8 = struct.Struct(">id")
+_field_bool = struct.Struct(">i?")
+
+def _encode_timestamp(value):
+    delta = value - PG_EPOCH_DATETIME
+    return _field_int64.pack(8, delta.days * 86400000000 + delta.seconds * 1000000 + delta.microseconds)
+
+def _encode_date(value):
+    return _field_int32.pack(4, (value - PG_EPOCH_DATE).days)
+
+def _encode_time(value):
+    return _field_int64.pack(8, ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 + value.microsecond)
+
+def _encode_text(value):
+    data = value.encode("utf-8")
+    return _int32.pack(len(data)) + data
+
+BINARY_ENCODERS = {
+    "timestamp": _encode_timestamp,
+    "date": _encode_date,
+    "time": _encode_time,
+    "int4": lambda v: _field_int32.pack(4, v),
+    "int8": lambda v: _field_int64.pack(8, v),
+    "float8": lambda v: _field_float8.pack(8, v),
+    "bool": lambda v: _field_bool.pack(1, v),
+    "text": _encode_text,
+}
+
+def _decode_time(data):
+    micros = struct.unpack(">q", data)[0]
+    seconds, micro = divmod(micros, 1000000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return time(hour, minute, second, micro)
+
+BINARY_DECODERS = {
+    "timestamp": lambda d: PG_EPOCH_DATETIME + timedelta(microseconds=struct.unpack(">q", d)[0]),
+    "date": lambda d: PG_EPOCH_DATE + timedelta(days=struct.unpack(">i", d)[0]),
+    "time": _decode_time,
+    "int4": lambda d: struct.unpack(">i", d)[0],
+    "int8": lambda d: struct.unpack(">q", d)[0],
+    "float8": lambda d: struct.unpack(">d", d)[0],
+    "bool": lambda d: struct.unpack(">?", d)[0],
+    "text": lambda d: bytes(d).decode("utf-8"),
+}
+
+_TEXT_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+class TableSpec:
+    def __init__(self, name, columns, types, partition_column=None, time_column=None):
+        if len(columns) != len(types):
+            raise ValueError(f"{name}: columnas y tipos no coinciden")
+        unknown = [t for t in types if t not in BINARY_ENCODERS]
+        if unknown:
+            raise ValueError(f"{name}: tipos sin codificador binario {unknown}")
+
+        self.name = name
+        self.columns = tuple(columns)
+        self.types = tuple(types)
+        self.encoders = tuple(BINARY_ENCODERS[t] for t in types)
+        self.decoders = tuple(BINARY_DECODERS[t] for t in types)
+        self.field_count = _int16.pack(len(columns))
+        # Tablas particionadas por mes (traffic_x_yAAAAmMM) según esta columna DATE
+        self.partition_index = self.columns.index(partition_column) if partition_column else None
+        # Columna TIMESTAMP indexada con BRIN en cada partición
+        self.time_column = time_column
+
+    def column_list(self):
+        return ", ".join(self.columns)
+
+    def insert_sql(self, table=None):
+        return f"INSERT INTO {table or self.name} ({self.column_list()}) VALUES %s"
+
+    def copy_sql(self, fmt, table=None):
+        return f"COPY {table or self.name} ({self.column_list()}) FROM STDIN WITH (FORMAT {fmt})"
+
+    def encode_binary_row(self, row):
+        parts = [self.field_count]
+        for value, encode in zip(row, self.encoders):
+            parts.append(b"\xff\xff\xff\xff" if value is None else encode(value))
+        return b"".join(parts)
+
+    def decode_binary_row(self, data):
+        # Inversa de encode_binary_row, usada para reinsertar filas guardadas en disco
+        data = memoryview(data)
+        offset = 2
+        row = []
+        for decode in self.decoders:
+            length = _int32.unpack_from(data, offset)[0]
+            offset += 4
+            if length < 0:
+                row.append(None)
+                continue
+            row.append(decode(data[offset:offset + length]))
+            offset += length
+        return tuple(row)
+
+    def encode_text_row(self, row):
+        return "\t".join(
+            "\\N" if value is None else str(value).translate(_TEXT_ESCAPES)
+            for value in row
+        ) + "\n"
+
+TRAFFIC_LOGS = TableSpec(
+    "traffic_logs",
+    ("record_timestamp", "record_date", "record_time", "tracker_id", "vehicle_class", "speed_kmh", "direction", "camera_id"),
+    ("timestamp", "date", "time", "int4", "text", "int4", "text", "text"),
+    partition_column="record_date",
+    time_column="record_timestamp",
+)
+
+TRAFFIC_TRACKS = TableSpec(
+    "traffic_tracks",
+    ("first_seen", "record_date", "last_seen", "camera_id", "tracker_id", "vehicle_class", "direction",
+     "duration_s", "samples", "speed_min", "speed_max", "speed_mean", "speed_median", "is_final"),
+    ("timestamp", "date", "timestamp", "text", "int4", "text", "text",
+     "float8", "int4", "int4", "int4", "float8", "float8", "bool"),
+    partition_column="record_date",
+    time_column="first_seen",
+)
+
+TRAFFIC_CROSSINGS = TableSpec(
+    "traffic_crossings",
+    ("record_timestamp", "record_date", "camera_id", "line_name", "tracker_id", "vehicle_class", "direction", "speed_kmh"),
+    ("timestamp", "date", "text", "text", "int4", "text", "text", "int4"),
+    partition_column="record_date",
+    time_column="record_timestamp",
+)
+
+TRAFFIC_OCCUPANCY = TableSpec(
+    "traffic_occupancy",
+    ("bucket", "record_date", "camera_id", "zone_name", "samples", "occupancy_mean", "occupancy_max"),
+    ("timestamp", "date", "text", "text", "int4", "float8", "int4"),
+    partition_column="record_date",
+    time_column="bucket",
+)
+
+# Tablas conocidas por nombre (para reinsertar lo que quedó guardado en disco)
+TABLES = {spec.name: spec for spec in (TRAFFIC_LOGS, TRAFFIC_TRACKS, TRAFFIC_CROSSINGS, TRAFFIC_OCCUPANCY)}
+
+class BatchWriter:
+    # Escribe lotes de filas de una tabla con execute_values o con COPY (texto o binario).
+    # El buffer en memoria se reutiliza entre lotes para no reasignarlo en cada flush.
+    def __init__(self, spec, mode="values"):
+        if mode not in INSERT_MODES:
+            raise ValueError(f"Modo de inserción desconocido: {mode}. Opciones: {INSERT_MODES}")
+
+        self.spec = spec
+        self.mode = mode
+        self.buffer = io.BytesIO()
+
+    def write(self, cursor, rows, table=None):
+        if self.mode == "values":
+            extras.execute_values(cursor, self.spec.insert_sql(table), rows)
+            return
+
+        buf = self.buffer
+        buf.seek(0)
+        buf.truncate()
+
+        if self.mode == "copy_binary":
+            buf.write(BINARY_HEADER)
+            encode = self.spec.encode_binary_row
+            for row in rows:
+                buf.write(encode(row))
+            buf.write(BINARY_TRAILER)
+            fmt = "binary"
+        else:
+            encode = self.spec.encode_text_row
+            buf.write("".join(encode(row) for row in rows).encode("utf-8"))
+            fmt = "text"
+
+        buf.seek(0)
+        cursor.copy_expert(self.spec.copy_sql(fmt, table), buf)
@@ -0,0 +1,136 @@
+import time
+from collections import deque
+from threading import Thread, Condition
+
+POLICIES = ("block", "drop_oldest")
+LIVE_PREFIXES = ("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+
+class EndOfStream:
+    # Marca de fin de flujo: la devuelve get() cuando el canal está cerrado y vacío
+    def __repr__(self):
+        return "END"
+
+END = EndOfStream()
+
+def is_live(source):
+    # Índices de webcam y URLs de red son fuentes en vivo: conviene descartar frames viejos antes que atrasarse
+    if isinstance(source, int):
+        return True
+    return str(source).lower().startswith(LIVE_PREFIXES)
+
+def policy_for(source):
+    return "drop_oldest" if is_live(source) else "block"
+
+class Channel:
+    # Cola acotada entre dos etapas. Sin esperas activas: productor y consumidor duermen
+    # sobre una Condition hasta que haya lugar / datos o el canal se cierre.
+    #  - block: el productor espera (archivos: no se pierde ningún frame)
+    #  - drop_oldest: se descarta el elemento más viejo (vivo: la latencia queda acotada)
+    def __init__(self, maxsize, policy="block", notify=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Política desconocida: {policy}. Opciones: {POLICIES}")
+        self.maxsize = maxsize
+        self.policy = policy
+        # Evento opcional compartido por varios canales para esperar al primero que tenga datos
+        self.notify = notify
+        self.items = deque()
+        self.cond = Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item, block=True):
+        with self.cond:
+            if self.closed:
+                return False
+            if len(self.items) >= self.maxsize:
+                if self.policy == "drop_oldest":
+                    self.items.popleft()
+                    self.dropped += 1
+                elif not block:
+                    return False
+                else:
+                    while len(self.items) >= self.maxsize and not self.closed:
+                        self.cond.wait()
+                    if self.closed:
+                        return False
+            self.items.append(item)
+            self.cond.notify_all()
+        if self.notify is not None:
+            self.notify.set()
+        return True
+
+    def get(self, block=True, timeout=None):
+        # Devuelve el próximo elemento, END si el canal se cerró y quedó vacío,
+        # o None si no hay nada (sin bloqueo o al vencer el timeout).
+        with self.cond:
+            if block and not self.items and not self.closed:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not self.items and not self.closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+
+            if self.items:
+                item = self.items.popleft()
+                self.cond.notify_all()
+                return item
+            return END if self.closed else None
+
+    def close(self):
+        # Fin de flujo: lo pendiente todavía se entrega; después get() devuelve END
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.notify is not None:
+            self.notify.set()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is END:
+                return
+            yield item
+
+class Stage:
+    # Etapa en su propio hilo. Con `source` (iterable) produce elementos; con `inbox` consume
+    # y aplica `target` a cada uno. Los resultados distintos de None van a `outbox`, y al terminar
+    # la entrada se cierra `outbox` para propagar el fin de flujo a la etapa siguiente.
+    def __init__(self, name, target=None, inbox=None, outbox=None, source=None):
+        if (source is None) == (inbox is None):
+            raise ValueError("Una etapa necesita `source` o `inbox`, no ambos")
+        self.name = name
+        self.target = target
+        self.inbox = inbox
+        self.outbox = outbox
+        self.source = source
+        self.processed = 0
+        self.error = None
+        self.thread = Thread(target=self.run, name=name, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        items = self.source if self.source is not None else self.inbox
+        try:
+            for item in items:
+                result = self.target(item) if self.target is not None else item
+                self.processed += 1
+                if result is not None and self.outbox is not None:
+                    if not self.outbox.put(result):
+                        break
+        except Exception as e:
+            self.error = e
+            print(f"[ERROR {self.name}] {e}")
+        finally:
+            if self.outbox is not None:
+                self.outbox.close()
+
+    def join(self, timeout=None):
+        if self.thread.ident is not None:
+            self.thread.join(timeout)
@@ -1,167 +1,239 @@
 import psycopg2
-from psycopg2 import extras
 import time
-from threading import Thread
-from queue import Queue, Empty
-from datetime import datetime, date
-import re
+from threading import Thread, Event
+from core.pg_copy import TRAFFIC_LOGS, TABLES, BatchWriter
+from core.pipeline import Channel, END
+from core.partition_manager import PartitionManager
+from core.spill_buffer import SpillBuffer
+from core.rollup import MinuteRollup
+from core.metrics import METRICS
+from core.sink import Sink
 
-class PostgresLogger:
-    def __init__(self, db_config, batch_size=50, flush_interval=1.0, retention_months=3):
+class PostgresLogger(Sink):
+    def __init__(self, db_config, batch_size=50, flush_interval=1.0, retention_months=3, camera_id=None, insert_mode="values",
+                 spill_dir=None, spill_max_bytes=1024 * 1024 * 1024, drain_interval=5.0,
+                 store_frames=True, rollup=False, partition_months_ahead=2, maintenance_interval=3600.0,
+                 blocking=False, require_connection=False):
         self.db_config = db_config
-        self.queue = Queue(maxsize=2000)
+        # Canal acotado hacia el hilo de escritura; lleno => spill a disco (o descarte)
+        self.channel = Channel(2000)
+        # blocking: el productor espera lugar en el canal en vez de desbordar (procesamiento offline)
+        self.blocking = blocking
         self.batch_size = batch_size
         self.flush_interval = flush_interval
         self.retention_months = retention_months
+        self.camera_id = camera_id
+        # store_frames: filas por frame en traffic_logs | rollup: agregados por minuto/hora para el tablero
+        self.store_frames = store_frames
+        self.rollup = MinuteRollup() if rollup else None
+        # values: execute_values (SQL de texto) | copy_text / copy_binary: COPY FROM STDIN
+        self.insert_mode = insert_mode
+        self.writers = {TRAFFIC_LOGS.name: BatchWriter(TRAFFIC_LOGS, insert_mode)}
         
-        self.checked_partitions = set() 
+        # Particiones creadas por adelantado y retención aplicada periódicamente en su propio hilo
+        self.partitions = PartitionManager(db_config, retention_months=retention_months,
+                                           months_ahead=partition_months_ahead, interval=maintenance_interval)
         self.stopped = False
+        self.stop_event = Event()
+        self.dropped = 0
+        # Muestras que solo iban a los agregados por minuto (store_frames=False) y se perdieron por cola llena
+        self.rollup_dropped = 0
 
+        self.rows_written = METRICS.counter("trafficvision_db_rows_total", "Filas escritas en la DB")
+        self.write_timer = METRICS.histogram("trafficvision_db_write_seconds", "Tiempo de escritura de cada lote")
+        # Desde que la primera fila de un lote entra al buffer hasta que el lote llega a la DB
+        self.batch_wait = METRICS.histogram("trafficvision_db_batch_wait_seconds", "Espera de las filas antes de escribirse")
+        METRICS.gauge("trafficvision_logger_queue", lambda: len(self.channel), "Filas en la cola del logger")
+        METRICS.gauge("trafficvision_logger_dropped", lambda: self.stats()["dropped"], "Filas descartadas")
+        METRICS.gauge("trafficvision_spill_pending_bytes",
+                      lambda: self.spill.stats()["pending_bytes"] if self.spill is not None else 0,
+                      "Bytes en el spill a disco pendientes de reenviar")
+
+        # Con spill_dir, lo que no entra en la cola o no llega a la DB se guarda en disco
+        self.spill = SpillBuffer(spill_dir, max_bytes=spill_max_bytes) if spill_dir else None
+        self.drain_interval = drain_interval
+
+        # La conexión de prueba no se cierra: pasa al hilo de escritura, que así no vuelve a conectar
+        self.initial_conn = None
         try:
-            conn = psycopg2.connect(**self.db_config)
-            conn.close()
+            self.initial_conn = self.connect()
             print("[INFO] DB: Conexión PostgreSQL Exitosa.")
         except Exception as e:
-            print(f"[ERROR CRÍTICO] No se pudo conectar a la DB: {e}")
-            raise e
+            # require_connection: quien lo crea tiene otra salida (LocalSink) si la DB no responde al arrancar
+            if require_connection:
+                raise
+            if self.spill is None:
+                print(f"[ERROR CRÍTICO] No se pudo conectar a la DB: {e}")
+                raise e
+            print(f"[WARN] DB no disponible ({e}). Los registros se guardarán en '{spill_dir}' hasta que vuelva.")
 
-        Thread(target=self.cleanup_old_data, daemon=True).start()
+        self.partitions.start()
         self.thread = Thread(target=self.loop, daemon=True)
         self.thread.start()
 
-    def log(self, tracker_id, class_name, speed, direction):
-        if not self.stopped:
-            now = datetime.now()
-            
-            try:
-                tracker_id_native = int(tracker_id)
-                speed_native = int(speed)
-                class_name_native = str(class_name)
-                direction_native = str(direction)
-            except:
-                tracker_id_native = -1
-                speed_native = 0
-                class_name_native = "Unknown"
-                direction_native = "Unknown"
-
-            data = (
-                now,            
-                now.date(),     
-                now.time(),     
-                tracker_id_native, 
-                class_name_native,
-                speed_native,      
-                direction_native
-            )
-            try:
-                self.queue.put_nowait(data)
-            except:
-                pass 
+        if self.spill is not None:
+            self.drain_thread = Thread(target=self.drain_loop, daemon=True)
+            self.drain_thread.start()
 
-    def ensure_partition(self, cursor, date_obj):
-        year = date_obj.year
-        month = date_obj.month
-        
-        if (year, month) in self.checked_partitions:
+    def wants_frames(self):
+        return self.store_frames or self.rollup is not None
+
+    def log_row(self, spec, row):
+        if self.stopped:
             return
+        if not self.channel.put((spec, row), block=self.blocking):
+            self.overflow(spec, [row])
 
-        table_name = f"traffic_logs_y{year}m{month:02d}"
-        
-        start_date = date(year, month, 1)
-        if month == 12:
-            end_date = date(year + 1, 1, 1)
-        else:
-            end_date = date(year, month + 1, 1)
-
-        query = f"""
-            CREATE TABLE IF NOT EXISTS {table_name} 
-            PARTITION OF traffic_logs
-            FOR VALUES FROM ('{start_date}') TO ('{end_date}');
-        """
-        
-        try:
-            cursor.execute(query)
-            self.checked_partitions.add((year, month))
-        except Exception as e:
-            print(f"[ERROR DB] Fallo creando partición {table_name}: {e}")
+    def overflow(self, spec, rows):
+        if spec is TRAFFIC_LOGS and not self.store_frames:
+            # Sin filas por frame, traffic_logs solo alimenta el rollup: no se guarda en el spill
+            # (se reinsertaría en traffic_logs) y se cuenta como muestra de agregado perdida
+            self.rollup_dropped += len(rows)
+            self.dropped += len(rows)
+            return
+        if self.spill is not None and self.spill.append_many(spec, rows):
+            return
+        self.dropped += len(rows)
 
-    def cleanup_old_data(self):
-        print("[MANTENIMIENTO] Verificando retención de datos...")
-        try:
-            conn = psycopg2.connect(**self.db_config)
-            conn.autocommit = True
-            cursor = conn.cursor()
-            
-            today = date.today()
-            cutoff_year = today.year
-            cutoff_month = today.month - self.retention_months
-            
-            while cutoff_month <= 0:
-                cutoff_month += 12
-                cutoff_year -= 1
-            
-            print(f"[MANTENIMIENTO] Borrando datos anteriores a: {cutoff_year}-{cutoff_month:02d}")
-
-            cursor.execute("SELECT tablename FROM pg_catalog.pg_tables WHERE tablename LIKE 'traffic_logs_y%'")
-            tables = cursor.fetchall()
-            
-            for (table_name,) in tables:
-                match = re.search(r"y(\d{4})m(\d{2})", table_name)
-                if match:
-                    t_year = int(match.group(1))
-                    t_month = int(match.group(2))
-                    
-                    is_old = False
-                    if t_year < cutoff_year: is_old = True
-                    elif t_year == cutoff_year and t_month < cutoff_month: is_old = True
-                    
-                    if is_old:
-                        print(f"[LIMPIEZA] Eliminando tabla: {table_name}")
-                        cursor.execute(f"DROP TABLE {table_name}")
-            
-            conn.close()
-        except Exception as e:
-            print(f"[ERROR MANTENIMIENTO] {e}")
+    def writer_for(self, spec):
+        writer = self.writers.get(spec.name)
+        if writer is None:
+            writer = self.writers[spec.name] = BatchWriter(spec, self.insert_mode)
+        return writer
+
+    def group_by_table(self, items):
+        groups = {}
+        for spec, row in items:
+            groups.setdefault(spec, []).append(row)
+        return groups
+
+    def stats(self):
+        stats = {"queue_size": len(self.channel), "dropped": self.dropped, "rollup_dropped": self.rollup_dropped}
+        if self.spill is not None:
+            spill_stats = self.spill.stats()
+            stats["spilled"] = spill_stats["spilled"]
+            stats["replayed"] = spill_stats["replayed"]
+            stats["dropped"] += spill_stats["dropped"]
+            stats["spill_pending_bytes"] = spill_stats["pending_bytes"]
+        return stats
+
+    def split_by_partition(self, cursor, spec, rows):
+        return self.partitions.split(cursor, spec, rows)
+
+    def connect(self):
+        conn = psycopg2.connect(**self.db_config)
+        conn.autocommit = True
+        return conn
+
+    def next_timeout(self, now, buffer, last_flush, last_rollup, connected, next_retry):
+        # El hilo duerme en la cola hasta el próximo vencimiento (flush, agregados o reconexión)
+        deadlines = []
+        if buffer:
+            deadlines.append(last_flush + self.flush_interval)
+        if self.rollup is not None and self.rollup.buckets:
+            deadlines.append(last_rollup + self.flush_interval)
+        if not connected:
+            deadlines.append(next_retry)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - now)
 
     def loop(self):
-        conn = None
-        try:
-            conn = psycopg2.connect(**self.db_config)
-            conn.autocommit = True
-            cursor = conn.cursor()
-        except:
-            return
+        conn, self.initial_conn = self.initial_conn, None
+        cursor = conn.cursor() if conn is not None else None
+        if cursor is not None:
+            self.check_rollup(cursor)
+        next_retry = 0.0
+        retry_delay = 1.0
 
         buffer = []
+        buffer_started = None
         last_flush = time.time()
 
+        last_rollup = time.time()
+        ending = False
+
         while True:
-            if self.stopped and self.queue.empty() and not buffer:
+            if ending and not buffer and not (self.rollup and self.rollup.buckets):
                 break
 
-            try:
-                item = self.queue.get(timeout=0.1)
-                buffer.append(item)
-                self.queue.task_done()
-            except Empty:
-                pass
+            timeout = self.next_timeout(time.time(), buffer, last_flush, last_rollup, conn is not None, next_retry)
+            item = self.channel.get(timeout=timeout)
+            if item is END:
+                # stop() cerró el canal y ya se consumió todo lo encolado
+                ending = True
+            elif item is not None:
+                spec, row = item
+                if spec is TRAFFIC_LOGS and self.rollup is not None:
+                    self.rollup.add(row[0], row[7], row[4], row[6], row[5])
+                if spec is not TRAFFIC_LOGS or self.store_frames:
+                    if not buffer:
+                        buffer_started = time.perf_counter()
+                    buffer.append(item)
 
             current_time = time.time()
+
+            if conn is None and current_time >= next_retry:
+                try:
+                    conn = self.connect()
+                    cursor = conn.cursor()
+                    self.partitions.forget()
+                    self.check_rollup(cursor)
+                    if retry_delay > 1.0:
+                        print("[INFO] DB: Conexión recuperada.")
+                    retry_delay = 1.0
+                except Exception:
+                    # Reintentos con espera creciente mientras la DB no responda
+                    next_retry = current_time + retry_delay
+                    retry_delay = min(retry_delay * 2, 30.0)
+
+            if self.rollup is not None and (ending or current_time - last_rollup >= self.flush_interval):
+                last_rollup = current_time
+                if conn is not None:
+                    try:
+                        self.flush_rollup(cursor, close_all=ending)
+                    except Exception as e:
+                        print(f"[ERROR ROLLUP] {e}")
+                        if ending:
+                            self.rollup.buckets.clear()
+                elif ending:
+                    print(f"[WARN] DB no disponible al cerrar: se pierden {len(self.rollup.buckets)} agregados por minuto.")
+                    self.rollup.buckets.clear()
+
             is_full = len(buffer) >= self.batch_size
             is_timeout = (current_time - last_flush) >= self.flush_interval
 
-            if buffer and (is_full or is_timeout):
+            if buffer and (is_full or is_timeout or ending):
+                if conn is None:
+                    if self.spill is not None or ending:
+                        for spec, rows in self.group_by_table(buffer).items():
+                            self.overflow(spec, rows)
+                        buffer = []
+                    elif len(buffer) > self.channel.maxsize:
+                        # Sin spill: se conserva como máximo una cola de registros en memoria
+                        excess = len(buffer) - self.channel.maxsize
+                        self.dropped += excess
+                        buffer = buffer[excess:]
+                    last_flush = current_time
+                    continue
+
+                groups = self.group_by_table(buffer)
+                write_started = time.perf_counter()
                 try:
-                    first_record_date = buffer[0][1]
-                    self.ensure_partition(cursor, first_record_date)
-                    
-                    query = """
-                        INSERT INTO traffic_logs 
-                        (record_timestamp, record_date, record_time, tracker_id, vehicle_class, speed_kmh, direction)
-                        VALUES %s
-                    """
-                    extras.execute_values(cursor, query, buffer)
+                    for spec in list(groups):
+                        writer = self.writer_for(spec)
+                        pieces = self.split_by_partition(cursor, spec, groups[spec])
+                        while pieces:
+                            table, part_rows = pieces[0]
+                            writer.write(cursor, part_rows, table=table)
+                            self.rows_written.inc(len(part_rows))
+                            pieces.pop(0)
+                            groups[spec] = [row for _, rows in pieces for row in rows]
+                        del groups[spec]
                     
+                    finished = time.perf_counter()
+                    self.write_timer.observe(finished - write_started)
+                    self.batch_wait.observe(finished - buffer_started)
                     buffer = []
                     last_flush = current_time
                     
@@ -169,16 +241,102 @@ class PostgresLogger:
                     print(f"[ERROR SQL] {e}")
                     try:
                         conn.close()
-                        conn = psycopg2.connect(**self.db_config)
-                        conn.autocommit = True
-                        cursor = conn.cursor()
-                        self.checked_partitions.clear()
-                    except:
+                    except Exception:
                         pass
+                    conn = None
+                    cursor = None
+                    next_retry = current_time
+                    # Solo queda pendiente lo que no llegó a escribirse
+                    buffer = [(spec, row) for spec, rows in groups.items() for row in rows]
+                    if self.spill is not None:
+                        for spec, rows in groups.items():
+                            self.overflow(spec, rows)
+                        buffer = []
+                    last_flush = current_time
 
         if conn: conn.close()
         print("[INFO] PostgresLogger finalizado.")
 
+    def check_rollup(self, cursor):
+        # Bases creadas con una versión anterior de init_db.sql no tienen las tablas de agregados:
+        # sin este chequeo cada upsert fallaría y los minutos se acumularían en memoria
+        if self.rollup is None:
+            return
+        cursor.execute("SELECT to_regclass('traffic_rollup_1m') IS NOT NULL AND to_regclass('traffic_rollup_1h') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            print("[WARN] No existen traffic_rollup_1m / traffic_rollup_1h: se desactivan los agregados por minuto.")
+            self.rollup = None
+
+    def flush_rollup(self, cursor, close_all=False):
+        rows = self.rollup.pop_closed(close_all=close_all)
+        try:
+            self.rollup.write_minutes(cursor, rows)
+        except Exception:
+            self.rollup.restore(rows)
+            raise
+        self.rollup.refresh_hours(cursor)
+
+    def drain_loop(self):
+        while not self.stop_event.wait(self.drain_interval):
+            if not self.spill.pending():
+                continue
+            try:
+                self.drain_spill()
+            except psycopg2.OperationalError:
+                # DB todavía caída: se reintenta en el próximo ciclo
+                pass
+            except Exception as e:
+                print(f"[ERROR SPILL] {e}")
+
+    def drain_spill(self):
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            # La DB responde: el segmento abierto se cierra para poder reenviarlo
+            self.spill.seal()
+            for path in self.spill.sealed_segments():
+                if self.stop_event.is_set():
+                    break
+
+                by_table = self.spill.read_segment(path)
+                n_records = sum(len(payloads) for payloads in by_table.values())
+                try:
+                    batches = [(TABLES[name], [TABLES[name].decode_binary_row(p) for p in payloads])
+                               for name, payloads in by_table.items()]
+
+                    # Particiones fuera de la transacción, para que un rollback no las deshaga
+                    conn.autocommit = True
+                    with conn.cursor() as cursor:
+                        pieces = [(spec, self.split_by_partition(cursor, spec, rows)) for spec, rows in batches]
+
+                    # Todo el segmento en una transacción: se borra del disco solo si entró completo
+                    conn.autocommit = False
+                    with conn.cursor() as cursor:
+                        for spec, partitions in pieces:
+                            writer = BatchWriter(spec, self.insert_mode)
+                            for table, rows in partitions:
+                                for i in range(0, len(rows), 5000):
+                                    writer.write(cursor, rows[i:i + 5000], table=table)
+                    conn.commit()
+                except (psycopg2.DataError, psycopg2.IntegrityError, psycopg2.ProgrammingError, KeyError) as e:
+                    conn.rollback()
+                    print(f"[ERROR SPILL] {path} rechazado por la DB ({e}); se aparta como .bad")
+                    self.spill.quarantine(path, n_records)
+                    continue
+                except Exception:
+                    conn.rollback()
+                    raise
+
+                self.spill.remove(path, n_records)
+                print(f"[SPILL] Reenviados {n_records} registros desde {path}")
+        finally:
+            conn.close()
+
     def stop(self):
         self.stopped = True
-        self.thread.join()
\ No newline at end of file
+        self.stop_event.set()
+        self.channel.close()
+        self.thread.join()
+        self.partitions.stop()
+        if self.spill is not None:
+            self.drain_thread.join()
+            self.spill.seal()
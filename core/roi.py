@@ -0,0 +1,36 @@
+import os
+import numpy as np
+
+def roi_path_for(matrix_path):
+    # El polígono de calibración se guarda junto a la homografía: homography_matrix.npy -> homography_matrix_roi.npy
+    return os.path.splitext(matrix_path)[0] + "_roi.npy"
+
+class RegionOfInterest:
+    # Recorte rectangular (con margen) alrededor del polígono de la calzada calibrada.
+    # Fuera de ese polígono la homografía no es válida, así que no vale la pena inferir ahí.
+    def __init__(self, polygon, padding=32):
+        self.polygon = np.asarray(polygon, dtype=np.float32).reshape(-1, 2)
+        x0, y0 = np.floor(self.polygon.min(axis=0)) - padding
+        x1, y1 = np.ceil(self.polygon.max(axis=0)) + padding
+        self.rect = (int(x0), int(y0), int(x1), int(y1))
+
+    @classmethod
+    def load(cls, path, padding=32):
+        return cls(np.load(path), padding)
+
+    def bounds(self, frame_shape):
+        h, w = frame_shape[:2]
+        x0, y0, x1, y1 = self.rect
+        return max(0, x0), max(0, y0), min(w, x1), min(h, y1)
+
+    def crop(self, frame):
+        x0, y0, x1, y1 = self.bounds(frame.shape)
+        # Vista sobre el frame original, sin copia
+        return frame[y0:y1, x0:x1], (x0, y0)
+
+    @staticmethod
+    def shift(detections, offset):
+        if len(detections) > 0 and offset != (0, 0):
+            ox, oy = offset
+            detections.xyxy = detections.xyxy + np.array([ox, oy, ox, oy], dtype=detections.xyxy.dtype)
+        return detections
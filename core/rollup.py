@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from psycopg2 import extras
+from core.pg_copy import TableSpec
+
+# Minutos cerrados como filas de traffic_rollup_1m: así los guarda LocalSink en sus archivos y
+# LocalUploader los reenvía con el mismo upsert (no se particiona, se agrupa por el mes de bucket)
+ROLLUP_1M = TableSpec(
+    "traffic_rollup_1m",
+    ("bucket", "camera_id", "vehicle_class", "direction", "samples", "speed_sum", "speed_sum_sq", "speed_max"),
+    ("timestamp", "text", "text", "text", "int8", "float8", "float8", "int4"),
+    time_column="bucket",
+)
+
+UPSERT_1M = """
+    INSERT INTO traffic_rollup_1m
+    (bucket, camera_id, vehicle_class, direction, samples, speed_sum, speed_sum_sq, speed_max)
+    VALUES %s
+    ON CONFLICT (bucket, camera_id, vehicle_class, direction) DO UPDATE SET
+        samples = traffic_rollup_1m.samples + EXCLUDED.samples,
+        speed_sum = traffic_rollup_1m.speed_sum + EXCLUDED.speed_sum,
+        speed_sum_sq = traffic_rollup_1m.speed_sum_sq + EXCLUDED.speed_sum_sq,
+        speed_max = GREATEST(traffic_rollup_1m.speed_max, EXCLUDED.speed_max)
+"""
+
+# La tabla horaria se recalcula desde la de minutos (ya consolidada entre procesos),
+# por eso aquí se reemplaza en lugar de sumar.
+REFRESH_1H = """
+    INSERT INTO traffic_rollup_1h
+    (bucket, camera_id, vehicle_class, direction, samples, speed_sum, speed_sum_sq, speed_max)
+    SELECT date_trunc('hour', bucket), camera_id, vehicle_class, direction,
+           SUM(samples), SUM(speed_sum), SUM(speed_sum_sq), MAX(speed_max)
+    FROM traffic_rollup_1m
+    WHERE bucket >= %(hour)s AND bucket < %(hour)s + INTERVAL '1 hour'
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (bucket, camera_id, vehicle_class, direction) DO UPDATE SET
+        samples = EXCLUDED.samples,
+        speed_sum = EXCLUDED.speed_sum,
+        speed_sum_sq = EXCLUDED.speed_sum_sq,
+        speed_max = EXCLUDED.speed_max
+"""
+
+class MinuteRollup:
+    # Agregados por (minuto, cámara, clase, dirección): cantidad, suma, suma de cuadrados y máximo.
+    # Con suma y suma de cuadrados el tablero obtiene media y desvío sin leer traffic_logs.
+    def __init__(self, grace_seconds=5.0):
+        self.grace = timedelta(seconds=grace_seconds)
+        self.buckets = {}
+        self.stale_hours = set()
+
+    def add(self, timestamp, camera_id, vehicle_class, direction, speed):
+        bucket = timestamp.replace(second=0, microsecond=0)
+        key = (bucket, camera_id or "", vehicle_class, direction)
+        stats = self.buckets.get(key)
+        if stats is None:
+            self.buckets[key] = [1, speed, speed * speed, speed]
+        else:
+            stats[0] += 1
+            stats[1] += speed
+            stats[2] += speed * speed
+            if speed > stats[3]:
+                stats[3] = speed
+
+    def pop_closed(self, now=None, close_all=False):
+        # Un minuto se cierra cuando pasó su final más un margen. Como el upsert suma,
+        # una muestra que llegue tarde solo genera otro upsert para el mismo minuto.
+        limit = (now or datetime.now()) - self.grace - timedelta(minutes=1)
+        closed = [key for key in self.buckets if close_all or key[0] <= limit]
+        return [key + tuple(self.buckets.pop(key)) for key in closed]
+
+    def restore(self, rows):
+        # Filas que no se pudieron escribir vuelven al agregado para el próximo intento
+        for bucket, camera_id, vehicle_class, direction, samples, speed_sum, speed_sum_sq, speed_max in rows:
+            key = (bucket, camera_id, vehicle_class, direction)
+            stats = self.buckets.get(key)
+            if stats is None:
+                self.buckets[key] = [samples, speed_sum, speed_sum_sq, speed_max]
+            else:
+                stats[0] += samples
+                stats[1] += speed_sum
+                stats[2] += speed_sum_sq
+                stats[3] = max(stats[3], speed_max)
+
+    def write_minutes(self, cursor, rows):
+        if not rows:
+            return
+        # Una sola sentencia por lote: el upsert es atómico y un reintento no duplica sumas
+        extras.execute_values(cursor, UPSERT_1M, rows, page_size=len(rows))
+        self.stale_hours.update(row[0].replace(minute=0) for row in rows)
+
+    def refresh_hours(self, cursor):
+        for hour in sorted(self.stale_hours):
+            cursor.execute(REFRESH_1H, {"hour": hour})
+            self.stale_hours.discard(hour)
@@ -0,0 +1,175 @@
+import cv2
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from queue import Empty
+
+def decode_worker(source, shm_name, shape, n_slots, skip_value, fps, free_q, ready_q, stop_event):
+    # Proceso decodificador: escribe cada frame directamente en un slot libre de la memoria compartida
+    # y solo envía (slot, timestamp) al consumidor.
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray((n_slots,) + shape, dtype=np.uint8, buffer=shm.buf)
+    stream = cv2.VideoCapture(source)
+    frame_idx = 0
+    last_idx = None
+
+    try:
+        while not stop_event.is_set():
+            # Bloquea hasta que el consumidor devuelva un slot; stop() envía None para despertarlo
+            slot = free_q.get()
+            if slot is None:
+                break
+
+            while not stop_event.is_set():
+                if not stream.grab():
+                    return
+
+                idx = frame_idx
+                frame_idx += 1
+                if last_idx is not None and idx - last_idx < skip_value.value:
+                    continue
+
+                target = frames[slot]
+                retrieved, frame = stream.retrieve(target)
+                if not retrieved:
+                    continue
+                last_idx = idx
+                if not np.shares_memory(frame, target):
+                    # La fuente cambió de resolución o OpenCV no pudo escribir en el buffer
+                    if frame.shape != shape:
+                        frame = cv2.resize(frame, (shape[1], shape[0]))
+                    target[...] = frame
+
+                pos_msec = stream.get(cv2.CAP_PROP_POS_MSEC)
+                ready_q.put((slot, pos_msec / 1000.0 if pos_msec > 0 else idx / fps))
+                break
+    finally:
+        stream.release()
+        ready_q.put(None)
+        del frames
+        shm.close()
+
+class SharedMemoryLoader:
+    # Alternativa a VideoLoader con la decodificación en otro proceso (fuera del GIL).
+    # Los frames viven en un pool fijo de `slots` buffers de memoria compartida:
+    # read() devuelve una vista sin copia que es válida hasta el siguiente read() o release().
+    # Quien necesite conservar el frame más tiempo (p. ej. el escritor de video) debe copiarlo.
+    def __init__(self, source=0, slots=8, skip_frames=1):
+        probe = cv2.VideoCapture(source)
+        if not probe.isOpened():
+            raise ValueError(f"No se pudo abrir la fuente: {source}")
+
+        self.fps = probe.get(cv2.CAP_PROP_FPS)
+        if self.fps == 0 or self.fps is None:
+            self.fps = 30.0 # Valor por defecto seguro
+        grabbed, first = probe.read()
+        probe.release()
+        if not grabbed:
+            raise ValueError(f"La fuente no entregó frames: {source}")
+        print(f"[INFO] SharedMemoryLoader detectó {self.fps:.2f} FPS, {first.shape[1]}x{first.shape[0]}, {slots} slots")
+
+        self.source = source
+        self.shape = first.shape
+        self.n_slots = slots
+
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)) * slots)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+        ctx = mp.get_context("spawn")
+        self.free_q = ctx.Queue()
+        self.ready_q = ctx.Queue()
+        self.stop_event = ctx.Event()
+        # skip compartido con el proceso decodificador para poder ajustarlo en caliente
+        self.skip_value = ctx.Value("i", max(1, int(skip_frames)), lock=False)
+        for slot in range(slots):
+            self.free_q.put(slot)
+
+        self.process = ctx.Process(
+            target=decode_worker,
+            args=(source, self.shm.name, self.shape, slots, self.skip_value, self.fps,
+                  self.free_q, self.ready_q, self.stop_event),
+            daemon=True,
+        )
+        self.current = None
+        self.stopped = False
+        self.closed = False
+        # El decodificador espera un slot libre en lugar de descartar frames
+        self.dropped = 0
+
+    @property
+    def skip_frames(self):
+        return self.skip_value.value
+
+    @skip_frames.setter
+    def skip_frames(self, value):
+        self.skip_value.value = max(1, int(value))
+
+    def start(self):
+        self.process.start()
+        return self
+
+    def read(self, block=True, timeout=None):
+        # El slot del frame anterior vuelve al pool: el consumidor ya terminó con él
+        self.release()
+        if self.stopped:
+            return None
+        item = self.next_item(block, timeout)
+        if item is Empty:
+            return None
+        if item is None:
+            self.stopped = True
+            return None
+
+        slot, timestamp = item
+        self.current = slot
+        return self.frames[slot], timestamp
+
+    def next_item(self, block, timeout):
+        if not block or timeout is not None:
+            try:
+                return self.ready_q.get(block, timeout)
+            except Empty:
+                return Empty
+        # Espera sin límite, pero si el decodificador murió sin enviar el fin de flujo se corta
+        while True:
+            try:
+                return self.ready_q.get(timeout=1.0)
+            except Empty:
+                if not self.process.is_alive() and self.ready_q.empty():
+                    return None
+
+    def release(self):
+        if self.current is not None:
+            self.free_q.put(self.current)
+            self.current = None
+
+    def more(self):
+        return not self.ready_q.empty()
+
+    def queued(self):
+        # Frames listos en memoria compartida esperando al consumidor (qsize no existe en macOS)
+        try:
+            return self.ready_q.qsize()
+        except NotImplementedError:
+            return float("nan")
+
+    def stop(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.stopped = True
+        self.stop_event.set()
+        self.free_q.put(None)
+        if self.process.pid is not None:
+            self.process.join(timeout=5.0)
+            if self.process.is_alive():
+                self.process.terminate()
+
+        self.frames = None
+        self.current = None
+        self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # Todavía hay vistas vivas de un frame; el mapeo se libera cuando se recolecten
+            pass
@@ -0,0 +1,55 @@
+from datetime import datetime
+from core.pg_copy import TRAFFIC_LOGS
+
+def frame_row(tracker_id, class_name, speed, direction, camera_id=None, timestamp=None):
+    # Fila de traffic_logs con tipos nativos de Python (lo que esperan psycopg2 y los codificadores COPY)
+    now = timestamp or datetime.now()
+
+    try:
+        tracker_id_native = int(tracker_id)
+        speed_native = int(speed)
+        class_name_native = str(class_name)
+        direction_native = str(direction)
+        camera_id_native = str(camera_id) if camera_id is not None else None
+    except:
+        tracker_id_native = -1
+        speed_native = 0
+        class_name_native = "Unknown"
+        direction_native = "Unknown"
+        camera_id_native = None
+
+    return (
+        now,
+        now.date(),
+        now.time(),
+        tracker_id_native,
+        class_name_native,
+        speed_native,
+        direction_native,
+        camera_id_native
+    )
+
+class Sink:
+    # Salida de registros: PostgresLogger, LocalSink (SQLite / Parquet) o CsvSink (offline.py).
+    # CameraStream, ZoneEngine y el resto de los productores solo usan log / log_row / stop.
+    camera_id = None
+    stopped = False
+
+    def wants_frames(self):
+        # False: las filas por frame se descartan antes de encolarlas (LOG_MODE "tracks" sin agregados)
+        return True
+
+    def log(self, tracker_id, class_name, speed, direction, camera_id=None, timestamp=None):
+        # timestamp: momento de la muestra (p. ej. inicio del video + tiempo del frame); por defecto, ahora
+        if not self.stopped and self.wants_frames():
+            camera = camera_id if camera_id is not None else self.camera_id
+            self.log_row(TRAFFIC_LOGS, frame_row(tracker_id, class_name, speed, direction, camera, timestamp))
+
+    def log_row(self, spec, row):
+        raise NotImplementedError
+
+    def stats(self):
+        return {"queue_size": 0, "dropped": 0}
+
+    def stop(self):
+        pass
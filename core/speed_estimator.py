@@ -1,56 +1,120 @@
 import cv2
 import numpy as np
 import os
+from core.track_store import TrackStore
+from core.ground_grid import GroundGrid, grid_path_for
+
+# Códigos de dirección devueltos por estimate_batch
+DIRECTION_UNKNOWN = 0
+DIRECTION_INCOMING = 1
+DIRECTION_OUTGOING = -1
+
+# Muestras por track en la ventana de velocidad (también la usa el recálculo de trajectories.py)
+HISTORY_SIZE = 60
+
+DIRECTION_NAMES = {
+    DIRECTION_UNKNOWN: "DESCONOCIDO",
+    DIRECTION_INCOMING: "Incoming",
+    DIRECTION_OUTGOING: "Outgoing"
+}
 
 class SpeedEstimator:
-    def __init__(self, matrix_path="config/homography_matrix.npy"):
+    def __init__(self, matrix_path="config/homography_matrix.npy", history_size=HISTORY_SIZE, store=None, use_grid=False):
         if not os.path.exists(matrix_path):
             raise FileNotFoundError(f"CRÍTICO: No encontré '{matrix_path}'. Ejecuta calibration_tool.py primero.")
-        
+
         self.H = np.load(matrix_path)
         print(f"[INFO] SpeedEstimator inicializado. Matriz cargada.")
-        
-        self.vehicle_history = {}
+
+        # Con use_grid, la grilla píxel -> metros de calibration_tool.py reemplaza a la homografía (si existe)
+        self.grid = None
+        grid_path = grid_path_for(matrix_path)
+        if use_grid and os.path.exists(grid_path):
+            self.grid = GroundGrid(grid_path)
+            print(f"[INFO] Grilla de suelo cargada: {grid_path} (paso {self.grid.stride:g} px)")
+
+        self.store = store if store is not None else TrackStore()
+        self.history_size = history_size
+
+        # Ring buffer preasignado: un slot del TrackStore por vehículo, cada muestra es (t, x_m, y_m)
+        self.history = np.zeros((self.store.max_tracks, history_size, 3), dtype=np.float64)
+        self.head = np.zeros(self.store.max_tracks, dtype=np.int64)
+        self.count = np.zeros(self.store.max_tracks, dtype=np.int64)
+        # Slots del último lote de estimate_batch (en el orden de sus tracker_ids)
+        self.batch_slots = np.empty(0, dtype=np.int64)
+
+    def transform_points(self, points):
+        if self.grid is not None:
+            return self.grid.transform_points(points)
+
+        pts_np = np.asarray(points, dtype='float32').reshape(-1, 1, 2)
+
+        dst = cv2.perspectiveTransform(pts_np, self.H)
+
+        return dst[:, 0, :]
 
     def transform_point(self, point):
-        pt_np = np.array([[point]], dtype='float32')
-        
-        dst = cv2.perspectiveTransform(pt_np, self.H)
-        
-        return dst[0][0]
+        return self.transform_points([point])[0]
+
+    @staticmethod
+    def anchors(xyxy):
+        # Punto de contacto con el suelo: centro inferior de la caja
+        xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+        anchors = np.empty((len(xyxy), 2), dtype=np.float32)
+        anchors[:, 0] = np.floor((xyxy[:, 0] + xyxy[:, 2]) / 2)
+        anchors[:, 1] = np.floor(xyxy[:, 3])
+        return anchors
+
+    def estimate_batch(self, tracker_ids, xyxy, current_time):
+        n = len(tracker_ids)
+        speeds = np.full(n, np.nan)
+        directions = np.full(n, DIRECTION_UNKNOWN, dtype=np.int8)
+
+        if n == 0:
+            self.batch_slots = np.empty(0, dtype=np.int64)
+            return speeds, directions
+
+        anchors = self.anchors(xyxy)
+        coords_meters = self.transform_points(anchors)
+
+        slots, is_new = self.store.slots_for(tracker_ids, current_time)
+        self.batch_slots = slots
+        self.head[slots[is_new]] = 0
+        self.count[slots[is_new]] = 0
+
+        head = self.head[slots]
+        self.history[slots, head, 0] = current_time
+        self.history[slots, head, 1:] = coords_meters
+        self.head[slots] = (head + 1) % self.history_size
+        self.count[slots] = np.minimum(self.count[slots] + 1, self.history_size)
+
+        count = self.count[slots]
+        oldest = (self.head[slots] - count) % self.history_size
+
+        t_now, x_now, y_now = self.history[slots, head].T
+        t_old, x_old, y_old = self.history[slots, oldest].T
 
-    def estimate(self, tracker_id, box, current_time):
-        x1, y1, x2, y2 = box
-        
-        cx = int((x1 + x2) / 2)
-        cy = int(y2) 
-        
-        coord_meters = self.transform_point((cx, cy))
-        
-        if tracker_id not in self.vehicle_history:
-            self.vehicle_history[tracker_id] = []
-        
-        history = self.vehicle_history[tracker_id]
-        history.append((current_time, coord_meters[0], coord_meters[1]))
-        
-        if len(history) > 60:
-            history.pop(0)
-            
-        if len(history) < 3:
-            return None
-            
-        t_now, x_now, y_now = history[-1]
-        t_old, x_old, y_old = history[0] 
-        
         time_diff = t_now - t_old
-        
-        if time_diff == 0: 
-            return None
-        
+        valid = (count >= 3) & (time_diff != 0)
+
         dist_meters = np.sqrt((x_now - x_old)**2 + (y_now - y_old)**2)
-        
-        speed_mps = dist_meters / time_diff
-        
-        speed_kmh = speed_mps * 3.6
-        
-        return int(speed_kmh)
\ No newline at end of file
+
+        speeds[valid] = dist_meters[valid] / time_diff[valid] * 3.6
+        directions[valid] = np.where(y_now[valid] > y_old[valid], DIRECTION_INCOMING, DIRECTION_OUTGOING)
+
+        return speeds, directions
+
+    def last_segments(self, slots):
+        # Último tramo (muestra anterior -> actual) de cada slot, en metros, para zones.py
+        head = self.head[slots]
+        current = self.history[slots, (head - 1) % self.history_size, 1:]
+        previous = self.history[slots, (head - 2) % self.history_size, 1:]
+        return previous, current, self.count[slots] >= 2
+
+    def estimate(self, tracker_id, box, current_time):
+        speeds, _ = self.estimate_batch([tracker_id], [box], current_time)
+
+        if np.isnan(speeds[0]):
+            return None
+
+        return int(speeds[0])
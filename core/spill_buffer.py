@@ -0,0 +1,135 @@
+import os
+import re
+import struct
+from threading import Lock
+
+class SpillBuffer:
+    # Log binario append-only en disco. Cada registro es:
+    #   uint8 largo del nombre de tabla | uint32 largo del payload | nombre | payload
+    # donde el payload es la fila ya codificada como tupla COPY binaria (ver pg_copy.TableSpec).
+    HEADER = struct.Struct("<BI")
+    SEGMENT_PATTERN = re.compile(r"^segment_(\d{12})\.log$")
+
+    def __init__(self, directory, segment_bytes=8 * 1024 * 1024, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = Lock()
+        self.current = None
+        self.current_path = None
+        self.current_size = 0
+
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+
+        # Segmentos de una ejecución anterior (caída o cierre con la DB caída) quedan pendientes
+        existing = self.segments()
+        self.total_bytes = sum(os.path.getsize(p) for p in existing)
+        self.next_seq = self._seq(existing[-1]) + 1 if existing else 0
+        if existing:
+            print(f"[SPILL] {len(existing)} segmentos pendientes de una ejecución anterior ({self.total_bytes / 1e6:.1f} MB).")
+
+    def _seq(self, path):
+        return int(self.SEGMENT_PATTERN.match(os.path.basename(path)).group(1))
+
+    def segments(self):
+        names = [n for n in os.listdir(self.directory) if self.SEGMENT_PATTERN.match(n)]
+        return [os.path.join(self.directory, n) for n in sorted(names)]
+
+    def pending(self):
+        return self.total_bytes > 0
+
+    def stats(self):
+        return {
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "pending_bytes": self.total_bytes,
+        }
+
+    def append_many(self, spec, rows):
+        name = spec.name.encode("utf-8")
+        records = []
+        for row in rows:
+            payload = spec.encode_binary_row(row)
+            records.append(self.HEADER.pack(len(name), len(payload)) + name + payload)
+        data = b"".join(records)
+
+        with self.lock:
+            if self.total_bytes + len(data) > self.max_bytes:
+                self.dropped += len(records)
+                return False
+
+            if self.current is None:
+                self.current_path = os.path.join(self.directory, f"segment_{self.next_seq:012d}.log")
+                self.next_seq += 1
+                self.current = open(self.current_path, "ab")
+                self.current_size = 0
+
+            self.current.write(data)
+            self.current.flush()
+            self.current_size += len(data)
+            self.total_bytes += len(data)
+            self.spilled += len(records)
+
+            if self.current_size >= self.segment_bytes:
+                self._seal_locked()
+        return True
+
+    def append(self, spec, row):
+        return self.append_many(spec, [row])
+
+    def _seal_locked(self):
+        if self.current is None:
+            return
+        os.fsync(self.current.fileno())
+        self.current.close()
+        self.current = None
+        self.current_path = None
+
+    def seal(self):
+        with self.lock:
+            self._seal_locked()
+
+    def sealed_segments(self):
+        with self.lock:
+            current = self.current_path
+        return [p for p in self.segments() if p != current]
+
+    def read_segment(self, path):
+        # Devuelve {tabla: [payload, ...]}. Un registro truncado al final (corte de energía) se ignora.
+        with open(path, "rb") as f:
+            data = f.read()
+
+        by_table = {}
+        offset = 0
+        size = len(data)
+        while offset + self.HEADER.size <= size:
+            name_len, payload_len = self.HEADER.unpack_from(data, offset)
+            start = offset + self.HEADER.size
+            end = start + name_len + payload_len
+            if end > size:
+                print(f"[SPILL] Registro incompleto al final de {os.path.basename(path)}, se descarta.")
+                break
+            name = data[start:start + name_len].decode("utf-8")
+            by_table.setdefault(name, []).append(data[start + name_len:end])
+            offset = end
+        return by_table
+
+    def remove(self, path, n_records):
+        size = os.path.getsize(path)
+        os.remove(path)
+        with self.lock:
+            self.total_bytes = max(0, self.total_bytes - size)
+            self.replayed += n_records
+
+    def quarantine(self, path, n_records):
+        # Segmento que la DB rechaza por su contenido: se aparta para no bloquear a los siguientes
+        size = os.path.getsize(path)
+        os.replace(path, path + ".bad")
+        with self.lock:
+            self.total_bytes = max(0, self.total_bytes - size)
+            self.dropped += n_records
@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from core.metrics import METRICS
+
+class Startup:
+    # Arranque en paralelo: cada tarea (modelo, DB, video + homografía...) corre en un hilo propio apenas
+    # terminan las tareas de las que depende. Cargar pesos, conectar a la DB y abrir el video pasan la mayor
+    # parte del tiempo en E/S o en código nativo que suelta el GIL, así que se solapan bien.
+    def __init__(self, **labels):
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.pool = ThreadPoolExecutor(thread_name_prefix="startup")
+        self.futures = {}
+        self.durations = {}
+
+    def task(self, name, fn, *deps):
+        # fn recibe los resultados de deps, en orden; su duración no incluye la espera de esas dependencias
+        def run():
+            args = [self.futures[dep].result() for dep in deps]
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.durations[name] = time.perf_counter() - started
+
+        self.futures[name] = self.pool.submit(run)
+        return self.futures[name]
+
+    def result(self, name):
+        # Espera la tarea; si falló, relanza su excepción
+        return self.futures[name].result()
+
+    def failed(self, name):
+        future = self.futures.get(name)
+        return future is not None and future.exception() is not None
+
+    def discard(self, **closers):
+        # Arranque abortado: se espera al resto de las tareas y se cierra lo que sí llegó a abrirse
+        for name, close in closers.items():
+            future = self.futures.get(name)
+            if future is None or future.exception() is not None:
+                continue
+            try:
+                close(future.result())
+            except Exception as e:
+                print(f"[WARN] Al cerrar '{name}': {e}")
+        self.pool.shutdown(wait=True)
+
+    def observe(self, name, seconds):
+        METRICS.gauge("trafficvision_startup_seconds", lambda: seconds,
+                      "Duración de cada tarea del arranque", task=name, **self.labels)
+
+    def report(self):
+        # Desglose por tarea, lo que habría costado en serie y el tiempo real transcurrido
+        self.pool.shutdown(wait=True)
+        total = time.perf_counter() - self.started
+        for name, seconds in self.durations.items():
+            self.observe(name, seconds)
+        self.observe("total", total)
+
+        parts = " | ".join(f"{name} {seconds:.2f}s" for name, seconds in
+                           sorted(self.durations.items(), key=lambda item: -item[1]))
+        print(f"[ARRANQUE] {parts} -> {total:.2f}s ({sum(self.durations.values()):.2f}s en serie)")
+        return total
+
+    def first_frame(self):
+        # Lo que de verdad se pierde de tráfico en cada reinicio: hasta el primer frame procesado
+        elapsed = time.perf_counter() - self.started
+        self.observe("first_frame", elapsed)
+        print(f"[ARRANQUE] Primer frame procesado a los {elapsed:.2f}s")
@@ -0,0 +1,101 @@
+import numpy as np
+
+class TrackStore:
+    def __init__(self, max_tracks=256, max_idle=10.0):
+        self.max_tracks = max_tracks
+        self.max_idle = max_idle
+
+        # Estado por slot, preasignado para que la memoria no crezca con el tiempo
+        self.slots = {}
+        self.slot_owner = np.full(max_tracks, -1, dtype=np.int64)
+        self.last_seen = np.full(max_tracks, -np.inf)
+        self.speed = np.zeros(max_tracks, dtype=np.int32)
+        self.direction = np.zeros(max_tracks, dtype=np.int8)
+        self.free_slots = list(range(max_tracks - 1, -1, -1))
+
+        self.evicted = {"lost": 0, "idle": 0, "capacity": 0}
+        # Detecciones ignoradas en frames con más vehículos que max_tracks (CameraStream recorta el lote)
+        self.overflow = 0
+        # Funciones f(tracker_id, reason) avisadas cuando un track sale del store
+        self.on_evict = []
+
+    @property
+    def live(self):
+        return len(self.slots)
+
+    @property
+    def evicted_total(self):
+        return sum(self.evicted.values())
+
+    def stats(self):
+        return {"live": self.live, "evicted": self.evicted_total, "overflow": self.overflow,
+                **{f"evicted_{k}": v for k, v in self.evicted.items()}}
+
+    def get(self, tracker_id):
+        return self.slots.get(int(tracker_id))
+
+    def _allocate(self, tracker_id, now):
+        if not self.free_slots:
+            # Límite duro alcanzado: se expulsa el track que lleva más tiempo sin verse. Los slots del
+            # lote en curso (last_seen == now) no son candidatos: dos IDs compartirían el mismo historial
+            candidates = np.flatnonzero(self.last_seen < now)
+            if len(candidates) == 0:
+                raise ValueError(f"Lote con más de {self.max_tracks} tracks")
+            oldest = int(candidates[np.argmin(self.last_seen[candidates])])
+            self.evict(int(self.slot_owner[oldest]), "capacity")
+
+        slot = self.free_slots.pop()
+        self.slots[tracker_id] = slot
+        self.slot_owner[slot] = tracker_id
+        self.speed[slot] = 0
+        self.direction[slot] = 0
+        return slot
+
+    def slots_for(self, tracker_ids, now):
+        n = len(tracker_ids)
+        slots = np.empty(n, dtype=np.int64)
+        is_new = np.zeros(n, dtype=bool)
+
+        # Primero se marcan los tracks conocidos del lote, para que ninguno se expulse por un ID nuevo
+        new = []
+        for i, tracker_id in enumerate(tracker_ids):
+            slot = self.slots.get(int(tracker_id))
+            if slot is None:
+                new.append(i)
+                continue
+            self.last_seen[slot] = now
+            slots[i] = slot
+
+        for i in new:
+            slot = self._allocate(int(tracker_ids[i]), now)
+            self.last_seen[slot] = now
+            slots[i] = slot
+            is_new[i] = True
+
+        return slots, is_new
+
+    def evict(self, tracker_id, reason):
+        slot = self.slots.pop(tracker_id, None)
+        if slot is None:
+            return
+
+        self.slot_owner[slot] = -1
+        self.last_seen[slot] = -np.inf
+        self.free_slots.append(slot)
+        self.evicted[reason] += 1
+
+        for callback in self.on_evict:
+            callback(tracker_id, reason)
+
+    def sync(self, live_ids, now):
+        # live_ids: IDs que ByteTrack todavía mantiene (activos o perdidos recuperables).
+        # Todo lo que ya no figura ahí fue descartado por el tracker y no volverá.
+        if live_ids is not None:
+            live_ids = set(int(i) for i in live_ids)
+            for tracker_id in [t for t in self.slots if t not in live_ids]:
+                self.evict(tracker_id, "lost")
+
+        if self.max_idle is not None:
+            idle = [t for t, s in self.slots.items() if now - self.last_seen[s] > self.max_idle]
+            for tracker_id in idle:
+                self.evict(tracker_id, "idle")
@@ -0,0 +1,84 @@
+import numpy as np
+from collections import Counter
+from datetime import datetime
+from core.pg_copy import TRAFFIC_TRACKS
+from core.speed_estimator import DIRECTION_NAMES, DIRECTION_UNKNOWN
+
+class TrackSegment:
+    __slots__ = ("first_seen", "last_seen", "speeds", "classes", "direction")
+
+    def __init__(self, timestamp):
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.speeds = []
+        self.classes = Counter()
+        self.direction = DIRECTION_UNKNOWN
+
+class TrackSummarizer:
+    # Acumula las muestras de velocidad de cada vehículo y genera una sola fila
+    # en traffic_tracks cuando el track termina (o cada checkpoint_interval segundos
+    # para los que siguen en escena, cerrando un segmento y empezando otro).
+    def __init__(self, camera_id=None, checkpoint_interval=300.0):
+        self.camera_id = camera_id
+        self.checkpoint_interval = checkpoint_interval
+        self.segments = {}
+        self.pending = []
+        self.last_checkpoint = None
+
+    def add(self, tracker_id, class_name, speed, direction_code, timestamp=None):
+        timestamp = timestamp or datetime.now()
+        segment = self.segments.get(tracker_id)
+        if segment is None:
+            segment = self.segments[tracker_id] = TrackSegment(timestamp)
+
+        segment.last_seen = timestamp
+        segment.speeds.append(speed)
+        segment.classes[class_name] += 1
+        if direction_code != DIRECTION_UNKNOWN:
+            segment.direction = direction_code
+
+    def row(self, tracker_id, segment, is_final):
+        speeds = np.asarray(segment.speeds, dtype=np.float64)
+        return (
+            segment.first_seen,
+            segment.first_seen.date(),
+            segment.last_seen,
+            self.camera_id,
+            int(tracker_id),
+            segment.classes.most_common(1)[0][0],
+            DIRECTION_NAMES[segment.direction],
+            (segment.last_seen - segment.first_seen).total_seconds(),
+            len(speeds),
+            int(speeds.min()),
+            int(speeds.max()),
+            float(speeds.mean()),
+            float(np.median(speeds)),
+            is_final,
+        )
+
+    def end(self, tracker_id):
+        segment = self.segments.pop(tracker_id, None)
+        if segment is not None and segment.speeds:
+            self.pending.append(self.row(tracker_id, segment, True))
+
+    def checkpoint(self, timestamp=None):
+        timestamp = timestamp or datetime.now()
+        if self.last_checkpoint is None:
+            self.last_checkpoint = timestamp
+        if (timestamp - self.last_checkpoint).total_seconds() < self.checkpoint_interval:
+            return
+
+        self.last_checkpoint = timestamp
+        for tracker_id, segment in list(self.segments.items()):
+            if segment.speeds and (timestamp - segment.first_seen).total_seconds() >= self.checkpoint_interval:
+                self.pending.append(self.row(tracker_id, segment, False))
+                del self.segments[tracker_id]
+
+    def end_all(self):
+        for tracker_id in list(self.segments):
+            self.end(tracker_id)
+
+    def flush(self, logger):
+        for row in self.pending:
+            logger.log_row(TRAFFIC_TRACKS, row)
+        self.pending = []
@@ -2,13 +2,23 @@ import supervision as sv
 import numpy as np
 
 class Tracker:
-    def __init__(self):
+    CLASS_NAMES_DICT = {
+        2: "Auto",
+        3: "Moto",   # No son detectadas por el modelo
+        5: "Camion", # No son detectadas por el modelo
+        7: "Camion"
+    }
+
+    def __init__(self, frame_rate=30.0, lost_track_seconds=3.0):
+        # frame_rate: frames por segundo que llegan al tracker (FPS de la fuente / skip), no los del video
+        self.lost_track_seconds = lost_track_seconds
         self.tracker = sv.ByteTrack(
             track_activation_threshold=0.25,
             lost_track_buffer=30,
             minimum_matching_threshold=0.8,
             frame_rate=30
         )
+        self.set_frame_rate(frame_rate)
         
         self.box_annotator = sv.BoxAnnotator(
             thickness=2
@@ -18,19 +28,22 @@ class Tracker:
             text_thickness=1,
             text_padding=10
         )
-        
-        self.CLASS_NAMES_DICT = {
-            2: "Auto",
-            3: "Moto",   # No son detectadas por el modelo
-            5: "Camion", # No son detectadas por el modelo
-            7: "Camion"
-        }
+
+    def set_frame_rate(self, frame_rate):
+        # Un track perdido se conserva lost_track_seconds sin importar cada cuántos frames se detecte
+        self.frame_rate = frame_rate
+        self.tracker.max_time_lost = max(1, int(round(frame_rate * self.lost_track_seconds)))
 
     def update(self, detections):
         tracked_detections = self.tracker.update_with_detections(detections)
         return tracked_detections
 
-    def draw(self, frame, tracked_detections):
+    def live_ids(self):
+        # IDs que ByteTrack todavía puede devolver: activos y perdidos dentro de lost_track_buffer
+        tracks = self.tracker.tracked_tracks + self.tracker.lost_tracks
+        return {t.external_track_id for t in tracks if t.external_track_id != -1}
+
+    def draw(self, frame, tracked_detections, labels=None):
         if tracked_detections.tracker_id is None or len(tracked_detections.tracker_id) == 0:
             return frame
 
@@ -39,10 +52,11 @@ class Tracker:
             detections=tracked_detections
         )
         
-        labels = []
-        for tracker_id, class_id in zip(tracked_detections.tracker_id, tracked_detections.class_id):
-            class_name = self.CLASS_NAMES_DICT.get(class_id, "Otro")
-            labels.append(f"#{tracker_id} {class_name}")
+        if labels is None:
+            labels = []
+            for tracker_id, class_id in zip(tracked_detections.tracker_id, tracked_detections.class_id):
+                class_name = self.CLASS_NAMES_DICT.get(class_id, "Otro")
+                labels.append(f"#{tracker_id} {class_name}")
         
         annotated_frame = self.label_annotator.annotate(
             scene=annotated_frame,
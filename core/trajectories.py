@@ -0,0 +1,159 @@
+import os
+import glob
+import time
+import shutil
+import cv2
+import numpy as np
+from datetime import datetime, date, timedelta
+from core.speed_estimator import DIRECTION_UNKNOWN, DIRECTION_INCOMING, DIRECTION_OUTGOING, HISTORY_SIZE
+from core.partition_manager import add_months
+
+# Un punto por vehículo y frame procesado, en coordenadas de imagen (centro inferior de la caja).
+# ts es el timestamp con el que se registró la muestra en la DB (µs desde 1970, hora local), así
+# un recálculo encuentra la fila exacta; t es el tiempo del video con el que se calculó la velocidad.
+POINT_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("tracker_id", "<i4"),
+    ("class_id", "<i2"),
+    ("t", "<f8"),
+    ("x", "<f4"),
+    ("y", "<f4"),
+])
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+def to_micros(timestamp):
+    return (timestamp - EPOCH) // MICROSECOND
+
+def from_micros(values):
+    return np.asarray(values).astype("datetime64[us]").tolist()
+
+class TrajectoryRecorder:
+    # Guarda los puntos en segmentos .npy por cámara y día: <root>/<camera>/<AAAA-MM-DD>/<run>_<n>.npy
+    # `run` identifica la ejecución: los IDs de ByteTrack vuelven a empezar en cada una.
+    # Los días de meses anteriores a retention_months se borran, igual que las particiones de la DB.
+    def __init__(self, root, camera_id, segment_points=200_000, retention_months=3):
+        self.root = root
+        self.camera_id = camera_id
+        self.segment_points = segment_points
+        self.retention_months = retention_months
+        self.run = int(time.time() * 1000)
+        self.sequence = 0
+        self.day = None
+        self.parts = []
+        self.pending = 0
+
+    def record(self, timestamp, current_time, tracker_ids, class_ids, anchors):
+        n = len(tracker_ids)
+        if n == 0:
+            return
+        if timestamp.date() != self.day:
+            if self.day is not None:
+                self.flush()
+            # Al arrancar y en cada cambio de día
+            self.expire()
+        self.day = timestamp.date()
+
+        points = np.empty(n, dtype=POINT_DTYPE)
+        points["ts"] = to_micros(timestamp)
+        points["tracker_id"] = tracker_ids
+        points["class_id"] = class_ids
+        points["t"] = current_time
+        points["x"] = anchors[:, 0]
+        points["y"] = anchors[:, 1]
+        self.parts.append(points)
+        self.pending += n
+
+        if self.pending >= self.segment_points:
+            self.flush()
+
+    def flush(self):
+        if not self.parts:
+            return
+        directory = os.path.join(self.root, str(self.camera_id), self.day.isoformat())
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.run}_{self.sequence:06d}.npy")
+
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, np.concatenate(self.parts))
+        os.replace(path + ".tmp", path)
+
+        self.sequence += 1
+        self.parts = []
+        self.pending = 0
+
+    def expire(self, today=None):
+        if self.retention_months is None:
+            return
+        today = today or date.today()
+        cutoff = date(*add_months(today.year, today.month, -self.retention_months), 1)
+        camera_dir = os.path.join(self.root, str(self.camera_id))
+        if not os.path.isdir(camera_dir):
+            return
+        for name in sorted(os.listdir(camera_dir)):
+            try:
+                day = date.fromisoformat(name)
+            except ValueError:
+                continue
+            if day < cutoff:
+                print(f"[LIMPIEZA] Eliminando trayectorias: {os.path.join(camera_dir, name)}")
+                shutil.rmtree(os.path.join(camera_dir, name), ignore_errors=True)
+
+def load_points(root, camera_id, date_from, date_to):
+    # Todos los segmentos de [date_from, date_to) en un solo arreglo, más el run de cada punto
+    parts, runs = [], []
+    day = date_from
+    while day < date_to:
+        for path in sorted(glob.glob(os.path.join(root, str(camera_id), day.isoformat(), "*.npy"))):
+            points = np.load(path, mmap_mode="r")
+            parts.append(points)
+            runs.append(np.full(len(points), int(os.path.basename(path).split("_")[0]), dtype=np.int64))
+        day += timedelta(days=1)
+
+    if not parts:
+        return np.empty(0, dtype=POINT_DTYPE), np.empty(0, dtype=np.int64)
+    return np.concatenate(parts), np.concatenate(runs)
+
+def recompute(points, runs, H, history_size=HISTORY_SIZE, max_gap=10.0, correction_factor=1):
+    # Misma cuenta que SpeedEstimator.estimate_batch, para millones de puntos a la vez:
+    # cada punto se compara con el más viejo de su ventana de history_size muestras del mismo track.
+    n = len(points)
+    speeds = np.zeros(n, dtype=np.int32)
+    directions = np.full(n, DIRECTION_UNKNOWN, dtype=np.int8)
+    if n == 0:
+        return np.zeros(0, dtype=bool), speeds, directions
+
+    order = np.lexsort((points["t"], points["tracker_id"], runs))
+    t = points["t"][order]
+    ids = points["tracker_id"][order]
+    run = runs[order]
+
+    anchors = np.column_stack([points["x"][order], points["y"][order]]).astype(np.float32)
+    world = cv2.perspectiveTransform(anchors.reshape(-1, 1, 2), H).reshape(-1, 2).astype(np.float64)
+
+    # Un track nuevo empieza al cambiar de ejecución o de ID, o tras un hueco mayor a max_gap
+    # (el TrackStore lo habría expulsado por inactividad y su historial empezaría de cero)
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = (run[1:] != run[:-1]) | (ids[1:] != ids[:-1]) | (np.diff(t) > max_gap)
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(n), 0))
+    position = np.arange(n) - group_start
+
+    oldest = np.arange(n) - np.minimum(position, history_size - 1)
+    time_diff = t - t[oldest]
+    valid = (position >= 2) & (time_diff != 0)
+
+    delta = world - world[oldest]
+    dist = np.sqrt((delta ** 2).sum(axis=1))
+
+    sorted_speeds = np.zeros(n, dtype=np.int32)
+    sorted_dirs = np.full(n, DIRECTION_UNKNOWN, dtype=np.int8)
+    sorted_speeds[valid] = (dist[valid] / time_diff[valid] * 3.6 * correction_factor).astype(np.int32)
+    sorted_dirs[valid] = np.where(delta[valid, 1] > 0, DIRECTION_INCOMING, DIRECTION_OUTGOING)
+
+    # Volver al orden original de `points`
+    valid_out = np.zeros(n, dtype=bool)
+    valid_out[order] = valid
+    speeds[order] = sorted_speeds
+    directions[order] = sorted_dirs
+    return valid_out, speeds, directions
@@ -1,49 +1,109 @@
 import cv2
-from threading import Thread
-from queue import Queue
 import time
+from core.pipeline import Channel, Stage, END, policy_for
 
 class VideoLoader:
-    def __init__(self, source=0, queue_size=30):
+    def __init__(self, source=0, queue_size=30, skip_frames=1, policy=None, notify=None, start_frame=0, end_frame=None,
+                 timer=None, with_index=False):
         self.stream = cv2.VideoCapture(source)
         if not self.stream.isOpened():
             raise ValueError(f"No se pudo abrir la fuente: {source}")
-        
+
         self.fps = self.stream.get(cv2.CAP_PROP_FPS)
         if self.fps == 0 or self.fps is None:
             self.fps = 30.0 # Valor por defecto seguro
         print(f"[INFO] VideoLoader detectó {self.fps:.2f} FPS")
+        # (alto, ancho, 3) según el contenedor; None si la fuente no lo informa (algunas cámaras en vivo)
+        height = int(self.stream.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        width = int(self.stream.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.shape = (height, width, 3) if height and width else None
+
+        # Solo 1 de cada skip_frames se decodifica; el resto se descarta con grab().
+        # Se puede cambiar en caliente (AdaptiveScheduler): rige desde el último frame entregado
+        self.skip_frames = max(1, int(skip_frames))
+        self.frame_idx = 0
 
+        # Solo archivos: procesar el tramo [start_frame, end_frame) (fragmentos del modo offline)
+        self.end_frame = end_frame
+        # with_index: read() devuelve (frame, tiempo, índice del frame en el archivo); el índice no se puede
+        # deducir del tiempo en videos con FPS variable o CAP_PROP_POS_MSEC irregular
+        self.with_index = with_index
+        if start_frame:
+            self.stream.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            self.frame_idx = start_frame
+
+        # Archivos: el decodificador espera al consumidor. En vivo: se descartan los frames más viejos
+        self.policy = policy or policy_for(source)
         self.stopped = False
-        self.Q = Queue(maxsize=queue_size)
-        self.thread = Thread(target=self.update, args=(), daemon=True)
+        # Histograma opcional (core/metrics.py) con lo que cuesta obtener cada frame entregado, grabs incluidos
+        self.timer = timer
+        self.channel = Channel(queue_size, self.policy, notify=notify)
+        self.stage = Stage("decode", source=self.frames(), outbox=self.channel)
 
     def start(self):
-        self.thread.start()
+        self.stage.start()
         return self
 
-    def update(self):
-        while True:
-            if self.stopped: break
-            
-            if self.Q.full():
-                time.sleep(0.005)
-                continue
+    def frames(self):
+        last_idx = None
+        started = time.perf_counter()
+        while not self.stopped:
+            if self.end_frame is not None and self.frame_idx >= self.end_frame:
+                break
 
-            (grabbed, frame) = self.stream.read()
+            grabbed = self.stream.grab()
 
             if not grabbed:
-                self.stopped = True
                 break
 
-            self.Q.put(frame)
-            
-    def read(self):
-        return self.Q.get() if not self.Q.empty() else None
+            frame_idx = self.frame_idx
+            self.frame_idx += 1
+
+            if last_idx is not None and frame_idx - last_idx < self.skip_frames:
+                continue
+
+            (retrieved, frame) = self.stream.retrieve()
+            if not retrieved:
+                continue
+
+            last_idx = frame_idx
+            if self.timer is not None:
+                self.timer.observe(time.perf_counter() - started)
+            if self.with_index:
+                yield (frame, self.timestamp(frame_idx), frame_idx)
+            else:
+                yield (frame, self.timestamp(frame_idx))
+            started = time.perf_counter()
+
+    def timestamp(self, frame_idx):
+        # Tiempo real del frame según el contenedor; las cámaras en vivo suelen devolver 0
+        pos_msec = self.stream.get(cv2.CAP_PROP_POS_MSEC)
+        if pos_msec > 0:
+            return pos_msec / 1000.0
+        return frame_idx / self.fps
+
+    def read(self, block=True, timeout=None):
+        # Espera el próximo frame; None al terminar el video (o sin datos si block=False / timeout)
+        item = self.channel.get(block, timeout)
+        if item is END:
+            self.stopped = True
+            return None
+        return item
+
+    @property
+    def dropped(self):
+        return self.channel.dropped
+
+    def queued(self):
+        # Frames decodificados esperando al consumidor
+        return len(self.channel)
 
     def more(self):
-        return self.Q.qsize() > 0
+        return len(self.channel) > 0
 
     def stop(self):
         self.stopped = True
-        self.stream.release()
\ No newline at end of file
+        # Cerrar el canal libera al decodificador si estaba esperando lugar
+        self.channel.close()
+        self.stage.join(timeout=2.0)
+        self.stream.release()
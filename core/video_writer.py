@@ -0,0 +1,79 @@
+import cv2
+from threading import Thread
+from queue import Queue, Full
+
+class AnnotatedVideoWriter:
+    def __init__(self, output_path, tracker, fps=5.0, frame_size=(1280, 720), queue_size=8, fourcc="mp4v"):
+        self.output_path = output_path
+        self.tracker = tracker
+        self.fps = fps
+        self.frame_size = frame_size
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+
+        # Cola corta: si el disco o el render se atrasan se descartan frames, nunca se frena la detección
+        self.Q = Queue(maxsize=queue_size)
+        self.writer = None
+        self.last_time = None
+
+        self.written = 0
+        self.dropped = 0
+
+        self.stopped = False
+        self.thread = Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, detections, labels, current_time):
+        if self.stopped:
+            return False
+
+        # Muestreo según el tiempo del video, no del reloj: render a self.fps como máximo
+        if self.last_time is not None and current_time - self.last_time < 1.0 / self.fps:
+            return False
+
+        # Sin lugar no se copia: es justo cuando el render se atrasa. Solo este hilo agrega a la cola,
+        # así que el lugar no puede desaparecer entre el chequeo y el put
+        if self.Q.full():
+            self.dropped += 1
+            return False
+
+        try:
+            # Copia propia: con SharedMemoryLoader el frame es un slot que se reutiliza al siguiente read()
+            self.Q.put_nowait((frame.copy(), detections, labels))
+            self.last_time = current_time
+            return True
+        except Full:
+            self.dropped += 1
+            return False
+
+    def loop(self):
+        while True:
+            item = self.Q.get()
+            if item is None:
+                break
+
+            frame, detections, labels = item
+            annotated = self.tracker.draw(frame, detections, labels)
+            if self.frame_size is not None:
+                annotated = cv2.resize(annotated, self.frame_size)
+
+            if self.writer is None:
+                h, w = annotated.shape[:2]
+                self.writer = cv2.VideoWriter(self.output_path, self.fourcc, self.fps, (w, h))
+                if not self.writer.isOpened():
+                    print(f"[ERROR] No se pudo abrir el video de salida: {self.output_path}")
+                    self.stopped = True
+                    break
+                print(f"[INFO] Grabando video anotado en {self.output_path} ({w}x{h} @ {self.fps} FPS)")
+
+            self.writer.write(annotated)
+            self.written += 1
+
+        if self.writer is not None:
+            self.writer.release()
+        print(f"[INFO] VideoWriter finalizado. Frames escritos: {self.written}, descartados: {self.dropped}")
+
+    def stop(self):
+        self.stopped = True
+        if self.thread.is_alive():
+            self.Q.put(None)
+        self.thread.join()
@@ -0,0 +1,159 @@
+import os
+import json
+import numpy as np
+from datetime import datetime, timedelta
+from core.pg_copy import TRAFFIC_CROSSINGS, TRAFFIC_OCCUPANCY
+from core.speed_estimator import DIRECTION_NAMES, DIRECTION_INCOMING, DIRECTION_OUTGOING
+
+# Bits de crossed: un track se cuenta como máximo una vez por línea y sentido
+CROSSED_BITS = {DIRECTION_INCOMING: 1, DIRECTION_OUTGOING: 2}
+
+def zones_path_for(matrix_path):
+    # Líneas y zonas en metros, junto a la homografía: homography_matrix.npy -> homography_matrix_zones.json
+    return os.path.splitext(matrix_path)[0] + "_zones.json"
+
+def segment_crossings(prev, curr, starts, ends):
+    # Intersección de N tramos de track (prev -> curr) contra M líneas (starts -> ends) en una pasada (N, M).
+    # El punto final del tramo cuenta y el inicial no: un vehículo que cae justo sobre la línea
+    # se cuenta en ese frame y no otra vez en el siguiente.
+    r = (curr - prev)[:, None, :]
+    s = (ends - starts)[None, :, :]
+    ap = starts[None, :, :] - prev[:, None, :]
+
+    denom = r[..., 0] * s[..., 1] - r[..., 1] * s[..., 0]
+    parallel = denom == 0
+    denom = np.where(parallel, 1.0, denom)
+    t = (ap[..., 0] * s[..., 1] - ap[..., 1] * s[..., 0]) / denom
+    u = (ap[..., 0] * r[..., 1] - ap[..., 1] * r[..., 0]) / denom
+
+    crossed = ~parallel & (t > 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    # Sentido relativo a la línea A -> B: en una línea dibujada de izquierda a derecha,
+    # avanzar hacia y creciente es Incoming (mismo criterio que SpeedEstimator)
+    direction = np.where(s[..., 0] * r[..., 1] - s[..., 1] * r[..., 0] > 0, DIRECTION_INCOMING, DIRECTION_OUTGOING)
+    return crossed, direction
+
+def polygon_edges(polygons):
+    # Aristas de todos los polígonos concatenadas: inicio (E, 2), fin (E, 2) e índice de la primera de cada uno
+    polygons = [np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in polygons]
+    if not polygons:
+        return np.empty((0, 2)), np.empty((0, 2)), np.empty(0, dtype=np.intp)
+    starts = np.concatenate(polygons)
+    ends = np.concatenate([np.roll(p, -1, axis=0) for p in polygons])
+    first = np.cumsum([0] + [len(p) for p in polygons[:-1]]).astype(np.intp)
+    return starts, ends, first
+
+def points_in_polygons(points, a, b, first):
+    # Regla par-impar contra todas las aristas de todos los polígonos a la vez (N, E),
+    # sumando los cortes de cada polígono con reduceat -> (N, zonas)
+    px = points[:, None, 0]
+    py = points[:, None, 1]
+    straddles = (a[:, 1] > py) != (b[:, 1] > py)
+    dy = np.where(b[:, 1] == a[:, 1], 1.0, b[:, 1] - a[:, 1])
+    x_cross = a[:, 0] + (py - a[:, 1]) * (b[:, 0] - a[:, 0]) / dy
+    hits = (straddles & (px < x_cross)).astype(np.int32)
+    return np.add.reduceat(hits, first, axis=1) % 2 == 1
+
+class ZoneEngine:
+    # Líneas de conteo y zonas de ocupación en coordenadas del suelo (metros).
+    # Por frame: cruces de todos los tracks contra todas las líneas y vehículos dentro de cada zona,
+    # con operaciones de NumPy; Python solo recorre los cruces que efectivamente ocurrieron.
+    def __init__(self, lines, zones, store, camera_id=None, occupancy_interval=60.0, class_names=None):
+        self.camera_id = camera_id
+        self.store = store
+        self.class_names = class_names or {}
+        self.occupancy_interval = occupancy_interval
+
+        self.line_names = [line["name"] for line in lines]
+        points = np.asarray([line["points"] for line in lines], dtype=np.float64).reshape(-1, 2, 2)
+        self.starts = points[:, 0]
+        self.ends = points[:, 1]
+
+        self.zone_names = [zone["name"] for zone in zones]
+        if any(len(zone["polygon"]) < 3 for zone in zones):
+            raise ValueError("Cada zona necesita al menos 3 vértices")
+        self.edges = polygon_edges([zone["polygon"] for zone in zones])
+
+        # Por slot del TrackStore: dueño actual (para reiniciar al reutilizarse) y líneas ya cruzadas
+        self.owner = np.full(store.max_tracks, -1, dtype=np.int64)
+        self.crossed = np.zeros((store.max_tracks, len(self.line_names)), dtype=np.int8)
+
+        # Ocupación acumulada del intervalo en curso
+        self.bucket = None
+        self.samples = 0
+        self.occupancy_sum = np.zeros(len(self.zone_names), dtype=np.int64)
+        self.occupancy_max = np.zeros(len(self.zone_names), dtype=np.int64)
+
+        self.counts = {name: {DIRECTION_INCOMING: 0, DIRECTION_OUTGOING: 0} for name in self.line_names}
+        self.occupancy = np.zeros(len(self.zone_names), dtype=np.int64)
+        self.pending = []
+
+    @classmethod
+    def load(cls, path, store, camera_id=None, occupancy_interval=60.0, class_names=None):
+        with open(path) as f:
+            config = json.load(f)
+        return cls(config.get("lines", []), config.get("zones", []), store, camera_id, occupancy_interval, class_names)
+
+    def bucket_for(self, timestamp):
+        seconds = timestamp.hour * 3600 + timestamp.minute * 60 + timestamp.second
+        start = seconds - seconds % int(self.occupancy_interval)
+        return datetime.combine(timestamp.date(), datetime.min.time()) + timedelta(seconds=start)
+
+    def update(self, slots, tracker_ids, class_ids, prev, curr, has_prev, timestamp):
+        # slots/tracker_ids/class_ids: tracks del frame | prev, curr: último tramo en metros de cada uno
+        reused = self.owner[slots] != tracker_ids
+        self.crossed[slots[reused]] = 0
+        self.owner[slots] = tracker_ids
+
+        if len(self.line_names) and has_prev.any():
+            idx = np.flatnonzero(has_prev)
+            crossed, direction = segment_crossings(prev[idx], curr[idx], self.starts, self.ends)
+            bits = np.where(direction == DIRECTION_INCOMING, CROSSED_BITS[DIRECTION_INCOMING],
+                            CROSSED_BITS[DIRECTION_OUTGOING]).astype(np.int8)
+            crossed &= (self.crossed[slots[idx]] & bits) == 0
+
+            for i, line in zip(*np.nonzero(crossed)):
+                k = idx[i]
+                slot = slots[k]
+                self.crossed[slot, line] |= bits[i, line]
+                code = int(direction[i, line])
+                self.counts[self.line_names[line]][code] += 1
+                self.pending.append((TRAFFIC_CROSSINGS, (
+                    timestamp, timestamp.date(), self.camera_id, self.line_names[line], int(tracker_ids[k]),
+                    self.class_names.get(int(class_ids[k]), "Vehiculo"), DIRECTION_NAMES[code], int(self.store.speed[slot]),
+                )))
+
+        if len(self.zone_names):
+            bucket = self.bucket_for(timestamp)
+            if self.bucket is not None and bucket != self.bucket:
+                self.close_bucket()
+            self.bucket = bucket
+
+            if len(curr):
+                self.occupancy = points_in_polygons(curr, *self.edges).sum(axis=0)
+            else:
+                self.occupancy = np.zeros(len(self.zone_names), dtype=np.int64)
+            self.samples += 1
+            self.occupancy_sum += self.occupancy
+            np.maximum(self.occupancy_max, self.occupancy, out=self.occupancy_max)
+
+    def close_bucket(self):
+        if self.bucket is None or self.samples == 0:
+            return
+        for name, total, peak in zip(self.zone_names, self.occupancy_sum.tolist(), self.occupancy_max.tolist()):
+            self.pending.append((TRAFFIC_OCCUPANCY, (
+                self.bucket, self.bucket.date(), self.camera_id, name, self.samples, total / self.samples, peak,
+            )))
+        self.samples = 0
+        self.occupancy_sum[:] = 0
+        self.occupancy_max[:] = 0
+
+    def flush(self, logger):
+        for spec, row in self.pending:
+            logger.log_row(spec, row)
+        self.pending = []
+
+    def end(self, logger):
+        # Fin del video o del proceso: se emite el intervalo de ocupación incompleto
+        self.close_bucket()
+        self.bucket = None
+        self.flush(logger)
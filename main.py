@@ -1,133 +1,227 @@
 import cv2
 import time
-from core.video_loader import VideoLoader
-from core.detector import Detector
-from core.tracker import Tracker
-from core.speed_estimator import SpeedEstimator
-from core.postgres_logger import PostgresLogger
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# --------------------------------Configuración-------------------------------- #
-# - Ubicación del video de entrada -
-VIDEO_SOURCE = r"C:\Users\augus\OneDrive\Escritorio\Vehicle tracker\VehicleTracker\video\video_test.mp4"
-
-
-# - Cuántos frames saltarse entre procesamientos -
-SKIP_FRAMES = 3
-# - Factor de corrección de velocidad -      
-CORRECTION_FACTOR = 1  
-
-# - Configuración de Base de Datos (Variables de entorno) -
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST"),
-    "database": os.getenv("DB_NAME"),
-    "user": os.getenv("DB_USER"),
-    "password": os.getenv("DB_PASSWORD"),
-    "port": int(os.getenv("DB_PORT"))
-}
+from core.speed_estimator import DIRECTION_NAMES, DIRECTION_INCOMING
+from core.video_writer import AnnotatedVideoWriter
+from core.pipeline import is_live
+from core.metrics import METRICS, MetricsServer, JsonReporter, ProfileWindow
+from core.startup import Startup
+# La configuración (video, modelo, DB, métricas...) está en config/settings.py
+from config.settings import (VIDEO_SOURCE, CAMERA_ID, SKIP_FRAMES, ADAPTIVE_SKIP, MAX_SKIP_FRAMES,
+                             DENSE_TRACKS, CORRECTION_FACTOR, MAX_TRACKS, TRACK_MAX_IDLE, LOST_TRACK_SECONDS,
+                             LOG_MODE, TRACK_CHECKPOINT_INTERVAL, USE_ROI, ROI_PADDING, RETENTION_MONTHS, MODEL_NAME,
+                             INFERENCE_SIZE, DETECTOR_BACKEND, SHARED_MEMORY_LOADER, FRAME_SLOTS,
+                             DETECTION_CACHE, CACHE_DIR, TRAJECTORY_DIR, GROUND_GRID, USE_ZONES,
+                             OCCUPANCY_INTERVAL, HEADLESS, OUTPUT_VIDEO, OUTPUT_FPS, METRICS_PORT,
+                             METRICS_LOG_INTERVAL, PROFILE_START_FRAME, PROFILE_FRAMES, PROFILE_PATH,
+                             open_logger, start_uploader)
+
+def track_info(tracker_id, class_id, tracker, track_store):
+    cls_name = tracker.CLASS_NAMES_DICT.get(class_id, "Vehiculo")
+    slot = track_store.get(tracker_id)
+    speed = int(track_store.speed[slot]) if slot is not None else 0
+    direction_code = int(track_store.direction[slot]) if slot is not None else 0
+    return cls_name, speed, direction_code
+
+def track_labels(detections, tracker, track_store):
+    labels = []
+    for tracker_id, class_id in zip(detections.tracker_id, detections.class_id):
+        cls_name, speed, direction_code = track_info(tracker_id, class_id, tracker, track_store)
+        label = f"#{tracker_id} {cls_name}"
+        if speed > 0:
+            label += f" {speed} km/h {DIRECTION_NAMES[direction_code] if direction_code else ''}"
+        labels.append(label)
+    return labels
+
+def draw_frame(frame, detections, tracker, track_store):
+    display_frame = frame.copy()
+
+    for tracker_id, box, class_id in zip(detections.tracker_id, detections.xyxy, detections.class_id):
+        x1, y1, x2, y2 = map(int, box)
+
+        cls_name, speed, direction_code = track_info(tracker_id, class_id, tracker, track_store)
+        direction = DIRECTION_NAMES[direction_code] if direction_code else ""
+
+        color = (255, 255, 0) if direction_code == DIRECTION_INCOMING else (0, 0, 255)
+
+        cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 2)
+
+        cv2.putText(display_frame, f"#{tracker_id} {cls_name}", (x1, y1 - 10), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+        if speed > 0:
+            label = f"{speed} km/h {direction}"
+            cv2.putText(display_frame, label, (x1, y2 + 25), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+
+    return display_frame
+
+# Tareas del arranque (core/startup.py). Los módulos pesados (supervision, ultralytics/torch, onnxruntime)
+# se importan dentro de cada tarea: en paralelo y solo si esa tarea se usa
+def open_camera():
+    from core.camera_stream import CameraStream
+    return CameraStream(VIDEO_SOURCE, camera_id=CAMERA_ID, skip_frames=SKIP_FRAMES,
+                        correction_factor=CORRECTION_FACTOR, max_tracks=MAX_TRACKS, max_idle=TRACK_MAX_IDLE,
+                        lost_track_seconds=LOST_TRACK_SECONDS,
+                        summaries=LOG_MODE in ("tracks", "both"), checkpoint_interval=TRACK_CHECKPOINT_INTERVAL,
+                        use_roi=USE_ROI, roi_padding=ROI_PADDING,
+                        shared_memory=SHARED_MEMORY_LOADER, frame_slots=FRAME_SLOTS,
+                        adaptive_skip=ADAPTIVE_SKIP, max_skip=MAX_SKIP_FRAMES, dense_tracks=DENSE_TRACKS,
+                        trajectory_dir=TRAJECTORY_DIR, retention_months=RETENTION_MONTHS, ground_grid=GROUND_GRID,
+                        use_zones=USE_ZONES, occupancy_interval=OCCUPANCY_INTERVAL)
+
+def open_cache(stream):
+    from core.detection_cache import DetectionCache
+    return DetectionCache(CACHE_DIR, VIDEO_SOURCE, MODEL_NAME, conf=0.5, imgsz=INFERENCE_SIZE,
+                          backend=DETECTOR_BACKEND, skip_frames=SKIP_FRAMES, roi=stream.roi)
+
+def load_detector(cache=None):
+    # Mismo video y mismo detector con el cache completo: las detecciones salen del cache, sin cargar el modelo
+    if cache is not None and cache.complete:
+        return None
+    from core.detector import Detector
+    return Detector(MODEL_NAME, conf=0.5, imgsz=INFERENCE_SIZE, backend=DETECTOR_BACKEND)
+
+def warm_up(detector, stream):
+    if detector is not None:
+        detector.warmup([stream.loader.shape or (INFERENCE_SIZE, INFERENCE_SIZE, 3)], [stream.roi])
 
 def main():
     print("--- INICIANDO TRAFFIC VISION SYSTEM ---")
-    
-    loader = VideoLoader(VIDEO_SOURCE).start()
-    detector = Detector() 
-    tracker = Tracker()  
-    
-    try:
-        logger = PostgresLogger(DB_CONFIG, batch_size=15, flush_interval=1.0, retention_months=3)
-    except Exception as e:
-        print("Abortando: Fallo crítico en Base de Datos.")
-        loader.stop()
-        return
+
+    use_cache = DETECTION_CACHE and not is_live(VIDEO_SOURCE)
+    if use_cache and ADAPTIVE_SKIP:
+        print("[WARN] El cache de detecciones requiere ADAPTIVE_SKIP = False; se desactiva.")
+        use_cache = False
+
+    # Video + homografía, conexión a la DB y carga del modelo en paralelo; el calentamiento del
+    # modelo espera al video porque usa el tamaño real de sus frames
+    startup = Startup(camera=CAMERA_ID)
+    startup.task("camera", open_camera)
+    startup.task("db", open_logger)
+    if use_cache:
+        # La clave del cache depende de la ROI: el modelo se carga solo si el cache no está completo
+        startup.task("cache", open_cache, "camera")
+        startup.task("model", load_detector, "cache")
+    else:
+        startup.task("model", load_detector)
+    startup.task("warmup", warm_up, "model", "camera")
 
     try:
-        speed_estimator = SpeedEstimator()
+        stream = startup.result("camera")
+        logger = startup.result("db")
+        detector = startup.result("model")
+        startup.result("warmup")
     except Exception as e:
-        print(f"Error crítico: {e}")
-        print("Ejecuta calibration_tool.py primero.")
-        loader.stop()
-        logger.stop()
+        if startup.failed("camera") and isinstance(e, FileNotFoundError):
+            print(f"Error crítico: {e}")
+            print("Ejecuta calibration_tool.py primero.")
+        elif startup.failed("db"):
+            print("Abortando: Fallo crítico en Base de Datos.")
+        else:
+            print(f"Error crítico al iniciar: {e}")
+        startup.discard(camera=lambda s: s.stop(), db=lambda l: l.stop())
         return
 
-    frame_cnt = 0
-    current_detections = None 
-    
-    vehicle_speeds = {}   
-    vehicle_directions = {}
+    tracker = stream.tracker
+    track_store = stream.track_store
+
+    cache = startup.result("cache") if use_cache else None
+    recorder = None
+    if cache is not None and cache.complete:
+        detector = cache.replay()
+        if HEADLESS and not OUTPUT_VIDEO:
+            # Sin imagen que mostrar ni grabar tampoco hace falta decodificar el video
+            stream.loader.stop()
+            stream.loader = detector
+    elif cache is not None:
+        recorder = cache.recorder()
+
+    startup.report()
+    loader = stream.loader.start()
+    completed = False
+
+    uploader = start_uploader()
+    writer = AnnotatedVideoWriter(OUTPUT_VIDEO, tracker, fps=OUTPUT_FPS) if OUTPUT_VIDEO else None
+
+    server = None
+    if METRICS_PORT is not None:
+        try:
+            server = MetricsServer(METRICS_PORT).start()
+        except OSError as e:
+            print(f"[WARN] No se pudo abrir el puerto de métricas {METRICS_PORT}: {e}")
+    reporter = JsonReporter(METRICS_LOG_INTERVAL).start() if METRICS_LOG_INTERVAL else None
+    profile = ProfileWindow(PROFILE_START_FRAME, PROFILE_FRAMES, PROFILE_PATH) if PROFILE_START_FRAME is not None else None
+
+    timers = {stage: METRICS.histogram("trafficvision_stage_seconds", stage=stage, camera=CAMERA_ID)
+              for stage in ("wait", "detect", "render", "total")}
+    frame_number = 0
 
     try:
         while True:
-            if loader.stopped and not loader.more():
+            # Bloquea hasta el próximo frame; None = fin del video
+            waiting = time.perf_counter()
+            item = loader.read()
+            if item is None:
+                completed = True
                 break
-
-            frame = loader.read()
-            if frame is None:
-                time.sleep(0.001)
-                continue
                 
-            frame_cnt += 1
+            frame, current_time = item
+            started = time.perf_counter()
+            timers["wait"].observe(started - waiting)
+            if profile is not None:
+                profile.tick(frame_number)
+            frame_number += 1
             
-            current_time = frame_cnt / loader.fps 
+            # El loader ya descartó los frames intermedios sin decodificarlos
+            raw_detections = detector.detect(frame, roi=stream.roi)
+            if recorder is not None:
+                recorder.add(current_time, raw_detections)
+            detected = time.perf_counter()
+            timers["detect"].observe(detected - started)
             
-            if frame_cnt % SKIP_FRAMES == 0:
-                raw_detections = detector.detect(frame)
-                
-                current_detections = tracker.update(raw_detections)
-                
-                for tracker_id, box, class_id in zip(current_detections.tracker_id, current_detections.xyxy, current_detections.class_id):
-                    
-                    speed = speed_estimator.estimate(tracker_id, box, current_time)
-                    
-                    if speed is not None:
-                        final_speed = int(speed * CORRECTION_FACTOR)
-                        vehicle_speeds[tracker_id] = final_speed
-                        
-                        history = speed_estimator.vehicle_history.get(tracker_id, [])
-                        direction = "DESCONOCIDO"
-                        if len(history) > 1:
-                            _, _, y_now = history[-1]
-                            _, _, y_old = history[0]
-                            direction = "Incoming" if y_now > y_old else "Outgoing"
-                            vehicle_directions[tracker_id] = direction
-
-                        cls_name = tracker.CLASS_NAMES_DICT.get(class_id, "Vehiculo")
-                        logger.log(tracker_id, cls_name, final_speed, direction)
-
-            display_frame = frame.copy()
-            
-            if current_detections is not None:
-                for tracker_id, box, class_id in zip(current_detections.tracker_id, current_detections.xyxy, current_detections.class_id):
-                    x1, y1, x2, y2 = map(int, box)
-                    
-                    cls_name = tracker.CLASS_NAMES_DICT.get(class_id, "Vehiculo")
-                    speed = vehicle_speeds.get(tracker_id, 0)
-                    direction = vehicle_directions.get(tracker_id, "")
-                    
-                    color = (255, 255, 0) if direction == "Incoming" else (0, 0, 255)
-                    
-                    cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 2)
-                    
-                    cv2.putText(display_frame, f"#{tracker_id} {cls_name}", (x1, y1 - 10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                    
-                    if speed > 0:
-                        label = f"{speed} km/h {direction}"
-                        cv2.putText(display_frame, label, (x1, y2 + 25), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-
-            cv2.imshow("TrafficVision Pro - DB Connected", cv2.resize(display_frame, (1280, 720)))
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+            current_detections = stream.process(raw_detections, current_time, logger)
+            processed = time.perf_counter()
+
+            if writer is not None:
+                labels = track_labels(current_detections, tracker, track_store)
+                writer.submit(frame, current_detections, labels, current_time)
+
+            if not HEADLESS:
+                display_frame = draw_frame(frame, current_detections, tracker, track_store)
+                cv2.imshow("TrafficVision Pro - DB Connected", cv2.resize(display_frame, (1280, 720)))
+
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+
+            finished = time.perf_counter()
+            timers["render"].observe(finished - processed)
+            timers["total"].observe(finished - started)
+
+            # Próximo frame a procesar según el tiempo que tomó este y el tráfico en escena
+            stream.schedule(finished - started)
+            if frame_number == 1:
+                startup.first_frame()
 
     finally:
         print("[INFO] Cerrando sistema...")
+        if profile is not None:
+            profile.finish()
         loader.stop()
+        if recorder is not None and completed:
+            # Solo una pasada completa queda como cache
+            recorder.save()
+        stream.flush(logger)
         logger.stop()
-        cv2.destroyAllWindows()
+        if uploader is not None:
+            uploader.stop()
+        if writer is not None:
+            writer.stop()
+        if reporter is not None:
+            reporter.stop()
+        if server is not None:
+            server.stop()
+        if not HEADLESS:
+            cv2.destroyAllWindows()
         print("[INFO] Sistema finalizado.")
 
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+import json
+import os
+import sys
+import time
+import threading
+import multiprocessing as mp
+from queue import Empty
+from core.pg_copy import TABLES
+from core.startup import Startup
+from config.settings import (open_logger, start_uploader, CORRECTION_FACTOR, MAX_TRACKS, TRACK_MAX_IDLE,
+                             LOST_TRACK_SECONDS, LOG_MODE, TRACK_CHECKPOINT_INTERVAL, USE_ROI, ROI_PADDING, MODEL_NAME,
+                             INFERENCE_SIZE, DETECTOR_BACKEND, ADAPTIVE_SKIP, MAX_SKIP_FRAMES, DENSE_TRACKS,
+                             TRAJECTORY_DIR, RETENTION_MONTHS, GROUND_GRID, USE_ZONES, OCCUPANCY_INTERVAL)
+
+# --------------------------------Configuración-------------------------------- #
+# - Archivo con la lista de cámaras (source, homography, camera_id) -
+CONFIG_PATH = "config/cameras.json"
+
+class QueueLogger:
+    # Sustituto de PostgresLogger dentro de los workers: junta los registros
+    # de un ciclo y los envía en un único mensaje al proceso principal
+    def __init__(self, out_queue):
+        self.out_queue = out_queue
+        self.buffer = []
+
+    def log(self, tracker_id, class_name, speed, direction, camera_id=None, timestamp=None):
+        self.buffer.append(("log", (int(tracker_id), str(class_name), int(speed), str(direction), camera_id, timestamp)))
+
+    def log_row(self, spec, row):
+        self.buffer.append(("row", (spec.name, row)))
+
+    def flush(self):
+        if self.buffer:
+            self.out_queue.put(self.buffer)
+            self.buffer = []
+
+class RecordCollector:
+    # Reenvía a la salida compartida (PostgresLogger o LocalSink) todo lo que llega de los workers
+    def __init__(self, out_queue, logger, processes):
+        self.out_queue = out_queue
+        self.logger = logger
+        self.processes = processes
+        self.pending = len(processes)
+
+    def drain(self, deadline=None):
+        while self.pending > 0 and (deadline is None or time.time() < deadline):
+            try:
+                records = self.out_queue.get(timeout=0.5)
+            except Empty:
+                if not any(p.is_alive() for p in self.processes):
+                    break
+                continue
+
+            if records is None:
+                self.pending -= 1
+                continue
+
+            for kind, record in records:
+                if kind == "row":
+                    self.logger.log_row(TABLES[record[0]], record[1])
+                else:
+                    self.logger.log(*record)
+
+def load_config(path):
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    cameras = config.get("cameras", [])
+    for cam in cameras:
+        for key in ("camera_id", "source", "homography"):
+            if key not in cam:
+                raise ValueError(f"Cámara sin '{key}' en {path}: {cam}")
+    return config
+
+def load_detector(threads):
+    # torch se importa acá, en el hilo del modelo, y no al arrancar el worker
+    if DETECTOR_BACKEND == "ultralytics":
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    from core.detector import Detector
+    return Detector(MODEL_NAME, imgsz=INFERENCE_SIZE, backend=DETECTOR_BACKEND, threads=threads)
+
+def open_camera(cam, skip_frames, frame_ready):
+    from core.camera_stream import CameraStream
+    return CameraStream(cam["source"], cam["homography"], camera_id=cam["camera_id"],
+                        skip_frames=skip_frames, correction_factor=CORRECTION_FACTOR,
+                        max_tracks=MAX_TRACKS, max_idle=TRACK_MAX_IDLE,
+                        lost_track_seconds=LOST_TRACK_SECONDS,
+                        summaries=LOG_MODE in ("tracks", "both"),
+                        checkpoint_interval=TRACK_CHECKPOINT_INTERVAL,
+                        use_roi=USE_ROI, roi_padding=ROI_PADDING, notify=frame_ready,
+                        adaptive_skip=ADAPTIVE_SKIP, max_skip=MAX_SKIP_FRAMES,
+                        dense_tracks=DENSE_TRACKS, trajectory_dir=TRAJECTORY_DIR, retention_months=RETENTION_MONTHS,
+                        ground_grid=GROUND_GRID, use_zones=USE_ZONES,
+                        occupancy_interval=OCCUPANCY_INTERVAL)
+
+def warm_up(detector, streams):
+    if streams:
+        detector.warmup([stream.loader.shape or (INFERENCE_SIZE, INFERENCE_SIZE, 3) for stream in streams],
+                        [stream.roi for stream in streams])
+
+def camera_worker(worker_id, cameras, n_workers, skip_frames, out_queue, stop_event):
+    # Cada proceso usa su parte de los núcleos para que los workers no compitan entre sí
+    threads = max(1, (os.cpu_count() or 1) // n_workers)
+
+    logger = QueueLogger(out_queue)
+    streams = []
+    # Todas las cámaras del worker despiertan el mismo evento al entregar un frame
+    frame_ready = threading.Event()
+    try:
+        # Modelo y cámaras (video + homografía) en paralelo: un worker reiniciado vuelve a procesar antes
+        startup = Startup(worker=str(worker_id))
+        startup.task("model", lambda: load_detector(threads))
+        for cam in cameras:
+            startup.task(f"camera:{cam['camera_id']}", lambda cam=cam: open_camera(cam, skip_frames, frame_ready))
+
+        for cam in cameras:
+            try:
+                streams.append(startup.result(f"camera:{cam['camera_id']}"))
+            except Exception as e:
+                print(f"[WORKER {worker_id}] No se pudo iniciar {cam['camera_id']}: {e}")
+
+        # Calentamiento con un frame negro por cámara, del mismo tamaño que los reales
+        startup.task("warmup", lambda detector: warm_up(detector, streams), "model")
+        detector = startup.result("model")
+        startup.result("warmup")
+        startup.report()
+
+        for stream in streams:
+            stream.start()
+            print(f"[WORKER {worker_id}] Cámara {stream.camera_id} iniciada.")
+
+        while streams and not stop_event.is_set():
+            # Se limpia antes de recorrer: un frame que llegue durante el recorrido vuelve a activarlo
+            frame_ready.clear()
+            batch = []
+            for stream in streams:
+                item = stream.loader.read(block=False)
+                if item is not None:
+                    batch.append((stream, item[0], item[1]))
+
+            if not batch:
+                for stream in [s for s in streams if s.finished()]:
+                    print(f"[WORKER {worker_id}] Cámara {stream.camera_id} finalizada.")
+                    stream.stop()
+                    stream.flush(logger)
+                    streams.remove(stream)
+                # Sin frames: dormir hasta que alguna cámara entregue uno (o revisar stop_event cada tanto)
+                frame_ready.wait(0.5)
+                continue
+
+            # Un frame por cámara, una sola inferencia para todo el lote
+            started = time.perf_counter()
+            all_detections = detector.detect_batch([frame for _, frame, _ in batch],
+                                                   rois=[stream.roi for stream, _, _ in batch])
+
+            for (stream, _, current_time), raw_detections in zip(batch, all_detections):
+                stream.process(raw_detections, current_time, logger)
+
+            # Cada cámara del lote esperó la inferencia completa: ese es su tiempo por frame
+            elapsed = time.perf_counter() - started
+            for stream, _, _ in batch:
+                stream.schedule(elapsed)
+
+            logger.flush()
+    finally:
+        for stream in streams:
+            stream.stop()
+            stream.flush(logger)
+        logger.flush()
+        out_queue.put(None)
+
+def main():
+    print("--- INICIANDO TRAFFIC VISION MULTI-CÁMARA ---")
+
+    config_path = sys.argv[1] if len(sys.argv) > 1 else CONFIG_PATH
+    config = load_config(config_path)
+    cameras = config["cameras"]
+    if not cameras:
+        print(f"[ERROR] No hay cámaras configuradas en {config_path}")
+        return
+
+    n_workers = config.get("workers") or os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(cameras)))
+    skip_frames = config.get("skip_frames", 3)
+
+    # Reparto round-robin de cámaras entre procesos
+    groups = [cameras[i::n_workers] for i in range(n_workers)]
+    print(f"[INFO] {len(cameras)} cámaras repartidas en {n_workers} procesos.")
+
+    try:
+        logger = open_logger(batch_size=200)
+    except Exception:
+        print("Abortando: Fallo crítico en Base de Datos.")
+        return
+
+    uploader = start_uploader()
+    ctx = mp.get_context("spawn")
+    out_queue = ctx.Queue(maxsize=1000)
+    stop_event = ctx.Event()
+
+    processes = [
+        ctx.Process(target=camera_worker, args=(i, group, n_workers, skip_frames, out_queue, stop_event), daemon=True)
+        for i, group in enumerate(groups)
+    ]
+    for p in processes:
+        p.start()
+
+    collector = RecordCollector(out_queue, logger, processes)
+    try:
+        collector.drain()
+    except KeyboardInterrupt:
+        print("[INFO] Interrupción recibida, deteniendo cámaras...")
+    finally:
+        print("[INFO] Cerrando sistema...")
+        stop_event.set()
+        # Vaciar lo que los workers alcancen a enviar antes de terminar
+        collector.drain(deadline=time.time() + 10)
+
+        for p in processes:
+            p.join(timeout=5)
+        logger.stop()
+        if uploader is not None:
+            uploader.stop()
+        print("[INFO] Sistema finalizado.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import argparse
+import csv
+import os
+import time
+import cv2
+import numpy as np
+import multiprocessing as mp
+from datetime import datetime, timedelta
+from core.camera_stream import CameraStream
+from core.detector import Detector
+from core.postgres_logger import PostgresLogger
+from core.local_sink import LocalSink, LOCAL_FORMATS
+from core.sink import Sink
+from core.pg_copy import TRAFFIC_LOGS, TRAFFIC_TRACKS
+from core.speed_estimator import DIRECTION_NAMES
+from core.track_summary import TrackSummarizer
+from config.settings import (DB_CONFIG, DB_INSERT_MODE, SPILL_DIR, SKIP_FRAMES, CORRECTION_FACTOR, MAX_TRACKS,
+                             TRACK_MAX_IDLE, LOST_TRACK_SECONDS, LOG_MODE, TRACK_CHECKPOINT_INTERVAL, ROLLUP,
+                             USE_ROI, ROI_PADDING, MODEL_NAME, INFERENCE_SIZE, DETECTOR_BACKEND, GROUND_GRID, LOCAL_DIR)
+
+# --------------------------------Configuración-------------------------------- #
+# - Duración de cada fragmento y solapamiento con el anterior (segundos de video) -
+CHUNK_SECONDS = 300.0
+OVERLAP_SECONDS = 5.0
+# - IoU mínimo para considerar que dos cajas del solapamiento son el mismo vehículo -
+STITCH_IOU = 0.5
+# ----------------------------------------------------------------------------- #
+
+DIRECTION_CODES = {name: code for code, name in DIRECTION_NAMES.items()}
+
+detector = None
+
+class SampleCollector:
+    # Sustituto del logger dentro de los workers: guarda las muestras con el tiempo del video;
+    # los IDs son locales al fragmento y el proceso principal los traduce al unirlos
+    def __init__(self):
+        self.current_time = None
+        self.samples = []
+
+    def log(self, tracker_id, class_name, speed, direction, camera_id=None, timestamp=None):
+        self.samples.append((self.current_time, int(tracker_id), str(class_name), int(speed), str(direction)))
+
+    def log_row(self, spec, row):
+        # Los resúmenes por vehículo se arman en el proceso principal, con los IDs ya unidos
+        pass
+
+class CsvSink(Sink):
+    # Salida a archivos: traffic_logs en `path` y traffic_tracks en <path>_tracks.csv
+    def __init__(self, path):
+        self.files = {}
+        self.writers = {}
+        stem, ext = os.path.splitext(path)
+        for spec, spec_path in ((TRAFFIC_LOGS, path), (TRAFFIC_TRACKS, f"{stem}_tracks{ext or '.csv'}")):
+            f = self.files[spec.name] = open(spec_path, "w", newline="", encoding="utf-8")
+            self.writers[spec.name] = csv.writer(f)
+            self.writers[spec.name].writerow(spec.columns)
+
+    def log_row(self, spec, row):
+        self.writers[spec.name].writerow(row)
+
+    def stop(self):
+        for f in self.files.values():
+            f.close()
+
+def video_start_time(path, total_frames, fps):
+    # Sin --start se asume que el archivo se terminó de escribir al final de la grabación
+    modified = datetime.fromtimestamp(os.path.getmtime(path))
+    return modified - timedelta(seconds=total_frames / fps)
+
+def plan_chunks(total_frames, fps, skip, chunk_seconds, overlap_seconds):
+    # Límites múltiplos de skip: dos fragmentos vecinos procesan exactamente los mismos frames del solapamiento
+    step = max(skip, int(round(chunk_seconds * fps / skip)) * skip)
+    overlap = int(round(overlap_seconds * fps / skip)) * skip
+    return [
+        (index, max(0, start - overlap), start, min(start + step, total_frames))
+        for index, start in enumerate(range(0, total_frames, step))
+    ], overlap
+
+def init_worker(threads):
+    global detector
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    detector = Detector(MODEL_NAME, imgsz=INFERENCE_SIZE, backend=DETECTOR_BACKEND, threads=threads)
+
+def process_chunk(task):
+    index, read_from, start, end, overlap, video, matrix_path, camera_id, skip = task
+    started = time.perf_counter()
+
+    stream = CameraStream(video, matrix_path, camera_id=camera_id, skip_frames=skip,
+                          correction_factor=CORRECTION_FACTOR, max_tracks=MAX_TRACKS, max_idle=TRACK_MAX_IDLE,
+                          lost_track_seconds=LOST_TRACK_SECONDS,
+                          use_roi=USE_ROI, roi_padding=ROI_PADDING, start_frame=read_from, end_frame=end,
+                          frame_index=True, ground_grid=GROUND_GRID, use_zones=False)
+    collector = SampleCollector()
+    samples = []
+    # Cajas por frame en el solapamiento: al inicio (head, compartido con el fragmento anterior)
+    # y al final (tail, compartido con el siguiente)
+    head, tail = {}, {}
+
+    stream.start()
+    try:
+        while True:
+            item = stream.loader.read()
+            if item is None:
+                break
+            frame, current_time, frame_number = item
+
+            collector.current_time = current_time
+            detections = stream.process(detector.detect(frame, roi=stream.roi), current_time, collector)
+
+            tracker_ids = detections.tracker_id if detections.tracker_id is not None else np.empty(0, dtype=int)
+            boxes = (np.asarray(tracker_ids).copy(), detections.xyxy.copy())
+            if frame_number < start:
+                head[frame_number] = boxes
+            else:
+                samples.extend(collector.samples)
+            if frame_number >= end - overlap:
+                tail[frame_number] = boxes
+            collector.samples = []
+    finally:
+        stream.stop()
+
+    return {"index": index, "samples": samples, "head": head, "tail": tail,
+            "seconds": time.perf_counter() - started}
+
+def box_iou(a, b):
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+class TrackStitcher:
+    # Une los IDs locales de fragmentos consecutivos: en los frames del solapamiento ambos
+    # fragmentos ven los mismos vehículos, y el par de IDs que más frames coincide (IoU) es el mismo
+    def __init__(self, iou_threshold=0.5):
+        self.iou_threshold = iou_threshold
+        self.next_id = 1
+        self.previous = {}
+        self.previous_tail = {}
+
+    def match(self, tail, head):
+        votes = {}
+        common = tail.keys() & head.keys()
+        for frame_number in common:
+            prev_ids, prev_boxes = tail[frame_number]
+            ids, boxes = head[frame_number]
+            if len(prev_ids) == 0 or len(ids) == 0:
+                continue
+            for i, j in zip(*np.nonzero(box_iou(prev_boxes, boxes) >= self.iou_threshold)):
+                key = (int(prev_ids[i]), int(ids[j]))
+                votes[key] = votes.get(key, 0) + 1
+
+        # Asignación uno a uno, empezando por los pares con más frames en común
+        min_votes = min(2, len(common))
+        matches, used_prev, used = {}, set(), set()
+        for (prev_id, local_id), count in sorted(votes.items(), key=lambda item: -item[1]):
+            if count < min_votes or prev_id in used_prev or local_id in used:
+                continue
+            matches[local_id] = prev_id
+            used_prev.add(prev_id)
+            used.add(local_id)
+        return matches
+
+    def stitch(self, result):
+        # Devuelve el mapa ID local -> ID global del fragmento y los IDs globales del anterior que terminaron
+        matches = self.match(self.previous_tail, result["head"])
+
+        local_ids = {sample[1] for sample in result["samples"]}
+        for ids, _ in result["tail"].values():
+            local_ids.update(int(i) for i in ids)
+
+        mapping = {}
+        for local_id in sorted(local_ids):
+            prev_id = matches.get(local_id)
+            if prev_id is not None and prev_id in self.previous:
+                mapping[local_id] = self.previous[prev_id]
+            else:
+                mapping[local_id] = self.next_id
+                self.next_id += 1
+
+        ended = set(self.previous.values()) - set(mapping.values())
+        self.previous = mapping
+        self.previous_tail = result["tail"]
+        return mapping, ended
+
+def main():
+    parser = argparse.ArgumentParser(description="Procesamiento offline de video grabado en fragmentos paralelos")
+    parser.add_argument("video")
+    parser.add_argument("--homography", default="config/homography_matrix.npy")
+    parser.add_argument("--camera-id", default="cam_0")
+    parser.add_argument("--start", default=None, help="Inicio de la grabación (ISO 8601). Por defecto: fecha del archivo - duración")
+    parser.add_argument("--output", default="postgres",
+                        help="'postgres', 'sqlite' o 'parquet' (archivos en LOCAL_DIR) o ruta a un .csv")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--chunk", type=float, default=CHUNK_SECONDS, help="Segundos de video por fragmento")
+    parser.add_argument("--overlap", type=float, default=OVERLAP_SECONDS, help="Segundos compartidos entre fragmentos")
+    parser.add_argument("--skip", type=int, default=SKIP_FRAMES)
+    args = parser.parse_args()
+
+    print("--- TRAFFIC VISION OFFLINE ---")
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        print(f"[ERROR] No se pudo abrir {args.video}")
+        return
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    start_time = datetime.fromisoformat(args.start) if args.start else video_start_time(args.video, total_frames, fps)
+    skip = max(1, args.skip)
+    chunks, overlap = plan_chunks(total_frames, fps, skip, args.chunk, args.overlap)
+    print(f"[INFO] {total_frames} frames a {fps:.2f} FPS desde {start_time}: {len(chunks)} fragmentos, "
+          f"{args.workers} workers")
+
+    if args.output == "postgres":
+        # blocking: el logger frena a los workers en lugar de descartar filas
+        sink = PostgresLogger(DB_CONFIG, batch_size=5000, flush_interval=1.0, camera_id=args.camera_id,
+                              insert_mode=DB_INSERT_MODE, spill_dir=SPILL_DIR,
+                              store_frames=LOG_MODE in ("frames", "both"), rollup=ROLLUP, blocking=True)
+    elif args.output in LOCAL_FORMATS:
+        sink = LocalSink(LOCAL_DIR, args.output, batch_size=5000, camera_id=args.camera_id,
+                         store_frames=LOG_MODE in ("frames", "both"), rollup=ROLLUP, blocking=True)
+    else:
+        sink = CsvSink(args.output)
+
+    summarizer = TrackSummarizer(args.camera_id, TRACK_CHECKPOINT_INTERVAL) if LOG_MODE in ("tracks", "both") else None
+    stitcher = TrackStitcher(STITCH_IOU)
+
+    tasks = [(index, read_from, start, end, overlap, args.video, args.homography, args.camera_id, skip)
+             for index, read_from, start, end in chunks]
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    started = time.perf_counter()
+    rows = 0
+    # IDs globales con alguna muestra escrita: stitcher.next_id también cuenta los que no llegaron a escribirse
+    vehicles = set()
+
+    ctx = mp.get_context("spawn")
+    try:
+        with ctx.Pool(args.workers, initializer=init_worker, initargs=(threads,)) as pool:
+            # imap conserva el orden: cada fragmento se une al anterior apenas está listo
+            for result in pool.imap(process_chunk, tasks):
+                mapping, ended = stitcher.stitch(result)
+
+                for current_time, local_id, class_name, speed, direction in result["samples"]:
+                    timestamp = start_time + timedelta(seconds=current_time)
+                    tracker_id = mapping[local_id]
+                    vehicles.add(tracker_id)
+                    sink.log(tracker_id, class_name, speed, direction, camera_id=args.camera_id, timestamp=timestamp)
+                    if summarizer is not None:
+                        summarizer.add(tracker_id, class_name, speed, DIRECTION_CODES.get(direction, 0), timestamp)
+                    rows += 1
+
+                if summarizer is not None:
+                    for tracker_id in ended:
+                        summarizer.end(tracker_id)
+                    if result["samples"]:
+                        summarizer.checkpoint(start_time + timedelta(seconds=result["samples"][-1][0]))
+                    summarizer.flush(sink)
+
+                elapsed = time.perf_counter() - started
+                done_seconds = min(chunks[result["index"]][3], total_frames) / fps
+                print(f"[OFFLINE] Fragmento {result['index'] + 1}/{len(chunks)}: {len(result['samples'])} muestras "
+                      f"en {result['seconds']:.1f}s | {done_seconds / elapsed:.1f}x tiempo real")
+    finally:
+        if summarizer is not None:
+            summarizer.end_all()
+            summarizer.flush(sink)
+        sink.stop()
+
+    print(f"[INFO] {rows} muestras de {len(vehicles)} vehículos en {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -14,12 +14,94 @@ CREATE TABLE traffic_logs (
     tracker_id INTEGER,                           -- ID del vehículo (del Tracker ByteTrack)
     vehicle_class VARCHAR(50),                    -- Auto, Camión, Moto, etc.
     speed_kmh INTEGER,                            -- Velocidad calculada
-    direction VARCHAR(50)                         -- Incoming / Outgoing
+    direction VARCHAR(50),                        -- Incoming / Outgoing
+    camera_id VARCHAR(50)                         -- Cámara de origen (multi_camera.py)
 ) PARTITION BY RANGE (record_date);
 
--- 3. Índices (Opcional pero recomendado para rendimiento en Power BI)
--- Se crean sobre la columna de tiempo para acelerar los gráficos de líneas.
-CREATE INDEX ON traffic_logs (record_timestamp);
+-- Para bases existentes creadas antes de la columna camera_id:
+-- ALTER TABLE traffic_logs ADD COLUMN IF NOT EXISTS camera_id VARCHAR(50);
+
+-- 3. Índices
+-- No se crea un B-tree sobre la tabla maestra: PartitionManager (core/partition_manager.py)
+-- crea en cada partición mensual un índice BRIN sobre record_timestamp. Las filas llegan
+-- ordenadas por tiempo, así que el BRIN ocupa unos KB y no encarece las inserciones.
+
+-- 4. Tabla de resúmenes por vehículo (LOG_MODE = "tracks" o "both")
+-- Una fila por track al terminar, en lugar de una por frame. Los vehículos que siguen
+-- en escena más de TRACK_CHECKPOINT_INTERVAL generan filas parciales (is_final = false);
+-- cada fila cubre un tramo distinto del track.
+DROP TABLE IF EXISTS traffic_tracks CASCADE;
+
+CREATE TABLE traffic_tracks (
+    first_seen TIMESTAMP WITHOUT TIME ZONE,       -- Primera muestra del tramo
+    record_date DATE NOT NULL,                    -- La llave para el particionamiento
+    last_seen TIMESTAMP WITHOUT TIME ZONE,        -- Última muestra del tramo
+    camera_id VARCHAR(50),
+    tracker_id INTEGER,
+    vehicle_class VARCHAR(50),                    -- Clase más frecuente del track
+    direction VARCHAR(50),                        -- Última dirección conocida
+    duration_s DOUBLE PRECISION,
+    samples INTEGER,                              -- Muestras de velocidad agregadas
+    speed_min INTEGER,
+    speed_max INTEGER,
+    speed_mean DOUBLE PRECISION,
+    speed_median DOUBLE PRECISION,
+    is_final BOOLEAN                              -- false: checkpoint de un track aún activo
+) PARTITION BY RANGE (record_date);
+
+-- Índice BRIN sobre first_seen en cada partición (PartitionManager).
+
+-- 5. Agregados por minuto y por hora para el tablero (PostgresLogger con rollup=True)
+-- El logger suma cada minuto cerrado con INSERT ... ON CONFLICT y recalcula la hora
+-- correspondiente desde la tabla de minutos. Media = speed_sum / samples,
+-- desvío = sqrt(speed_sum_sq / samples - (speed_sum / samples)^2).
+DROP TABLE IF EXISTS traffic_rollup_1m;
+DROP TABLE IF EXISTS traffic_rollup_1h;
+
+CREATE TABLE traffic_rollup_1m (
+    bucket TIMESTAMP WITHOUT TIME ZONE NOT NULL,  -- Inicio del minuto
+    camera_id VARCHAR(50) NOT NULL DEFAULT '',
+    vehicle_class VARCHAR(50) NOT NULL,
+    direction VARCHAR(50) NOT NULL,
+    samples BIGINT NOT NULL,                      -- Muestras de velocidad en el minuto
+    speed_sum DOUBLE PRECISION NOT NULL,
+    speed_sum_sq DOUBLE PRECISION NOT NULL,
+    speed_max INTEGER NOT NULL,
+    PRIMARY KEY (bucket, camera_id, vehicle_class, direction)
+);
+
+CREATE TABLE traffic_rollup_1h (LIKE traffic_rollup_1m INCLUDING ALL);
+
+-- 6. Conteo por líneas virtuales y ocupación de zonas (core/zones.py, config/*_zones.json)
+-- Una fila por vehículo y línea cruzada (como máximo una por sentido), y una por zona
+-- cada OCCUPANCY_INTERVAL segundos con la cantidad media y máxima de vehículos dentro.
+DROP TABLE IF EXISTS traffic_crossings CASCADE;
+DROP TABLE IF EXISTS traffic_occupancy CASCADE;
+
+CREATE TABLE traffic_crossings (
+    record_timestamp TIMESTAMP WITHOUT TIME ZONE, -- Frame en el que se cruzó la línea
+    record_date DATE NOT NULL,                    -- La llave para el particionamiento
+    camera_id VARCHAR(50),
+    line_name VARCHAR(50),
+    tracker_id INTEGER,
+    vehicle_class VARCHAR(50),
+    direction VARCHAR(50),                        -- Incoming / Outgoing respecto de la línea A -> B
+    speed_kmh INTEGER                             -- Última velocidad conocida del track (0 si aún no hay)
+) PARTITION BY RANGE (record_date);
+
+CREATE TABLE traffic_occupancy (
+    bucket TIMESTAMP WITHOUT TIME ZONE,           -- Inicio del intervalo
+    record_date DATE NOT NULL,                    -- La llave para el particionamiento
+    camera_id VARCHAR(50),
+    zone_name VARCHAR(50),
+    samples INTEGER,                              -- Frames procesados en el intervalo
+    occupancy_mean DOUBLE PRECISION,
+    occupancy_max INTEGER
+) PARTITION BY RANGE (record_date);
+
+-- Índice BRIN sobre record_timestamp / bucket en cada partición (PartitionManager).
 
 -- NOTA: No es necesario crear las particiones aquí (ej: traffic_logs_y2025m12).
--- El script 'postgres_logger.py' detectará el mes actual y creará la partición automáticamente.
\ No newline at end of file
+-- PartitionManager crea el mes actual y los siguientes por adelantado, y separa y borra
+-- las particiones más viejas que la retención configurada
+-- (traffic_logs_yAAAAmMM, traffic_tracks_yAAAAmMM, traffic_crossings_yAAAAmMM y traffic_occupancy_yAAAAmMM).
\ No newline at end of file
@@ -1,7 +1,14 @@
+import argparse
+import json
+import sys
 import cv2
 import numpy as np
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.ground_grid import GroundGrid, build_grid, save_grid, grid_path_for
+from core.roi import roi_path_for
+
 #-------------------------------------PARAMETROS A CONFIGURAR-------------------------------------
 
 #Introduce la ruta a tu video de calibración aquí
@@ -16,6 +23,10 @@ REAL_LENGTH = 72.0
 #-------------------------------------------------------------------------------------------------
 
 OUTPUT_FILE = "config/homography_matrix.npy"
+# Polígono de la calzada (orden horario) para que el detector recorte la ROI
+ROI_FILE = "config/homography_matrix_roi.npy"
+# Paso en píxeles de la grilla píxel -> metros que usa SpeedEstimator
+GRID_STRIDE = 4
 WINDOW_NAME = "Calibracion (Click para puntos, W/A/S/D navegar)"
 
 points = []
@@ -26,14 +37,88 @@ def mouse_callback(event, x, y, flags, param):
             points.append((x, y))
             print(f"[PUNTO] {len(points)}/4: ({x}, {y})")
 
+def save_calibration(points, real_width, real_length, frame_size, output=OUTPUT_FILE, stride=GRID_STRIDE):
+    # Puntos: Esq-Sup, Der-Sup, Esq-Inf, Der-Inf. Guarda homografía, polígono ROI y grilla de suelo
+    src_pts = np.float32(points)
+    dst_meters = np.float32([
+        [0, 0], 
+        [real_width, 0], 
+        [0, real_length], 
+        [real_width, real_length]
+    ])
+    H_meters = cv2.getPerspectiveTransform(src_pts, dst_meters)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    np.save(output, H_meters)
+    print(f"\n Matriz FÍSICA guardada en {output}. Ahora 1 unidad = 1 metro.")
+
+    # Puntos marcados: Esq-Sup, Der-Sup, Esq-Inf, Der-Inf -> polígono en orden horario
+    roi_polygon = np.float32([points[0], points[1], points[3], points[2]])
+    roi_file = roi_path_for(output)
+    np.save(roi_file, roi_polygon)
+    print(f" Polígono ROI guardado en {roi_file}.")
+
+    grid_file = grid_path_for(output)
+    save_grid(grid_file, build_grid(H_meters, frame_size, stride), stride, frame_size)
+    error = GroundGrid(grid_file).max_error(H_meters, roi_polygon)
+    print(f" Grilla de suelo ({frame_size[0]}x{frame_size[1]}, paso {stride} px) guardada en {grid_file}. "
+          f"Error máx. dentro de la ROI: {error * 100:.1f} cm")
+    return H_meters
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Calibración de la homografía (interactiva o por línea de comandos)")
+    parser.add_argument("--video", default=VIDEO_PATH, help="Video o imagen para la calibración interactiva")
+    parser.add_argument("--points", nargs=4, metavar="X,Y",
+                        help="Modo sin ventana: Esq-Sup Der-Sup Esq-Inf Der-Inf, p. ej. 410,220 870,215 120,700 1180,690")
+    parser.add_argument("--file", help="JSON con points, width, length y frame_size (modo sin ventana)")
+    parser.add_argument("--width", type=float, default=REAL_WIDTH, help="Ancho real del área en metros")
+    parser.add_argument("--length", type=float, default=REAL_LENGTH, help="Largo real del área en metros")
+    parser.add_argument("--frame-size", help="WxH del video, p. ej. 1920x1080 (si no, se lee de --video)")
+    parser.add_argument("--stride", type=int, default=GRID_STRIDE, help="Paso de la grilla de suelo en píxeles")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    return parser.parse_args()
+
+def headless(args):
+    points, width, length, frame_size = args.points, args.width, args.length, args.frame_size
+    if args.file:
+        with open(args.file) as f:
+            spec = json.load(f)
+        points = spec["points"]
+        width = spec.get("width", width)
+        length = spec.get("length", length)
+        frame_size = spec.get("frame_size", frame_size)
+    else:
+        points = [tuple(float(v) for v in p.split(",")) for p in points]
+
+    if isinstance(frame_size, str):
+        frame_size = tuple(int(v) for v in frame_size.lower().split("x"))
+    if not frame_size:
+        cap = cv2.VideoCapture(args.video)
+        ret, frame = cap.read()
+        cap.release()
+        if not ret:
+            print("Error: indica --frame-size o un --video legible.")
+            return
+        frame_size = (frame.shape[1], frame.shape[0])
+
+    if len(points) != 4:
+        print("Error: se necesitan exactamente 4 puntos.")
+        return
+    save_calibration(points, width, length, tuple(frame_size), args.output, args.stride)
+
 def main():
-    if not os.path.exists(VIDEO_PATH):
+    args = parse_args()
+    if args.points or args.file:
+        headless(args)
+        return
+
+    if not os.path.exists(args.video):
         print("Error: No se encuentra el video.")
         return
 
 
-    cap = cv2.VideoCapture(VIDEO_PATH, cv2.CAP_MSMF)
-    if not cap.isOpened(): cap = cv2.VideoCapture(VIDEO_PATH)
+    cap = cv2.VideoCapture(args.video, cv2.CAP_MSMF)
+    if not cap.isOpened(): cap = cv2.VideoCapture(args.video)
 
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     current_idx = 0
@@ -85,23 +170,12 @@ def main():
 
         if key == ord('c') and len(points) == 4:
             src_pts = np.float32(points)
-            
-            dst_meters = np.float32([
-                [0, 0], 
-                [REAL_WIDTH, 0], 
-                [0, REAL_LENGTH], 
-                [REAL_WIDTH, REAL_LENGTH]
-            ])
-            H_meters = cv2.getPerspectiveTransform(src_pts, dst_meters)
-            
-            os.makedirs("config", exist_ok=True)
-            np.save(OUTPUT_FILE, H_meters)
-            print(f"\n Matriz FÍSICA guardada. Ahora 1 unidad = 1 metro.")
-
+            save_calibration(points, args.width, args.length, (frame.shape[1], frame.shape[0]),
+                             args.output, args.stride)
 
             scale_viz = 20 
-            w_px = int(REAL_WIDTH * scale_viz)
-            h_px = int(REAL_LENGTH * scale_viz)
+            w_px = int(args.width * scale_viz)
+            h_px = int(args.length * scale_viz)
             dst_visual = np.float32([[0,0], [w_px,0], [0,h_px], [w_px,h_px]])
             
             H_visual = cv2.getPerspectiveTransform(src_pts, dst_visual)
@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.backends import onnx_path_for, letterbox, to_blob
+
+# Exporta el modelo YOLO a ONNX (y opcionalmente a int8) una sola vez.
+# Los archivos quedan junto al .pt y Detector(backend="onnx"/"onnx-int8") los reutiliza.
+
+class VideoCalibrationReader:
+    # Frames reales para calibrar la cuantización estática (rangos de activación)
+    def __init__(self, video_path, input_name, imgsz, samples):
+        self.input_name = input_name
+        self.imgsz = imgsz
+        cap = cv2.VideoCapture(video_path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or samples
+        self.frames = []
+        for idx in np.linspace(0, total - 1, samples).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+            ok, frame = cap.read()
+            if ok:
+                self.frames.append(frame)
+        cap.release()
+        self.iterator = iter(self.frames)
+
+    def get_next(self):
+        frame = next(self.iterator, None)
+        if frame is None:
+            return None
+        canvas, _, _ = letterbox(frame, self.imgsz)
+        return {self.input_name: to_blob([canvas])}
+
+def export_onnx(model_name, imgsz, force=False):
+    onnx_path = onnx_path_for(model_name)
+    if os.path.exists(onnx_path) and not force:
+        print(f"[INFO] Ya existe {onnx_path}, se reutiliza (--force para regenerar).")
+        return onnx_path
+
+    from ultralytics import YOLO
+    exported = YOLO(model_name).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    print(f"[INFO] Modelo ONNX guardado en {onnx_path}")
+    return onnx_path
+
+def quantize_int8(onnx_path, int8_path, calib_video=None, imgsz=640, samples=64):
+    from onnxruntime.quantization import quantize_dynamic, quantize_static, QuantType, QuantFormat
+    import onnxruntime as ort
+
+    if calib_video:
+        input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        reader = VideoCalibrationReader(calib_video, input_name, imgsz, samples)
+        print(f"[INFO] Cuantización estática con {len(reader.frames)} frames de {calib_video}")
+        quantize_static(onnx_path, int8_path, reader, quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    else:
+        print("[INFO] Cuantización dinámica (solo pesos). Usa --calib-video para la estática.")
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    print(f"[INFO] Modelo int8 guardado en {int8_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta YOLO a ONNX / ONNX int8 para inferencia en CPU")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--int8", action="store_true", help="Genera también el modelo cuantizado")
+    parser.add_argument("--calib-video", default=None, help="Video para calibrar la cuantización estática")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    onnx_path = export_onnx(args.model, args.imgsz, args.force)
+
+    if args.int8:
+        int8_path = onnx_path_for(args.model, int8=True)
+        if os.path.exists(int8_path) and not args.force:
+            print(f"[INFO] Ya existe {int8_path}, se reutiliza (--force para regenerar).")
+        else:
+            quantize_int8(onnx_path, int8_path, args.calib_video, args.imgsz)
+
+if __name__ == "__main__":
+    main()
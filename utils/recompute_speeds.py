@@ -0,0 +1,173 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import psycopg2
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.pg_copy import TableSpec, BatchWriter, TRAFFIC_LOGS, TRAFFIC_TRACKS
+from core.partition_manager import add_months, partition_name
+from core.rollup import MinuteRollup
+from core.speed_estimator import DIRECTION_NAMES, HISTORY_SIZE
+from core.tracker import Tracker
+from core.trajectories import load_points, recompute, from_micros
+from config.settings import DB_CONFIG, TRAJECTORY_DIR, CORRECTION_FACTOR, TRACK_MAX_IDLE
+
+# Recalcula velocidades ya guardadas a partir de los puntos en píxeles (TRAJECTORY_DIR) con una
+# homografía y/o CORRECTION_FACTOR nuevos, y reescribe en bloque las particiones afectadas:
+#   python utils/recompute_speeds.py --camera cam_0 --from 2026-03-01 --to 2026-04-01 --correction 1.05
+
+RECOMPUTED = TableSpec(
+    "recompute_speeds",
+    ("record_timestamp", "tracker_id", "vehicle_class", "speed_kmh", "direction", "camera_id", "run"),
+    ("timestamp", "int4", "text", "int4", "text", "text", "int8"),
+)
+
+UPDATE_LOGS = """
+    UPDATE {table} l SET speed_kmh = r.speed_kmh, direction = r.direction
+    FROM recompute_speeds r
+    WHERE l.camera_id = %(camera)s
+      AND l.camera_id = r.camera_id
+      AND l.record_timestamp = r.record_timestamp
+      AND l.tracker_id = r.tracker_id
+"""
+
+# Cada resumen toma las muestras recalculadas de su track entre first_seen y last_seen. Los IDs de
+# ByteTrack se repiten entre ejecuciones (y cámaras): el resumen se asigna a la única ejecución cuyo
+# track con ese ID se solapa con él; si encaja en más de una (p. ej. un video reprocesado) queda como estaba
+UPDATE_TRACKS = """
+    WITH spans AS (
+        SELECT run, camera_id, tracker_id, MIN(record_timestamp) AS first_ts, MAX(record_timestamp) AS last_ts
+        FROM recompute_speeds
+        GROUP BY run, camera_id, tracker_id
+    ), matched AS (
+        SELECT t2.ctid AS row_id, MIN(sp.run) AS run
+        FROM {table} t2
+        JOIN spans sp
+          ON sp.camera_id = t2.camera_id AND sp.tracker_id = t2.tracker_id
+         AND sp.first_ts <= t2.last_seen AND sp.last_ts >= t2.first_seen
+        WHERE t2.camera_id = %(camera)s
+        GROUP BY t2.ctid
+        HAVING COUNT(*) = 1
+    )
+    UPDATE {table} t SET
+        speed_min = s.speed_min, speed_max = s.speed_max,
+        speed_mean = s.speed_mean, speed_median = s.speed_median, direction = s.direction
+    FROM (
+        SELECT m.row_id,
+               MIN(r.speed_kmh) AS speed_min, MAX(r.speed_kmh) AS speed_max,
+               AVG(r.speed_kmh)::float8 AS speed_mean,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY r.speed_kmh) AS speed_median,
+               (array_agg(r.direction ORDER BY r.record_timestamp DESC))[1] AS direction
+        FROM matched m
+        JOIN {table} t2 ON t2.ctid = m.row_id
+        JOIN recompute_speeds r
+          ON r.run = m.run AND r.camera_id = t2.camera_id AND r.tracker_id = t2.tracker_id
+         AND r.record_timestamp BETWEEN t2.first_seen AND t2.last_seen
+        GROUP BY m.row_id
+    ) s
+    WHERE t.ctid = s.row_id
+"""
+
+def months_between(date_from, date_to):
+    year, month = date_from.year, date_from.month
+    while date(year, month, 1) < date_to:
+        yield year, month
+        year, month = add_months(year, month, 1)
+
+def existing(cursor, table):
+    cursor.execute("SELECT to_regclass(%s)", (table,))
+    return cursor.fetchone()[0] is not None
+
+def rewrite(conn, camera_id, rows, date_from, date_to, rollup):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TEMP TABLE recompute_speeds (
+                record_timestamp TIMESTAMP, tracker_id INT, vehicle_class TEXT, speed_kmh INT, direction TEXT,
+                camera_id TEXT, run BIGINT
+            ) ON COMMIT DROP
+        """)
+        writer = BatchWriter(RECOMPUTED, "copy_binary")
+        for i in range(0, len(rows), 100_000):
+            writer.write(cursor, rows[i:i + 100_000])
+        cursor.execute("CREATE INDEX ON recompute_speeds (tracker_id, record_timestamp)")
+        cursor.execute("ANALYZE recompute_speeds")
+
+        # Una sentencia por partición mensual: solo se tocan las que cubren el rango
+        for spec, sql in ((TRAFFIC_LOGS, UPDATE_LOGS), (TRAFFIC_TRACKS, UPDATE_TRACKS)):
+            for year, month in months_between(date_from, date_to):
+                table = partition_name(spec.name, year, month)
+                if not existing(cursor, table):
+                    continue
+                started = time.perf_counter()
+                cursor.execute(sql.format(table=table), {"camera": camera_id})
+                print(f"[RECALCULO] {table}: {cursor.rowcount} filas en {time.perf_counter() - started:.1f}s")
+
+        if rollup:
+            # Los minutos con muestras recalculadas se reemplazan completos para esta cámara
+            aggregate = MinuteRollup()
+            for timestamp, _, vehicle_class, speed, direction, _, _ in rows:
+                aggregate.add(timestamp, camera_id, vehicle_class, direction, speed)
+            minute_rows = aggregate.pop_closed(close_all=True)
+            cursor.execute("DELETE FROM traffic_rollup_1m WHERE camera_id = %s AND bucket = ANY(%s)",
+                           (camera_id or "", [row[0] for row in minute_rows]))
+            aggregate.write_minutes(cursor, minute_rows)
+            aggregate.refresh_hours(cursor)
+            print(f"[RECALCULO] traffic_rollup_1m: {len(minute_rows)} agregados reemplazados")
+
+    conn.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula velocidades desde las trayectorias guardadas")
+    parser.add_argument("--camera", required=True)
+    parser.add_argument("--from", dest="date_from", required=True, help="AAAA-MM-DD (inclusive)")
+    parser.add_argument("--to", dest="date_to", required=True, help="AAAA-MM-DD (exclusive)")
+    parser.add_argument("--homography", default="config/homography_matrix.npy")
+    parser.add_argument("--correction", type=float, default=CORRECTION_FACTOR)
+    parser.add_argument("--trajectories", default=TRAJECTORY_DIR or "trajectories")
+    parser.add_argument("--history", type=int, default=HISTORY_SIZE, help="Muestras por ventana (history_size de SpeedEstimator)")
+    parser.add_argument("--max-gap", type=float, default=TRACK_MAX_IDLE, help="Segundos sin ver un track que lo reinician (TRACK_MAX_IDLE)")
+    parser.add_argument("--no-rollup", action="store_true", help="No reconstruir traffic_rollup_1m/1h")
+    parser.add_argument("--dry-run", action="store_true", help="Solo calcular, sin escribir en la DB")
+    args = parser.parse_args()
+
+    date_from = datetime.strptime(args.date_from, "%Y-%m-%d").date()
+    date_to = datetime.strptime(args.date_to, "%Y-%m-%d").date()
+    H = np.load(args.homography)
+
+    started = time.perf_counter()
+    points, runs = load_points(args.trajectories, args.camera, date_from, date_to)
+    print(f"[INFO] {len(points)} puntos cargados en {time.perf_counter() - started:.1f}s")
+    if len(points) == 0:
+        return
+
+    started = time.perf_counter()
+    valid, speeds, directions = recompute(points, runs, H, history_size=args.history,
+                                          max_gap=args.max_gap, correction_factor=args.correction)
+    print(f"[INFO] {int(valid.sum())} velocidades recalculadas en {time.perf_counter() - started:.1f}s "
+          f"(media {speeds[valid].mean():.1f} km/h)")
+
+    if args.dry_run:
+        return
+
+    selected = points[valid]
+    class_names = [Tracker.CLASS_NAMES_DICT.get(int(c), "Vehiculo") for c in selected["class_id"]]
+    direction_names = [DIRECTION_NAMES[int(d)] for d in directions[valid]]
+    rows = list(zip(from_micros(selected["ts"]), selected["tracker_id"].tolist(), class_names,
+                    speeds[valid].tolist(), direction_names, [args.camera] * len(selected), runs[valid].tolist()))
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        started = time.perf_counter()
+        rewrite(conn, args.camera, rows, date_from, date_to, rollup=not args.no_rollup)
+        print(f"[INFO] Base de datos actualizada en {time.perf_counter() - started:.1f}s")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import os
+import sys
+import time
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.local_sink import LocalUploader, closed_files
+
+# Sube a Postgres (COPY) los archivos cerrados de LocalSink, para equipos que guardan localmente
+# y se conectan de a ratos (o desde cron):
+#   python utils/upload_local.py                       # una pasada
+#   python utils/upload_local.py --dir local --loop 300
+
+def main():
+    from config.settings import DB_CONFIG, DB_INSERT_MODE, LOCAL_DIR
+
+    parser = argparse.ArgumentParser(description="Sube a PostgreSQL los archivos SQLite/Parquet de la salida local")
+    parser.add_argument("--dir", default=LOCAL_DIR, help="Carpeta de LocalSink")
+    parser.add_argument("--loop", type=float, help="Repetir cada N segundos en lugar de una sola pasada")
+    args = parser.parse_args()
+
+    uploader = LocalUploader(args.dir, DB_CONFIG, insert_mode=DB_INSERT_MODE)
+    while True:
+        pending = len(closed_files(args.dir))
+        started = time.perf_counter()
+        try:
+            rows = uploader.upload_pending()
+            if pending:
+                print(f"[INFO] {rows} filas subidas en {time.perf_counter() - started:.1f}s; "
+                      f"quedan {len(closed_files(args.dir))} de {pending} archivos")
+        except psycopg2.OperationalError as e:
+            print(f"[WARN] DB no disponible ({e}); {pending} archivos pendientes")
+        if args.loop is None:
+            break
+        time.sleep(args.loop)
+
+if __name__ == "__main__":
+    main()